@@ -19,6 +19,7 @@
     "data": [
         "security/ir.model.access.csv",
         "security/security.xml",
+        "data/ir_cron.xml",
         "wizard/aged_partner_balance_wizard_view.xml",
         "wizard/general_ledger_wizard_view.xml",
         "wizard/journal_ledger_wizard_view.xml",
@@ -1,6 +1,10 @@
 from . import account_age_report_configuration
 from . import account_group
 from . import account
+from . import account_balance_snapshot
+from . import account_move
 from . import account_move_line
+from . import account_partial_reconcile
+from . import account_residual_cache
 from . import ir_actions_report
 from . import res_config_settings
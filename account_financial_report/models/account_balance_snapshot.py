@@ -0,0 +1,452 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+from dateutil.relativedelta import relativedelta
+
+from odoo import api, fields, models
+from odoo.tools import SQL, str2bool
+from odoo.tools.sql import create_index, create_unique_index
+
+BALANCE_FIELDS = ["debit", "credit", "balance", "amount_currency"]
+
+
+class AccountBalanceSnapshot(models.Model):
+    """Balance of the posted journal items of every month, by company, account,
+    partner and currency. The reports read the complete months from here and
+    only the remaining days from the journal items."""
+
+    _name = "account.balance.snapshot"
+    _description = "Account month-end balance snapshot"
+    _order = "date, id"
+
+    company_id = fields.Many2one("res.company", required=True, readonly=True)
+    account_id = fields.Many2one("account.account", required=True, readonly=True)
+    partner_id = fields.Many2one("res.partner", readonly=True)
+    currency_id = fields.Many2one("res.currency", readonly=True)
+    date = fields.Date(
+        required=True, readonly=True, help="Last day of the month of the balance."
+    )
+    debit = fields.Float(readonly=True)
+    credit = fields.Float(readonly=True)
+    balance = fields.Float(readonly=True)
+    amount_currency = fields.Float(readonly=True)
+
+    def init(self):
+        create_index(
+            self._cr,
+            "account_balance_snapshot_bucket_index",
+            self._table,
+            ["company_id", "account_id", "partner_id", "date"],
+        )
+
+    @api.model
+    def _is_enabled(self):
+        return str2bool(
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("account_financial_report.balance_snapshot", "False")
+        )
+
+    @api.model
+    def _is_rebuild_pending(self):
+        """The snapshots are computed again from scratch by the scheduled
+        action, they cannot be trusted until then."""
+        return str2bool(
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("account_financial_report.balance_snapshot_rebuild", "False")
+        )
+
+    @api.model
+    def _schedule_rebuild(self):
+        self.env["ir.config_parameter"].sudo().set_param(
+            "account_financial_report.balance_snapshot_rebuild", "True"
+        )
+        self.env.ref(
+            "account_financial_report.ir_cron_account_balance_snapshot_refresh"
+        )._trigger()
+
+    @api.model
+    def _month_end_sql(self, date_sql):
+        return SQL(
+            "(date_trunc('month', %s) + interval '1 month - 1 day')::date", date_sql
+        )
+
+    @api.model
+    def _insert_balances(self, join_sql=None, where_sql=None):
+        """Insert the balances of the posted journal items, grouped by month.
+        ``join_sql`` and ``where_sql`` restrict the journal items (``aml``)."""
+        self.env.cr.execute(
+            SQL(
+                """
+                INSERT INTO account_balance_snapshot (
+                    company_id, account_id, partner_id, currency_id, date,
+                    debit, credit, balance, amount_currency,
+                    create_uid, create_date, write_uid, write_date
+                )
+                SELECT
+                    aml.company_id,
+                    aml.account_id,
+                    aml.partner_id,
+                    aml.currency_id,
+                    %(month_end)s,
+                    SUM(aml.debit),
+                    SUM(aml.credit),
+                    SUM(aml.balance),
+                    SUM(aml.amount_currency),
+                    %(uid)s,
+                    NOW() AT TIME ZONE 'UTC',
+                    %(uid)s,
+                    NOW() AT TIME ZONE 'UTC'
+                FROM account_move_line aml
+                %(join_sql)s
+                WHERE aml.parent_state = 'posted'
+                    -- Section and note lines have no account
+                    AND aml.account_id IS NOT NULL
+                    AND %(where_sql)s
+                GROUP BY 1, 2, 3, 4, 5
+                """,
+                month_end=self._month_end_sql(SQL("aml.date")),
+                uid=self.env.uid,
+                join_sql=join_sql or SQL(),
+                where_sql=where_sql or SQL("TRUE"),
+            )
+        )
+
+    @api.model
+    def _rebuild(self, companies=None):
+        """Compute again all the balances of ``companies`` (all by default)."""
+        self.env["account.move.line"].flush_model()
+        company_ids = companies.ids if companies else None
+        if company_ids is None:
+            self.env.cr.execute(SQL("DELETE FROM account_balance_snapshot"))
+            self.env.cr.execute(SQL("DELETE FROM account_balance_snapshot_dirty"))
+            self._insert_balances()
+        else:
+            for table in ("account_balance_snapshot", "account_balance_snapshot_dirty"):
+                self.env.cr.execute(
+                    SQL(
+                        "DELETE FROM %s WHERE company_id = ANY(%s)",
+                        SQL.identifier(table),
+                        company_ids,
+                    )
+                )
+            self._insert_balances(
+                where_sql=SQL("aml.company_id = ANY(%s)", company_ids)
+            )
+        self.invalidate_model()
+        self.env["account.balance.snapshot.dirty"].invalidate_model()
+
+    @api.model
+    def _get_buckets(self, where_sql):
+        """(company, account, partner, month end) of the journal items matching
+        ``where_sql``."""
+        self.env["account.move.line"].flush_model(
+            ["company_id", "account_id", "partner_id", "date", "move_id"]
+        )
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT DISTINCT company_id, account_id, partner_id, %(month_end)s
+                FROM account_move_line
+                WHERE account_id IS NOT NULL AND %(where_sql)s
+                """,
+                month_end=self._month_end_sql(SQL("date")),
+                where_sql=where_sql,
+            )
+        )
+        return set(self.env.cr.fetchall())
+
+    @api.model
+    def _get_move_buckets(self, moves):
+        if not moves:
+            return set()
+        return self._get_buckets(SQL("move_id = ANY(%s)", moves.ids))
+
+    @api.model
+    def _get_move_line_buckets(self, move_lines):
+        if not move_lines:
+            return set()
+        return self._get_buckets(SQL("id = ANY(%s)", move_lines.ids))
+
+    @api.model
+    def _refresh(self, buckets):
+        """Compute again the balances of the (company, account, partner, month
+        end) ``buckets``."""
+        if not buckets:
+            return
+        self.env["account.move.line"].flush_model()
+        self.env["account.move"].flush_model(["state"])
+        company_ids, account_ids, partner_ids, dates = map(list, zip(*buckets))
+        bucket_table = SQL(
+            """
+            unnest(%s::int[], %s::int[], %s::int[], %s::date[])
+                AS bucket(company_id, account_id, partner_id, date)
+            """,
+            company_ids,
+            account_ids,
+            partner_ids,
+            dates,
+        )
+        self.env.cr.execute(
+            SQL(
+                """
+                DELETE FROM account_balance_snapshot snapshot
+                USING %(bucket_table)s
+                WHERE snapshot.company_id = bucket.company_id
+                    AND snapshot.account_id = bucket.account_id
+                    AND snapshot.partner_id IS NOT DISTINCT FROM bucket.partner_id
+                    AND snapshot.date = bucket.date
+                """,
+                bucket_table=bucket_table,
+            )
+        )
+        self._insert_balances(
+            join_sql=SQL(
+                """
+                JOIN %(bucket_table)s
+                    ON aml.company_id = bucket.company_id
+                    AND aml.account_id = bucket.account_id
+                    AND aml.partner_id IS NOT DISTINCT FROM bucket.partner_id
+                    AND aml.date BETWEEN date_trunc('month', bucket.date)::date
+                        AND bucket.date
+                """,
+                bucket_table=bucket_table,
+            )
+        )
+        self.invalidate_model()
+
+    @api.model
+    def _mark_moves_dirty(self, moves):
+        if self._is_enabled():
+            self.env["account.balance.snapshot.dirty"]._mark(
+                self._get_move_buckets(moves)
+            )
+
+    @api.model
+    def _mark_move_lines_dirty(self, move_lines):
+        if self._is_enabled():
+            self.env["account.balance.snapshot.dirty"]._mark(
+                self._get_move_line_buckets(move_lines)
+            )
+
+    @api.model
+    def _cron_refresh_dirty(self, batch_size=1000):
+        """Compute again the months marked as dirty, by batches, or all the
+        balances when a rebuild is pending."""
+        dirty_model = self.env["account.balance.snapshot.dirty"]
+        if self._is_rebuild_pending():
+            self._rebuild()
+            self.env["ir.config_parameter"].sudo().set_param(
+                "account_financial_report.balance_snapshot_rebuild", "False"
+            )
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT id, version, company_id, account_id, partner_id, date
+                FROM account_balance_snapshot_dirty
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+                """,
+                batch_size,
+            )
+        )
+        rows = self.env.cr.fetchall()
+        self._refresh({row[2:] for row in rows})
+        # The months marked again meanwhile stay dirty
+        self.env.cr.execute(
+            SQL(
+                """
+                DELETE FROM account_balance_snapshot_dirty dirty
+                USING unnest(%s::int[], %s::int[]) AS done(id, version)
+                WHERE dirty.id = done.id AND dirty.version = done.version
+                """,
+                [row[0] for row in rows],
+                [row[1] for row in rows],
+            )
+        )
+        dirty_model.invalidate_model()
+        self.env["ir.cron"]._notify_progress(
+            done=len(rows), remaining=dirty_model.search_count([])
+        )
+
+    @api.model
+    def _convert_move_line_domain(self, domain):
+        """Split a journal items domain in a domain on the snapshots and the
+        dates bounds ``date_from`` (included) and ``date_to`` (excluded).
+        Return ``None`` if the domain cannot be answered by the snapshots:
+        it must only filter posted items on the snapshot dimensions."""
+        snapshot_domain = []
+        date_from = date_to = None
+        posted = False
+        for leaf in domain:
+            if not isinstance(leaf, tuple | list) or len(leaf) != 3:
+                return None
+            field_name, operator, value = leaf
+            if field_name in ("company_id", "account_id", "partner_id"):
+                snapshot_domain.append(leaf)
+            elif field_name == "account_type":
+                snapshot_domain.append(("account_id.account_type", operator, value))
+            elif field_name.startswith("account_id."):
+                snapshot_domain.append(leaf)
+            elif field_name in ("move_id.state", "parent_state"):
+                if (operator, value) not in (("=", "posted"), ("in", ["posted"])):
+                    return None
+                posted = True
+            elif field_name == "date" and operator in ("<", "<=", ">", ">="):
+                value = fields.Date.to_date(value)
+                if operator in ("<=", ">"):
+                    value += relativedelta(days=1)
+                if operator in ("<", "<="):
+                    date_to = min(date_to, value) if date_to else value
+                else:
+                    date_from = max(date_from, value) if date_from else value
+            else:
+                return None
+        if not posted or not date_to:
+            return None
+        return snapshot_domain, date_from, date_to
+
+    @api.model
+    def _read_group_move_lines(self, domain, fields, groupby, lazy=True):
+        """Same result as the ``read_group`` of the journal items, using the
+        snapshots for the complete months of the dates range."""
+        aml_model = self.env["account.move.line"]
+        converted = self._convert_move_line_domain(domain)
+        if (
+            converted is None
+            or self._is_rebuild_pending()
+            or (lazy and len(groupby) > 1)
+            or any(field_name not in self._fields for field_name in groupby)
+        ):
+            return aml_model.read_group(
+                domain=domain, fields=fields, groupby=groupby, lazy=lazy
+            )
+        snapshot_domain, date_from, date_to = converted
+        # Complete months of the range, the other days are read from the items
+        months_from = date_from
+        if date_from and date_from.day != 1:
+            months_from = date_from + relativedelta(day=1, months=1)
+        months_to = date_to + relativedelta(day=1)
+        if months_from and months_from >= months_to:
+            return aml_model.read_group(
+                domain=domain, fields=fields, groupby=groupby, lazy=lazy
+            )
+        snapshot_domain += [("date", "<", months_to)]
+        if months_from:
+            snapshot_domain += [("date", ">=", months_from)]
+        # Months changed since their last computation cannot be trusted
+        if self.env["account.balance.snapshot.dirty"].search_count(
+            snapshot_domain, limit=1
+        ):
+            return aml_model.read_group(
+                domain=domain, fields=fields, groupby=groupby, lazy=lazy
+            )
+        balance_fields = [f"{field_name}:sum" for field_name in BALANCE_FIELDS]
+        groups = self.read_group(
+            domain=snapshot_domain,
+            fields=groupby + balance_fields,
+            groupby=groupby,
+            lazy=False,
+        )
+        ml_domain = [leaf for leaf in domain if leaf[0] != "date"]
+        remaining_ranges = [(months_to, date_to)]
+        if date_from and date_from < months_from:
+            remaining_ranges.append((date_from, months_from))
+        for range_from, range_to in remaining_ranges:
+            if range_from >= range_to:
+                continue
+            groups += aml_model.read_group(
+                domain=ml_domain
+                + [("date", ">=", range_from), ("date", "<", range_to)],
+                fields=groupby + balance_fields,
+                groupby=groupby,
+                lazy=False,
+            )
+        res = {}
+        for group in groups:
+            key = tuple(
+                group[field_name] and group[field_name][0] for field_name in groupby
+            )
+            if key not in res:
+                res[key] = {field_name: group[field_name] for field_name in groupby}
+                res[key].update(dict.fromkeys(BALANCE_FIELDS, 0.0))
+            for field_name in BALANCE_FIELDS:
+                res[key][field_name] += group[field_name] or 0.0
+        return list(res.values())
+
+
+class AccountBalanceSnapshotDirty(models.Model):
+    """Months of the balance snapshots to compute again, because journal
+    items of the month have been posted, reset to draft, modified, deleted
+    or reconciled."""
+
+    _name = "account.balance.snapshot.dirty"
+    _description = "Account balance snapshot to compute again"
+    _order = "id"
+
+    company_id = fields.Many2one("res.company", required=True, readonly=True)
+    account_id = fields.Many2one("account.account", required=True, readonly=True)
+    partner_id = fields.Many2one("res.partner", readonly=True)
+    date = fields.Date(
+        required=True, readonly=True, help="Last day of the month of the balance."
+    )
+    version = fields.Integer(
+        required=True,
+        readonly=True,
+        default=1,
+        help="Incremented each time the month is marked dirty again, the "
+        "scheduled action only clears the versions it computed.",
+    )
+
+    def init(self):
+        create_unique_index(
+            self._cr,
+            "account_balance_snapshot_dirty_bucket_index",
+            self._table,
+            ["company_id", "account_id", "COALESCE(partner_id, 0)", "date"],
+        )
+
+    @api.model
+    def _mark(self, buckets):
+        """Mark the (company, account, partner, month end) ``buckets`` as dirty,
+        they are computed again by the scheduled action."""
+        if not buckets:
+            return
+        company_ids, account_ids, partner_ids, dates = map(list, zip(*buckets))
+        self.env.cr.execute(
+            SQL(
+                """
+                INSERT INTO account_balance_snapshot_dirty (
+                    company_id, account_id, partner_id, date, version,
+                    create_uid, create_date, write_uid, write_date
+                )
+                SELECT
+                    bucket.company_id,
+                    bucket.account_id,
+                    bucket.partner_id,
+                    bucket.date,
+                    1,
+                    %(uid)s,
+                    NOW() AT TIME ZONE 'UTC',
+                    %(uid)s,
+                    NOW() AT TIME ZONE 'UTC'
+                FROM unnest(
+                    %(company_ids)s::int[],
+                    %(account_ids)s::int[],
+                    %(partner_ids)s::int[],
+                    %(dates)s::date[]
+                ) AS bucket(company_id, account_id, partner_id, date)
+                ON CONFLICT (company_id, account_id, COALESCE(partner_id, 0), date)
+                DO UPDATE SET
+                    version = account_balance_snapshot_dirty.version + 1,
+                    write_uid = EXCLUDED.write_uid,
+                    write_date = EXCLUDED.write_date
+                """,
+                uid=self.env.uid,
+                company_ids=company_ids,
+                account_ids=account_ids,
+                partner_ids=partner_ids,
+                dates=dates,
+            )
+        )
+        self.invalidate_model()
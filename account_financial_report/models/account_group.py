@@ -1,9 +1,18 @@
 # © 2018 Forest and Biomass Romania SA
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
-from odoo import api, fields, models
+from odoo import api, fields, models, tools
 from odoo.tools import SQL
 
+# Fields of the groups used by the hierarchy index
+HIERARCHY_GROUP_FIELDS = [
+    "name",
+    "code_prefix_start",
+    "code_prefix_end",
+    "parent_id",
+    "company_id",
+]
+
 
 class AccountGroup(models.Model):
     _inherit = "account.group"
@@ -106,3 +115,139 @@ class AccountGroup(models.Model):
             one.compute_account_ids = (
                 one.account_ids | one.group_child_ids.compute_account_ids
             )
+
+    @api.model
+    def _get_hierarchy_index(self, company_id):
+        """Tree of the account groups of a company, kept in cache until a
+        group or the code of an account changes. The groups belong to the
+        root company, so a branch shares the tree of its root. Return a dict
+        with:
+
+        * ``groups``: by group id, the ``id``, ``code``, ``name``,
+          ``parent_id``, ``level``, ``complete_code`` and ``account_ids`` (the
+          accounts of the group and of its child groups) of the group.
+        * ``account_group``: the group id of every account, the most specific
+          group whose range includes the code of the account.
+
+        The result is shared by every caller and must not be modified."""
+        root_id = self.env["res.company"].sudo().browse(company_id).root_id.id
+        return self._get_root_hierarchy_index(
+            root_id, self._get_hierarchy_version(root_id)
+        )
+
+    @api.model
+    def _get_hierarchy_version(self, company_id):
+        """Hash of the groups of ``company_id`` and of the codes of the
+        accounts: the cached index of another version is outdated."""
+        self.env["account.account"].flush_model(["code_store"])
+        self.flush_model(HIERARCHY_GROUP_FIELDS)
+        return self.env.execute_query(
+            SQL(
+                """
+                SELECT md5(concat(
+                    (
+                        SELECT string_agg(
+                            concat_ws(
+                                ',', id, name, code_prefix_start,
+                                code_prefix_end, parent_id
+                            ),
+                            ';' ORDER BY id
+                        )
+                        FROM account_group
+                        WHERE company_id = %(company_id)s
+                    ),
+                    '|',
+                    (
+                        SELECT string_agg(
+                            concat_ws(',', id, code_store), ';' ORDER BY id
+                        )
+                        FROM account_account
+                    )
+                ))
+                """,
+                company_id=company_id,
+            )
+        )[0][0]
+
+    @api.model
+    @tools.ormcache("company_id", "version")
+    def _get_root_hierarchy_index(self, company_id, version):
+        groups = (
+            self.sudo()
+            .with_context(active_test=False)
+            .search_read(
+                [("company_id", "=", company_id)],
+                ["name", "code_prefix_start", "parent_id"],
+            )
+        )
+        groups_data = {
+            group["id"]: {
+                "id": group["id"],
+                "code": group["code_prefix_start"],
+                "name": group["name"],
+                "parent_id": group["parent_id"] and group["parent_id"][0],
+            }
+            for group in groups
+        }
+
+        def set_hierarchy(group_data):
+            if "level" not in group_data:
+                parent_data = groups_data.get(group_data["parent_id"])
+                if parent_data:
+                    set_hierarchy(parent_data)
+                    group_data["level"] = parent_data["level"] + 1
+                    group_data["complete_code"] = (
+                        f"{parent_data['complete_code']}/{group_data['code']}"
+                    )
+                else:
+                    group_data["level"] = 0
+                    group_data["complete_code"] = group_data["code"]
+
+        for group_data in groups_data.values():
+            set_hierarchy(group_data)
+        self.env["account.account"].flush_model(["code"])
+        self.flush_model(["code_prefix_start", "code_prefix_end", "company_id"])
+        rows = self.env.execute_query(
+            SQL(
+                """
+                SELECT agroup.id, account.id
+                FROM account_group agroup
+                JOIN account_account account
+                    ON agroup.code_prefix_start <= LEFT(
+                        %(code_store)s->>agroup.company_id::text,
+                        char_length(agroup.code_prefix_start)
+                    )
+                    AND agroup.code_prefix_end >= LEFT(
+                        %(code_store)s->>agroup.company_id::text,
+                        char_length(agroup.code_prefix_end)
+                    )
+                WHERE agroup.company_id = %(company_id)s
+                """,
+                code_store=SQL.identifier("account", "code_store"),
+                company_id=company_id,
+            )
+        )
+        group_accounts = {group_id: set() for group_id in groups_data}
+        account_group = {}
+        for group_id, account_id in rows:
+            group_accounts[group_id].add(account_id)
+            # Same choice as the group of the accounts in Odoo: the longest
+            # prefix first, then the first group created
+            current_id = account_group.get(account_id)
+            if not current_id or (
+                -len(groups_data[group_id]["code"]),
+                group_id,
+            ) < (-len(groups_data[current_id]["code"]), current_id):
+                account_group[account_id] = group_id
+        # Children first, so that the accounts of a group are complete when
+        # they are added to its parent
+        for group_data in sorted(
+            groups_data.values(), key=lambda g: g["level"], reverse=True
+        ):
+            if group_data["parent_id"] in group_accounts:
+                group_accounts[group_data["parent_id"]] |= group_accounts[
+                    group_data["id"]
+                ]
+        for group_id, group_data in groups_data.items():
+            group_data["account_ids"] = sorted(group_accounts[group_id])
+        return {"groups": groups_data, "account_group": account_group}
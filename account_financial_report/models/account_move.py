@@ -0,0 +1,24 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+from odoo import models
+
+
+class AccountMove(models.Model):
+    _inherit = "account.move"
+
+    def _post(self, soft=True):
+        posted = super()._post(soft=soft)
+        self.env["account.balance.snapshot"]._mark_moves_dirty(posted)
+        self.env["account.residual.cache.stamp"]._stamp_moves(posted)
+        return posted
+
+    def button_draft(self):
+        res = super().button_draft()
+        self.env["account.balance.snapshot"]._mark_moves_dirty(self)
+        self.env["account.residual.cache.stamp"]._stamp_moves(self)
+        return res
+
+    def unlink(self):
+        posted = self.filtered(lambda move: move.state == "posted")
+        self.env["account.balance.snapshot"]._mark_moves_dirty(posted)
+        self.env["account.residual.cache.stamp"]._stamp_moves(posted)
+        return super().unlink()
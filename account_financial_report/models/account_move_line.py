@@ -5,6 +5,22 @@ from collections import defaultdict
 from odoo import api, fields, models
 from odoo.fields import Command
 
+# Fields of the journal items the balance snapshots and the cached residuals
+# depend on
+BALANCE_DEPENDENCIES = {
+    "company_id",
+    "account_id",
+    "partner_id",
+    "currency_id",
+    "date",
+    "debit",
+    "credit",
+    "balance",
+    "amount_currency",
+    "amount_residual",
+    "amount_residual_currency",
+}
+
 
 class AccountMoveLine(models.Model):
     _inherit = "account.move.line"
@@ -61,6 +77,22 @@ class AccountMoveLine(models.Model):
             ON account_move_line (account_id, partner_id)"""
             )
 
+    def write(self, vals):
+        if not BALANCE_DEPENDENCIES.intersection(vals):
+            return super().write(vals)
+        posted = self.filtered(lambda line: line.parent_state == "posted")
+        if not posted:
+            return super().write(vals)
+        snapshot_model = self.env["account.balance.snapshot"]
+        stamp_model = self.env["account.residual.cache.stamp"]
+        # Both the months and dates before and after the change
+        snapshot_model._mark_move_lines_dirty(posted)
+        stamp_model._stamp_move_lines(posted)
+        res = super().write(vals)
+        snapshot_model._mark_move_lines_dirty(posted)
+        stamp_model._stamp_move_lines(posted)
+        return res
+
     @api.model
     def search_count(self, domain, limit=None):
         # In Big DataBase every time you change the domain widget this method
@@ -0,0 +1,22 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+from odoo import api, models
+
+
+class AccountPartialReconcile(models.Model):
+    _inherit = "account.partial.reconcile"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        partials = super().create(vals_list)
+        self.env["account.balance.snapshot"]._mark_move_lines_dirty(
+            partials.debit_move_id | partials.credit_move_id
+        )
+        self.env["account.residual.cache.stamp"]._stamp_partials(partials)
+        return partials
+
+    def unlink(self):
+        self.env["account.balance.snapshot"]._mark_move_lines_dirty(
+            self.debit_move_id | self.credit_move_id
+        )
+        self.env["account.residual.cache.stamp"]._stamp_partials(self)
+        return super().unlink()
@@ -0,0 +1,140 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+from odoo import api, fields, models
+from odoo.tools import SQL, str2bool
+from odoo.tools.sql import create_index
+
+
+class AccountResidualCacheStamp(models.Model):
+    """Dates of the journal items posted, reset to draft, modified, deleted
+    or reconciled, by company. The residuals at a date cached by the open
+    items and the aged partner balance are keyed by the set of the stamps on
+    or before that date, so any change of the residuals at the date
+    invalidates them, even when the stamping transaction commits after a
+    transaction stamping later."""
+
+    _name = "account.residual.cache.stamp"
+    _description = "Invalidation of the cached residuals at date"
+    _order = "id"
+
+    company_id = fields.Many2one("res.company", required=True, readonly=True)
+    date = fields.Date(required=True, readonly=True)
+
+    def init(self):
+        create_index(
+            self._cr,
+            "account_residual_cache_stamp_date_index",
+            self._table,
+            ["company_id", "date"],
+        )
+
+    @api.model
+    def _is_enabled(self):
+        return str2bool(
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("account_financial_report.residual_cache", "False")
+        )
+
+    @api.model
+    def _stamp(self, company_dates):
+        """Invalidate the residuals cached at the dates on or after the
+        (company, date) ``company_dates``."""
+        if not company_dates or not self._is_enabled():
+            return
+        company_ids, dates = map(list, zip(*company_dates))
+        self.env.cr.execute(
+            SQL(
+                """
+                INSERT INTO account_residual_cache_stamp (
+                    company_id, date,
+                    create_uid, create_date, write_uid, write_date
+                )
+                SELECT
+                    stamp.company_id,
+                    stamp.date,
+                    %(uid)s,
+                    NOW() AT TIME ZONE 'UTC',
+                    %(uid)s,
+                    NOW() AT TIME ZONE 'UTC'
+                FROM unnest(%(company_ids)s::int[], %(dates)s::date[])
+                    AS stamp(company_id, date)
+                """,
+                uid=self.env.uid,
+                company_ids=company_ids,
+                dates=dates,
+            )
+        )
+        self.invalidate_model()
+
+    @api.model
+    def _stamp_moves(self, moves):
+        self._stamp({(move.company_id.id, move.date) for move in moves})
+
+    @api.model
+    def _stamp_move_lines(self, move_lines):
+        self._stamp({(line.company_id.id, line.date) for line in move_lines})
+
+    @api.model
+    def _stamp_partials(self, partials):
+        self._stamp(
+            {(partial.company_id.id, partial.max_date) for partial in partials}
+        )
+
+    @api.model
+    def _get_stamp(self, company_id, date_at):
+        """Hash of the ids of the stamps of ``company_id`` on or before
+        ``date_at``. A stamp committed late with a lower id than the others
+        changes it as well."""
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT md5(string_agg(id::text, ',' ORDER BY id))
+                FROM account_residual_cache_stamp
+                WHERE company_id = %s AND date <= %s
+                """,
+                company_id,
+                date_at,
+            )
+        )
+        return self.env.cr.fetchone()[0] or ""
+
+    @api.autovacuum
+    def _gc_stamps(self):
+        """Replace the stamps of each company and date older than a day by a
+        single new one. Its new id gives a hash never read before, so that
+        the residuals cached with the replaced stamps are not read again."""
+        self.env.cr.execute(
+            SQL(
+                """
+                WITH replaced AS (
+                    DELETE FROM account_residual_cache_stamp stamp
+                    USING (
+                        SELECT company_id, date
+                        FROM account_residual_cache_stamp
+                        WHERE create_date < %(limit)s
+                        GROUP BY company_id, date
+                        HAVING COUNT(*) > 1
+                    ) old
+                    WHERE stamp.company_id = old.company_id
+                        AND stamp.date = old.date
+                        AND stamp.create_date < %(limit)s
+                    RETURNING stamp.company_id, stamp.date
+                )
+                INSERT INTO account_residual_cache_stamp (
+                    company_id, date,
+                    create_uid, create_date, write_uid, write_date
+                )
+                SELECT DISTINCT
+                    company_id,
+                    date,
+                    %(uid)s,
+                    NOW() AT TIME ZONE 'UTC',
+                    %(uid)s,
+                    NOW() AT TIME ZONE 'UTC'
+                FROM replaced
+                """,
+                limit=fields.Datetime.subtract(fields.Datetime.now(), days=1),
+                uid=self.env.uid,
+            )
+        )
+        self.invalidate_model()
@@ -11,6 +11,76 @@ class ResConfigSettings(models.TransientModel):
         "account.age.report.configuration",
         string="Intervals configuration",
     )
+    afr_gl_sql_engine = fields.Boolean(
+        string="General Ledger SQL engine",
+        config_parameter="account_financial_report.gl_sql_engine",
+        help="Compute the General Ledger period totals and move lines in a "
+        "single SQL query instead of processing every move line in Python.",
+    )
+    afr_gl_streaming = fields.Boolean(
+        string="General Ledger XLSX streaming",
+        config_parameter="account_financial_report.gl_streaming",
+        help="Write the General Ledger XLSX account by account while the move "
+        "lines are fetched from the database, instead of loading the whole "
+        "ledger in memory first.",
+    )
+    afr_balance_snapshot = fields.Boolean(
+        string="Monthly balance snapshots",
+        config_parameter="account_financial_report.balance_snapshot",
+        help="Keep the balance of every month by account and partner, so that "
+        "the initial balances of the reports only read the journal items of "
+        "the last days instead of the whole history.",
+    )
+    afr_tb_single_scan = fields.Boolean(
+        string="Trial Balance single scan",
+        config_parameter="account_financial_report.tb_single_scan",
+        help="Compute the initial balances, the period amounts and the profit "
+        "and loss initial balance of the Trial Balance in one pass over the "
+        "journal items instead of one query for each of them.",
+    )
+    afr_apb_parallel = fields.Boolean(
+        string="Aged Partner Balance parallel mode",
+        config_parameter="account_financial_report.apb_parallel",
+        help="Compute the Aged Partner Balance by shards of accounts and "
+        "partners in several workers, each one with its own database cursor. "
+        "The workers are threads of the server process: their queries run in "
+        "parallel in the database, but the Python computation of the shards "
+        "still runs on a single CPU core.",
+    )
+    afr_apb_parallel_workers = fields.Integer(
+        string="Aged Partner Balance workers",
+        config_parameter="account_financial_report.apb_parallel_workers",
+        default=4,
+    )
+    afr_apb_sql_summary = fields.Boolean(
+        string="Aged Partner Balance SQL summary",
+        config_parameter="account_financial_report.apb_sql_summary",
+        help="Without the move line details, compute the aged amounts by "
+        "account and partner in the database instead of reading every open "
+        "item.",
+    )
+    afr_jl_sql_fetch = fields.Boolean(
+        string="Journal Ledger SQL fetch",
+        config_parameter="account_financial_report.jl_sql_fetch",
+        help="Read the journal items of the Journal Ledger, with their "
+        "exigibility and taxes, in one SQL query instead of going through "
+        "every journal item record.",
+    )
+    afr_jl_chunked = fields.Boolean(
+        string="Journal Ledger by journal",
+        config_parameter="account_financial_report.jl_chunked",
+        help="When the Journal Ledger is grouped by journal, read and render "
+        "the moves of one journal at a time and release them before the next "
+        "one, instead of loading the moves of all the journals first.",
+    )
+    afr_residual_cache = fields.Boolean(
+        string="Residuals at date cache",
+        config_parameter="account_financial_report.residual_cache",
+        help="Keep in memory the residuals of the posted journal items at a "
+        "past date computed by the Open Items and the Aged Partner Balance, "
+        "until journal items are posted, reset to draft, modified, deleted "
+        "or reconciled on or before that date.",
+    )
 
     def set_values(self):
         self.env["ir.default"].sudo().set(
@@ -19,7 +89,20 @@ class ResConfigSettings(models.TransientModel):
             self.age_partner_config_id.id,
             company_id=self.env.company.id,
         )
-        return super().set_values()
+        snapshot_model = self.env["account.balance.snapshot"].sudo()
+        snapshot_enabled = snapshot_model._is_enabled()
+        residual_cache_enabled = self.env[
+            "account.residual.cache.stamp"
+        ]._is_enabled()
+        res = super().set_values()
+        # The snapshots are only kept up to date while they are enabled, they
+        # are computed again by the scheduled action
+        if self.afr_balance_snapshot and not snapshot_enabled:
+            snapshot_model._schedule_rebuild()
+        # Neither are the stamps of the cached residuals
+        if self.afr_residual_cache and not residual_cache_enabled:
+            self.env.registry.clear_cache()
+        return res
 
     @api.model
     def get_values(self):
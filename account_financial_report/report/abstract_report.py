@@ -1,7 +1,10 @@
 # Copyright 2020 ForgeFlow S.L. (https://www.forgeflow.com)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
-from odoo import api, models
+from datetime import date
+
+from odoo import api, models, tools
+from odoo.tools import SQL, frozendict, str2bool
 
 
 class AgedPartnerBalanceReport(models.AbstractModel):
@@ -18,6 +21,33 @@ class AgedPartnerBalanceReport(models.AbstractModel):
         "name",
     ]
 
+    @api.model
+    def _get_report_option(self, data, option):
+        """Performance options of the reports. The report data can force the
+        option, otherwise the ``account_financial_report.<option>`` system
+        parameter (set from the accounting settings) is used."""
+        if option in data:
+            return data[option]
+        return str2bool(
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param(f"account_financial_report.{option}", "False")
+        )
+
+    @api.model
+    def _read_group_initial_balances(self, domain, fields, groupby, lazy=True):
+        """``read_group`` of the journal items for the initial balances. When
+        the balance snapshots are enabled, the complete months are read from
+        them."""
+        snapshot_model = self.env["account.balance.snapshot"]
+        if snapshot_model._is_enabled():
+            return snapshot_model._read_group_move_lines(
+                domain, fields, groupby, lazy=lazy
+            )
+        return self.env["account.move.line"].read_group(
+            domain=domain, fields=fields, groupby=groupby, lazy=lazy
+        )
+
     @api.model
     def _get_move_lines_domain_not_reconciled(
         self, company_id, account_ids, partner_ids, only_posted_moves, date_from
@@ -54,72 +84,216 @@ class AgedPartnerBalanceReport(models.AbstractModel):
             domain += [("move_id.state", "in", ["posted", "draft"])]
         return domain
 
-    def _recalculate_move_lines(
+    @api.model
+    def _get_residual_at_date_query(
         self,
-        move_lines,
-        debit_ids,
-        credit_ids,
-        debit_amount,
-        credit_amount,
-        ml_ids,
+        company_id,
         account_ids,
+        partner_ids,
+        date_at_object,
+        date_from,
+        only_posted_moves,
+    ):
+        """Query of the journal items open at ``date_at_object`` with their
+        residual amounts at that date. The partial reconciliations made after
+        the date are added back to the residual of the items they reconcile,
+        reading only the partials of the items of the requested accounts and
+        partners."""
+        line_model = self.env["account.move.line"]
+        domain = self._get_move_lines_domain_not_reconciled(
+            company_id, account_ids, partner_ids, only_posted_moves, date_from
+        )
+        partial_amounts = SQL(
+            "SELECT NULL::int AS line_id, 0 AS amount, 0 AS amount_currency LIMIT 0"
+        )
+        if date_at_object < date.today():
+            new_ml_domain = [
+                leaf
+                for leaf in self._get_new_move_lines_domain(
+                    [], account_ids, company_id, partner_ids, only_posted_moves
+                )
+                if leaf[0] != "id"
+            ]
+            partial_amounts = SQL(
+                """
+                SELECT
+                    line_id,
+                    SUM(amount) AS amount,
+                    SUM(amount_currency) AS amount_currency
+                FROM (
+                    SELECT
+                        debit_move_id AS line_id,
+                        amount,
+                        debit_amount_currency AS amount_currency
+                    FROM account_partial_reconcile
+                    WHERE max_date > %(date_at)s
+                        AND debit_move_id IN (%(new_ml_ids)s)
+                    UNION ALL
+                    SELECT
+                        credit_move_id AS line_id,
+                        -amount,
+                        -credit_amount_currency
+                    FROM account_partial_reconcile
+                    WHERE max_date > %(date_at)s
+                        AND credit_move_id IN (%(new_ml_ids)s)
+                ) partial
+                GROUP BY line_id
+                """,
+                date_at=date_at_object,
+                new_ml_ids=line_model._search(new_ml_domain).subselect(),
+            )
+        return SQL(
+            """
+            SELECT *
+            FROM (
+                SELECT
+                    aml.id,
+                    aml.account_id,
+                    aml.partner_id,
+                    aml.journal_id,
+                    aml.date,
+                    aml.date_maturity,
+                    (
+                        aml.amount_residual + COALESCE(partial_amount.amount, 0)
+                    )::float AS amount_residual,
+                    (
+                        aml.amount_residual_currency
+                        + COALESCE(partial_amount.amount_currency, 0)
+                    )::float AS amount_residual_currency
+                FROM account_move_line aml
+                LEFT JOIN (%(partial_amounts)s) partial_amount
+                    ON partial_amount.line_id = aml.id
+                WHERE (aml.id IN (%(ml_ids)s) OR partial_amount.line_id IS NOT NULL)
+                    AND aml.date <= %(date_at)s
+            ) open_items
+            WHERE ROUND(amount_residual::numeric, 2) != 0
+            """,
+            partial_amounts=partial_amounts,
+            ml_ids=line_model._search(domain).subselect(),
+            date_at=date_at_object,
+        )
+
+    @api.model
+    def _get_residuals_at_date(
+        self,
         company_id,
+        account_ids,
         partner_ids,
+        date_at_object,
+        date_from,
         only_posted_moves,
-        debit_amount_currency,
-        credit_amount_currency,
     ):
-        debit_ids = set(debit_ids)
-        credit_ids = set(credit_ids)
-        in_credit_but_not_in_debit = credit_ids - debit_ids
-        reconciled_ids = list(debit_ids) + list(in_credit_but_not_in_debit)
-        reconciled_ids = set(reconciled_ids)
-        ml_ids = set(ml_ids)
-        new_ml_ids = reconciled_ids - ml_ids
-        new_ml_ids = list(new_ml_ids)
-        new_domain = self._get_new_move_lines_domain(
-            new_ml_ids, account_ids, company_id, partner_ids, only_posted_moves
+        """Residual amounts at ``date_at_object`` of the open journal items,
+        ``{id: (amount_residual, amount_residual_currency)}``."""
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT id, amount_residual, amount_residual_currency
+                FROM (%s) open_items
+                """,
+                self._get_residual_at_date_query(
+                    company_id,
+                    account_ids,
+                    partner_ids,
+                    date_at_object,
+                    date_from,
+                    only_posted_moves,
+                ),
+            )
         )
-        company_currency = self.env["res.company"].browse(company_id).currency_id
-        ml_fields = self._get_ml_fields()
-        new_move_lines = self.env["account.move.line"].search_read(
-            domain=new_domain, fields=ml_fields
+        return {
+            ml_id: (amount_residual, amount_residual_currency)
+            for ml_id, amount_residual, amount_residual_currency in (
+                self.env.cr.fetchall()
+            )
+        }
+
+    @api.model
+    def _get_residual_cache_key(self):
+        """Context of the report changing the journal items of the residuals
+        at date, added to the key of their cache."""
+        return ()
+
+    @api.model
+    @tools.ormcache(
+        "company_id",
+        "account_ids",
+        "partner_ids",
+        "date_at_object",
+        "date_from",
+        "stamp",
+        "self._get_residual_cache_key()",
+    )
+    def _get_cached_residuals_at_date(
+        self, company_id, account_ids, partner_ids, date_at_object, date_from, stamp
+    ):
+        """Residuals at date of the posted journal items, computed once for
+        each stamp of ``account.residual.cache.stamp``. They are computed as
+        superuser, the access rules apply when reading the items."""
+        return frozendict(
+            self.sudo()._get_residuals_at_date(
+                company_id,
+                list(account_ids),
+                list(partner_ids),
+                date_at_object,
+                date_from,
+                True,
+            )
+        )
+
+    @api.model
+    def _get_move_lines_at_date(
+        self,
+        company_id,
+        account_ids,
+        partner_ids,
+        date_at_object,
+        date_from,
+        only_posted_moves,
+    ):
+        """``search_read`` of the journal items open at ``date_at_object``,
+        with ``amount_residual`` and ``amount_residual_currency`` as of that
+        date. With the residual cache enabled, the residuals of the posted
+        items at a past date are reused until an item is posted, reset to
+        draft, deleted or reconciled on or before that date."""
+        self.env.flush_all()
+        stamp_model = self.env["account.residual.cache.stamp"]
+        if (
+            only_posted_moves
+            and date_at_object < date.today()
+            and stamp_model._is_enabled()
+        ):
+            residuals = self._get_cached_residuals_at_date(
+                company_id,
+                tuple(sorted(account_ids)),
+                tuple(sorted(partner_ids or [])),
+                date_at_object,
+                date_from,
+                stamp_model._get_stamp(company_id, date_at_object),
+            )
+        else:
+            residuals = self._get_residuals_at_date(
+                company_id,
+                account_ids,
+                partner_ids,
+                date_at_object,
+                date_from,
+                only_posted_moves,
+            )
+        return self._read_move_lines_at_date(residuals)
+
+    @api.model
+    def _read_move_lines_at_date(self, residuals):
+        """``search_read`` of the journal items of ``residuals``, with their
+        residual amounts at date."""
+        move_lines = self.env["account.move.line"].search_read(
+            domain=[("id", "in", list(residuals))], fields=self._get_ml_fields()
         )
-        move_lines = move_lines + new_move_lines
         for move_line in move_lines:
-            ml_id = move_line["id"]
-            if ml_id in debit_ids:
-                if move_line.get("amount_residual", False):
-                    move_line["amount_residual"] += debit_amount[ml_id]
-                else:
-                    move_line["amount_residual"] = debit_amount[ml_id]
-                if move_line.get("amount_residual_currency", False):
-                    move_line["amount_residual_currency"] += debit_amount_currency[
-                        ml_id
-                    ]
-                else:
-                    move_line["amount_residual_currency"] = debit_amount_currency[ml_id]
-            if ml_id in credit_ids:
-                if move_line.get("amount_residual", False):
-                    move_line["amount_residual"] -= credit_amount[ml_id]
-                else:
-                    move_line["amount_residual"] = -credit_amount[ml_id]
-                if move_line.get("amount_residual_currency", False):
-                    move_line["amount_residual_currency"] -= credit_amount_currency[
-                        ml_id
-                    ]
-                else:
-                    move_line["amount_residual_currency"] = -credit_amount_currency[
-                        ml_id
-                    ]
-            # Set amount_currency=0 to keep the same behaviour as in v13
-            # Conditions: if there is no curency_id defined or it is equal
-            # to the company's curency_id
-            if "amount_currency" in move_line and (
-                "currency_id" not in move_line
-                or move_line["currency_id"] == company_currency.id
-            ):
-                move_line["amount_currency"] = 0
+            amount_residual, amount_residual_currency = residuals[move_line["id"]]
+            move_line["amount_residual"] = amount_residual
+            if "amount_residual_currency" in move_line:
+                move_line["amount_residual_currency"] = amount_residual_currency
         return move_lines
 
     def _get_accounts_data(self, accounts_ids):
@@ -2,11 +2,18 @@
 # Copyright 2020 ForgeFlow S.L. (https://www.forgeflow.com)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
-import operator
-from datetime import date, datetime, timedelta
+import math
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 from odoo import api, models
-from odoo.tools import float_is_zero
+from odoo.tools import SQL
+
+# Fixed aging buckets of the overdue items and their upper limits in days
+AGING_BUCKETS = ["30_days", "60_days", "90_days", "120_days", "older"]
+AGING_BUCKETS_DAYS = [30, 60, 90, 120]
 
 
 class AgedPartnerBalanceReport(models.AbstractModel):
@@ -25,7 +32,7 @@ class AgedPartnerBalanceReport(models.AbstractModel):
         ag_pb_data[acc_id]["90_days"] = 0.0
         ag_pb_data[acc_id]["120_days"] = 0.0
         ag_pb_data[acc_id]["older"] = 0.0
-        for interval_line in self.env.context["age_partner_config"].line_ids:
+        for interval_line in self._get_age_intervals()["interval_lines"]:
             ag_pb_data[acc_id][interval_line] = 0.0
         return ag_pb_data
 
@@ -41,52 +48,84 @@ class AgedPartnerBalanceReport(models.AbstractModel):
         ag_pb_data[acc_id][prt_id]["120_days"] = 0.0
         ag_pb_data[acc_id][prt_id]["older"] = 0.0
         ag_pb_data[acc_id][prt_id]["move_lines"] = []
-        for interval_line in self.env.context["age_partner_config"].line_ids:
+        for interval_line in self._get_age_intervals()["interval_lines"]:
             ag_pb_data[acc_id][prt_id][interval_line] = 0.0
         return ag_pb_data
 
+    @api.model
+    def _compile_age_intervals(self, interval_lines):
+        """Compile the intervals of the aging configuration once for the
+        report. The days overdue are split in ranges starting at the sorted
+        ``breakpoints``; ``lines`` is the interval line of each range, or
+        ``False`` when the days of the range are in no interval."""
+        limits = interval_lines.mapped("inferior_limit")
+
+        def get_interval_line(days):
+            for index, line in enumerate(interval_lines):
+                lower_limit = 0 if not index else limits[index - 1]
+                interval_range = self._get_values_for_range_intervals(
+                    lower_limit, limits[index]
+                )
+                if days in interval_range or days == limits[index]:
+                    return line
+            return False
+
+        # The interval of a line can only change at these days
+        breakpoints = {0}
+        for index, limit in enumerate(limits):
+            lower_limit = 0 if not index else limits[index - 1]
+            for bound in (lower_limit, limit):
+                breakpoints.update({bound, bound + 1})
+        breakpoints = sorted(breakpoints)
+        return {
+            "interval_lines": list(interval_lines),
+            "breakpoints": breakpoints,
+            "lines": [get_interval_line(days) for days in breakpoints],
+        }
+
+    @api.model
+    def _get_age_intervals(self):
+        intervals = self.env.context.get("age_partner_intervals")
+        if intervals is None:
+            intervals = self._compile_age_intervals(
+                self.env.context["age_partner_config"].line_ids
+            )
+        return intervals
+
+    @api.model
+    def _get_aging_bucket(self, due_date, date_at_object):
+        """Fixed bucket and configured interval line (or ``False``) of an
+        item due at ``due_date``."""
+        if not due_date or date_at_object <= due_date:
+            days = 0
+            bucket = "current"
+        else:
+            days = (date_at_object - due_date).days
+            bucket = AGING_BUCKETS[bisect_left(AGING_BUCKETS_DAYS, days)]
+        intervals = self._get_age_intervals()
+        index = bisect_right(intervals["breakpoints"], days) - 1
+        return bucket, intervals["lines"][index] if index >= 0 else False
+
     @api.model
     def _calculate_amounts(
         self, ag_pb_data, acc_id, prt_id, residual, due_date, date_at_object
+    ):
+        bucket, interval_line = self._get_aging_bucket(due_date, date_at_object)
+        return self._add_aged_amounts(
+            ag_pb_data, acc_id, prt_id, residual, bucket, interval_line
+        )
+
+    @api.model
+    def _add_aged_amounts(
+        self, ag_pb_data, acc_id, prt_id, residual, bucket, interval_line
     ):
         ag_pb_data[acc_id]["residual"] += residual
         ag_pb_data[acc_id][prt_id]["residual"] += residual
-        interval_lines = self.env.context["age_partner_config"].line_ids
-        today = date_at_object
-        if not due_date or today <= due_date:
-            ag_pb_data[acc_id]["current"] += residual
-            ag_pb_data[acc_id][prt_id]["current"] += residual
-            due_date = today
-        elif today <= due_date + timedelta(days=30):
-            ag_pb_data[acc_id]["30_days"] += residual
-            ag_pb_data[acc_id][prt_id]["30_days"] += residual
-        elif today <= due_date + timedelta(days=60):
-            ag_pb_data[acc_id]["60_days"] += residual
-            ag_pb_data[acc_id][prt_id]["60_days"] += residual
-        elif today <= due_date + timedelta(days=90):
-            ag_pb_data[acc_id]["90_days"] += residual
-            ag_pb_data[acc_id][prt_id]["90_days"] += residual
-        elif today <= due_date + timedelta(days=120):
-            ag_pb_data[acc_id]["120_days"] += residual
-            ag_pb_data[acc_id][prt_id]["120_days"] += residual
-        else:
-            ag_pb_data[acc_id]["older"] += residual
-            ag_pb_data[acc_id][prt_id]["older"] += residual
-
-        days_difference = abs((today - due_date).days)
-        for index, line in enumerate(interval_lines):
-            lower_limit = 0 if not index else interval_lines[index - 1].inferior_limit
-            next_line = interval_lines[index] if index < len(interval_lines) else None
-            interval_range = self._get_values_for_range_intervals(
-                lower_limit, next_line.inferior_limit
-            )
-            if (
-                days_difference in interval_range
-                or days_difference == line.inferior_limit
-            ):
-                ag_pb_data[acc_id][line] += residual
-                ag_pb_data[acc_id][prt_id][line] += residual
-                break
+        ag_pb_data[acc_id][bucket] += residual
+        ag_pb_data[acc_id][prt_id][bucket] += residual
+        if interval_line:
+            ag_pb_data[acc_id][interval_line] += residual
+            ag_pb_data[acc_id][prt_id][interval_line] += residual
         return ag_pb_data
 
     def _get_values_for_range_intervals(self, num1, num2):
@@ -96,51 +135,152 @@ class AgedPartnerBalanceReport(models.AbstractModel):
             return [max_num]
         return list(range(min_num + 1, max_num))
 
-    def _get_account_partial_reconciled(self, company_id, date_at_object):
-        domain = [("max_date", ">", date_at_object), ("company_id", "=", company_id)]
-        fields = [
-            "debit_move_id",
-            "credit_move_id",
-            "amount",
-            "debit_amount_currency",
-            "credit_amount_currency",
-        ]
-        accounts_partial_reconcile = self.env["account.partial.reconcile"].search_read(
-            domain=domain, fields=fields
+    @api.model
+    def _get_shard_domain(self):
+        """Journal items of the shard of the parallel mode in the context: an
+        account with a range of partner ids (open when a bound is ``None``),
+        or the items without partner of the account when the range is
+        ``(False, False)``."""
+        shard = self.env.context.get("aged_partner_balance_shard")
+        if not shard:
+            return []
+        account_id, partner_from, partner_to = shard
+        domain = [("account_id", "=", account_id)]
+        if partner_from is False:
+            return domain + [("partner_id", "=", False)]
+        domain += [("partner_id", "!=", False)]
+        if partner_from is not None:
+            domain += [("partner_id", ">=", partner_from)]
+        if partner_to is not None:
+            domain += [("partner_id", "<=", partner_to)]
+        return domain
+
+    @api.model
+    def _get_residual_cache_key(self):
+        return (self.env.context.get("aged_partner_balance_shard"),)
+
+    @api.model
+    def _get_move_lines_domain_not_reconciled(
+        self, company_id, account_ids, partner_ids, only_posted_moves, date_from
+    ):
+        domain = super()._get_move_lines_domain_not_reconciled(
+            company_id, account_ids, partner_ids, only_posted_moves, date_from
         )
-        debit_amount = {}
-        debit_amount_currency = {}
-        credit_amount = {}
-        credit_amount_currency = {}
-        for account_partial_reconcile_data in accounts_partial_reconcile:
-            debit_move_id = account_partial_reconcile_data["debit_move_id"][0]
-            credit_move_id = account_partial_reconcile_data["credit_move_id"][0]
-            if debit_move_id not in debit_amount.keys():
-                debit_amount[debit_move_id] = 0.0
-                debit_amount_currency[debit_move_id] = 0.0
-            debit_amount_currency[debit_move_id] += account_partial_reconcile_data[
-                "debit_amount_currency"
-            ]
-            debit_amount[debit_move_id] += account_partial_reconcile_data["amount"]
-            if credit_move_id not in credit_amount.keys():
-                credit_amount[credit_move_id] = 0.0
-                credit_amount_currency[credit_move_id] = 0.0
-            credit_amount[credit_move_id] += account_partial_reconcile_data["amount"]
-            credit_amount_currency[credit_move_id] += account_partial_reconcile_data[
-                "credit_amount_currency"
-            ]
-            account_partial_reconcile_data.update(
-                {"debit_move_id": debit_move_id, "credit_move_id": credit_move_id}
+        return domain + self._get_shard_domain()
+
+    @api.model
+    def _get_new_move_lines_domain(
+        self, new_ml_ids, account_ids, company_id, partner_ids, only_posted_moves
+    ):
+        domain = super()._get_new_move_lines_domain(
+            new_ml_ids, account_ids, company_id, partner_ids, only_posted_moves
+        )
+        return domain + self._get_shard_domain()
+
+    def _get_shards(
+        self, company_id, account_ids, partner_ids, only_posted_moves, date_from
+    ):
+        """Split the journal items of the report by account and ranges of
+        partner ids of about the same number of open items for the workers.
+        The ranges of an account cover every partner id, so that the items
+        reconciled after the report date are in a shard too."""
+        domain = self._get_move_lines_domain_not_reconciled(
+            company_id, account_ids, partner_ids, only_posted_moves, date_from
+        )
+        query = self.env["account.move.line"]._search(domain)
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT account_id, partner_id, COUNT(*)
+                FROM account_move_line
+                WHERE id IN (%s) AND partner_id IS NOT NULL
+                GROUP BY account_id, partner_id
+                ORDER BY account_id, partner_id
+                """,
+                query.subselect(),
             )
-        return (
-            accounts_partial_reconcile,
-            debit_amount,
-            credit_amount,
-            debit_amount_currency,
-            credit_amount_currency,
         )
+        partner_counts = defaultdict(list)
+        total = 0
+        for account_id, partner_id, count in self.env.cr.fetchall():
+            partner_counts[account_id].append((partner_id, count))
+            total += count
+        shard_size = max(1, math.ceil(total / self._get_parallel_workers()))
+        shards = []
+        for account_id in account_ids:
+            shards.append((account_id, False, False))
+            partner_from = None
+            shard_count = 0
+            for partner_id, count in partner_counts[account_id]:
+                shard_count += count
+                if shard_count >= shard_size:
+                    shards.append((account_id, partner_from, partner_id))
+                    partner_from = partner_id + 1
+                    shard_count = 0
+            shards.append((account_id, partner_from, None))
+        return shards
 
-    def _get_move_lines_data(
+    @api.model
+    def _get_parallel_workers(self):
+        return int(
+            self.env["ir.config_parameter"]
+            .sudo()
+            .get_param("account_financial_report.apb_parallel_workers", 4)
+        )
+
+    def _get_move_lines_data_shard(self, snapshot, shard, args):
+        """``_get_move_lines_data`` of a shard in a read-only transaction of
+        its own, which sees the same data as the report transaction, or in
+        the report transaction without ``snapshot``."""
+        if not snapshot:
+            return self._get_move_lines_data_shard_env(self.env, shard, args)
+        with self.env.registry.cursor() as cr:
+            cr.execute(SQL("SET TRANSACTION READ ONLY"))
+            cr.execute(SQL("SET TRANSACTION SNAPSHOT %s", snapshot))
+            return self._get_move_lines_data_shard_env(self.env(cr=cr), shard, args)
+
+    def _get_move_lines_data_shard_env(self, env, shard, args):
+        age_partner_config = self.env.context["age_partner_config"].with_env(env)
+        report = self.with_env(env).with_context(
+            aged_partner_balance_shard=shard,
+            age_partner_config=age_partner_config,
+            age_partner_intervals=self._compile_age_intervals(
+                age_partner_config.line_ids
+            ),
+        )
+        return report._get_move_lines_data(*args)
+
+    def _merge_move_lines_data(self, results):
+        """Merge the ``_get_move_lines_data`` results of the shards."""
+        ag_pb_data = {}
+        partners_data = {}
+        journals_data = {}
+        for shard_ag_pb_data, _accounts, shard_partners, shard_journals in results:
+            partners_data.update(shard_partners)
+            journals_data.update(shard_journals)
+            for acc_id, shard_acc_data in shard_ag_pb_data.items():
+                if acc_id not in ag_pb_data:
+                    ag_pb_data = self._initialize_account(ag_pb_data, acc_id)
+                # The other keys of the account are its partners
+                total_keys = ag_pb_data[acc_id].keys() - {"id"}
+                for key, value in shard_acc_data.items():
+                    if key == "id":
+                        continue
+                    if key in total_keys:
+                        ag_pb_data[acc_id][key] += value
+                        continue
+                    # A partner of an account is in a single shard
+                    ag_pb_data = self._initialize_partner(ag_pb_data, acc_id, key)
+                    prt_data = ag_pb_data[acc_id][key]
+                    for prt_key, prt_value in value.items():
+                        if prt_key == "move_lines":
+                            prt_data["move_lines"] = prt_value
+                        elif prt_key != "id":
+                            prt_data[prt_key] += prt_value
+        accounts_data = self._get_accounts_data(list(ag_pb_data.keys()))
+        return ag_pb_data, accounts_data, partners_data, journals_data
+
+    def _get_move_lines_data_parallel(
         self,
         company_id,
         account_ids,
@@ -150,52 +290,90 @@ class AgedPartnerBalanceReport(models.AbstractModel):
         only_posted_moves,
         show_move_line_details,
     ):
-        domain = self._get_move_lines_domain_not_reconciled(
+        """Same result as ``_get_move_lines_data``, computed by shards of
+        accounts and partners in a pool of workers, each one with its own
+        cursor on a snapshot of the report transaction."""
+        args = (
+            company_id,
+            account_ids,
+            partner_ids,
+            date_at_object,
+            date_from,
+            only_posted_moves,
+            show_move_line_details,
+        )
+        self.env.flush_all()
+        shards = self._get_shards(
             company_id, account_ids, partner_ids, only_posted_moves, date_from
         )
-        ml_fields = self._get_ml_fields()
-        line_model = self.env["account.move.line"]
-        move_lines = line_model.search_read(domain=domain, fields=ml_fields)
+        if self.env.registry.in_test_mode():
+            # The test transaction is not committed, the shards can only be
+            # computed with its cursor
+            results = [
+                self._get_move_lines_data_shard(None, shard, args) for shard in shards
+            ]
+        else:
+            self.env.cr.execute(SQL("SELECT pg_export_snapshot()"))
+            snapshot = self.env.cr.fetchone()[0]
+            workers = min(self._get_parallel_workers(), len(shards))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(
+                    executor.map(
+                        lambda shard: self._get_move_lines_data_shard(
+                            snapshot, shard, args
+                        ),
+                        shards,
+                    )
+                )
+        return self._merge_move_lines_data(results)
+
+    @api.model
+    def _get_reconciled_line_ids(self, ml_ids):
+        """Ids of the journal items opened from the amounts of the details
+        of each item: the item and the items reconciled with it."""
+        reconciled_line_ids = {ml_id: {ml_id} for ml_id in ml_ids}
+        partials = self.env["account.partial.reconcile"].search_read(
+            ["|", ("debit_move_id", "in", ml_ids), ("credit_move_id", "in", ml_ids)],
+            ["debit_move_id", "credit_move_id"],
+            load=False,
+        )
+        for partial in partials:
+            debit_move_id = partial["debit_move_id"]
+            credit_move_id = partial["credit_move_id"]
+            if debit_move_id in reconciled_line_ids:
+                reconciled_line_ids[debit_move_id].add(credit_move_id)
+            if credit_move_id in reconciled_line_ids:
+                reconciled_line_ids[credit_move_id].add(debit_move_id)
+        return {
+            ml_id: sorted(line_ids) for ml_id, line_ids in reconciled_line_ids.items()
+        }
+
+    def _get_move_lines_data(
+        self,
+        company_id,
+        account_ids,
+        partner_ids,
+        date_at_object,
+        date_from,
+        only_posted_moves,
+        show_move_line_details,
+    ):
+        move_lines = self._get_move_lines_at_date(
+            company_id,
+            account_ids,
+            partner_ids,
+            date_at_object,
+            date_from,
+            only_posted_moves,
+        )
         journals_ids = set()
         partners_ids = set()
         partners_data = {}
         ag_pb_data = {}
-        if date_at_object < date.today():
-            (
-                acc_partial_rec,
-                debit_amount,
-                credit_amount,
-                debit_amount_currency,
-                credit_amount_currency,
-            ) = self._get_account_partial_reconciled(company_id, date_at_object)
-            if acc_partial_rec:
-                ml_ids = list(map(operator.itemgetter("id"), move_lines))
-                debit_ids = list(
-                    map(operator.itemgetter("debit_move_id"), acc_partial_rec)
-                )
-                credit_ids = list(
-                    map(operator.itemgetter("credit_move_id"), acc_partial_rec)
-                )
-                move_lines = self._recalculate_move_lines(
-                    move_lines,
-                    debit_ids,
-                    credit_ids,
-                    debit_amount,
-                    credit_amount,
-                    ml_ids,
-                    account_ids,
-                    company_id,
-                    partner_ids,
-                    only_posted_moves,
-                    debit_amount_currency,
-                    credit_amount_currency,
-                )
-        move_lines = [
-            move_line
-            for move_line in move_lines
-            if move_line["date"] <= date_at_object
-            and not float_is_zero(move_line["amount_residual"], precision_digits=2)
-        ]
+        if show_move_line_details:
+            reconciled_line_ids = self._get_reconciled_line_ids(
+                [move_line["id"] for move_line in move_lines]
+            )
         for move_line in move_lines:
             journals_ids.add(move_line["journal_id"][0])
             acc_id = move_line["account_id"][0]
@@ -227,11 +405,14 @@ class AgedPartnerBalanceReport(models.AbstractModel):
                     ref_label = move_line["ref"] + " - " + move_line["name"]
                 move_line_data.update(
                     {
-                        "line_rec": line_model.browse(move_line["id"]),
+                        "id": move_line["id"],
+                        "reconciled_line_ids": reconciled_line_ids[move_line["id"]],
                         "date": move_line["date"],
+                        "move_id": move_line["move_id"][0],
                         "entry": move_line["move_id"][1],
                         "jnl_id": move_line["journal_id"][0],
                         "acc_id": acc_id,
+                        "partner_id": prt_id or False,
                         "partner": prt_name,
                         "ref_label": ref_label,
                         "due_date": move_line["date_maturity"],
@@ -251,6 +432,98 @@ class AgedPartnerBalanceReport(models.AbstractModel):
         accounts_data = self._get_accounts_data(ag_pb_data.keys())
         return ag_pb_data, accounts_data, partners_data, journals_data
 
+    def _get_summary_data(
+        self,
+        company_id,
+        account_ids,
+        partner_ids,
+        date_at_object,
+        date_from,
+        only_posted_moves,
+    ):
+        """Same result as ``_get_move_lines_data`` without the move line
+        details: the residual of the open items at ``date_at_object`` is
+        summed by account, partner, aging bucket and interval line in the
+        database."""
+        self.env.flush_all()
+        intervals = self._get_age_intervals()
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT
+                    account_id,
+                    partner_id,
+                    CASE WHEN days = 0 THEN -1
+                    ELSE width_bucket(days, %(bucket_limits)s::int[]) END AS bucket,
+                    width_bucket(days, %(breakpoints)s::int[]) - 1 AS interval,
+                    SUM(amount_residual) AS residual,
+                    ARRAY_AGG(DISTINCT journal_id) AS journal_ids
+                FROM (
+                    SELECT
+                        account_id,
+                        partner_id,
+                        journal_id,
+                        amount_residual,
+                        CASE
+                            WHEN date_maturity IS NULL
+                                OR date_maturity >= %(date_at)s
+                            THEN 0
+                            ELSE %(date_at)s - date_maturity
+                        END AS days
+                    FROM (%(open_items)s) open_items
+                ) aged_items
+                GROUP BY 1, 2, 3, 4
+                ORDER BY 1, 2
+                """,
+                bucket_limits=[limit + 1 for limit in AGING_BUCKETS_DAYS],
+                breakpoints=intervals["breakpoints"],
+                date_at=date_at_object,
+                open_items=self._get_residual_at_date_query(
+                    company_id,
+                    account_ids,
+                    partner_ids,
+                    date_at_object,
+                    date_from,
+                    only_posted_moves,
+                ),
+            )
+        )
+        rows = self.env.cr.dictfetchall()
+        partner_names = {
+            partner.id: partner.display_name
+            for partner in self.env["res.partner"].browse(
+                {row["partner_id"] for row in rows if row["partner_id"]}
+            )
+        }
+        journals_ids = set()
+        partners_data = {}
+        ag_pb_data = {}
+        for row in rows:
+            journals_ids.update(row["journal_ids"])
+            acc_id = row["account_id"]
+            prt_id = row["partner_id"] or 0
+            if prt_id not in partners_data:
+                partners_data[prt_id] = {
+                    "id": prt_id,
+                    "name": partner_names.get(prt_id, ""),
+                }
+            if acc_id not in ag_pb_data:
+                ag_pb_data = self._initialize_account(ag_pb_data, acc_id)
+            if prt_id not in ag_pb_data[acc_id]:
+                ag_pb_data = self._initialize_partner(ag_pb_data, acc_id, prt_id)
+            bucket = AGING_BUCKETS[row["bucket"]] if row["bucket"] >= 0 else "current"
+            ag_pb_data = self._add_aged_amounts(
+                ag_pb_data,
+                acc_id,
+                prt_id,
+                row["residual"],
+                bucket,
+                intervals["lines"][row["interval"]],
+            )
+        journals_data = self._get_journals_data(list(journals_ids))
+        accounts_data = self._get_accounts_data(list(ag_pb_data.keys()))
+        return ag_pb_data, accounts_data, partners_data, journals_data
+
     @api.model
     def _compute_maturity_date(self, ml, date_at_object):
         ml.update(
@@ -263,43 +536,14 @@ class AgedPartnerBalanceReport(models.AbstractModel):
                 "older": 0.0,
             }
         )
-        interval_lines = self.env.context["age_partner_config"].line_ids
-        for interval_line in interval_lines:
+        for interval_line in self._get_age_intervals()["interval_lines"]:
             ml[interval_line] = 0.0
-        due_date = ml["due_date"]
-        amount = ml["residual"]
-        today = date_at_object
-        if not due_date or today <= due_date:
-            ml["current"] += amount
-            due_date = today
-        elif today <= due_date + timedelta(days=30):
-            ml["30_days"] += amount
-        elif today <= due_date + timedelta(days=60):
-            ml["60_days"] += amount
-        elif today <= due_date + timedelta(days=90):
-            ml["90_days"] += amount
-        elif today <= due_date + timedelta(days=120):
-            ml["120_days"] += amount
-        else:
-            ml["older"] += amount
-        if due_date:
-            days_difference = abs((today - due_date).days)
-            for index, interval_line in enumerate(interval_lines):
-                lower_limit = (
-                    0 if not index else interval_lines[index - 1].inferior_limit
-                )
-                next_line = (
-                    interval_lines[index] if index < len(interval_lines) else None
-                )
-                interval_range = self._get_values_for_range_intervals(
-                    lower_limit, next_line.inferior_limit
-                )
-                if (
-                    days_difference in interval_range
-                    or days_difference == interval_line.inferior_limit
-                ):
-                    ml[interval_line] += amount
-                    break
+        bucket, interval_line = self._get_aging_bucket(
+            ml["due_date"], date_at_object
+        )
+        ml[bucket] += ml["residual"]
+        if interval_line:
+            ml[interval_line] += ml["residual"]
 
     def _create_account_list(
         self,
@@ -422,25 +666,48 @@ class AgedPartnerBalanceReport(models.AbstractModel):
         aged_partner_configuration = self.env[
             "account.age.report.configuration"
         ].browse(data["age_partner_config_id"])
-        (
-            ag_pb_data,
-            accounts_data,
-            partners_data,
-            journals_data,
-        ) = self.with_context(
-            age_partner_config=aged_partner_configuration
-        )._get_move_lines_data(
-            company_id,
-            account_ids,
-            partner_ids,
-            date_at_object,
-            date_from,
-            only_posted_moves,
-            show_move_line_details,
+        report = self.with_context(
+            age_partner_config=aged_partner_configuration,
+            age_partner_intervals=self._compile_age_intervals(
+                aged_partner_configuration.line_ids
+            ),
         )
-        aged_partner_data = self.with_context(
-            age_partner_config=aged_partner_configuration
-        )._create_account_list(
+        if not show_move_line_details and self._get_report_option(
+            data, "apb_sql_summary"
+        ):
+            (
+                ag_pb_data,
+                accounts_data,
+                partners_data,
+                journals_data,
+            ) = report._get_summary_data(
+                company_id,
+                account_ids,
+                partner_ids,
+                date_at_object,
+                date_from,
+                only_posted_moves,
+            )
+        else:
+            if self._get_report_option(data, "apb_parallel"):
+                get_move_lines_data = report._get_move_lines_data_parallel
+            else:
+                get_move_lines_data = report._get_move_lines_data
+            (
+                ag_pb_data,
+                accounts_data,
+                partners_data,
+                journals_data,
+            ) = get_move_lines_data(
+                company_id,
+                account_ids,
+                partner_ids,
+                date_at_object,
+                date_from,
+                only_posted_moves,
+                show_move_line_details,
+            )
+        aged_partner_data = report._create_account_list(
             ag_pb_data,
             accounts_data,
             partners_data,
@@ -448,9 +715,7 @@ class AgedPartnerBalanceReport(models.AbstractModel):
             show_move_line_details,
             date_at_object,
         )
-        aged_partner_data = self.with_context(
-            age_partner_config=aged_partner_configuration
-        )._calculate_percent(aged_partner_data)
+        aged_partner_data = report._calculate_percent(aged_partner_data)
         return {
             "doc_ids": [wizard_id],
             "doc_model": "aged.partner.balance.report.wizard",
@@ -5,10 +5,15 @@
 
 import calendar
 import datetime
+import heapq
+import itertools
 import operator
+import uuid
+
+import psycopg2
 
 from odoo import _, api, models
-from odoo.tools import float_is_zero
+from odoo.tools import SQL, float_is_zero
 
 
 class GeneralLedgerReport(models.AbstractModel):
@@ -106,12 +111,12 @@ class GeneralLedgerReport(models.AbstractModel):
         return domain
 
     def _get_accounts_initial_balance(self, initial_domain_bs, initial_domain_pl):
-        gl_initial_acc_bs = self.env["account.move.line"].read_group(
+        gl_initial_acc_bs = self._read_group_initial_balances(
             domain=initial_domain_bs,
             fields=["account_id", "debit", "credit", "balance", "amount_currency:sum"],
             groupby=["account_id"],
         )
-        gl_initial_acc_pl = self.env["account.move.line"].read_group(
+        gl_initial_acc_pl = self._read_group_initial_balances(
             domain=initial_domain_pl,
             fields=["account_id", "debit", "credit", "balance", "amount_currency:sum"],
             groupby=["account_id"],
@@ -141,7 +146,7 @@ class GeneralLedgerReport(models.AbstractModel):
         domain = self._get_initial_balance_fy_pl_ml_domain(
             account_ids, company_id, fy_start_date, base_domain
         )
-        initial_balances = self.env["account.move.line"].read_group(
+        initial_balances = self._read_group_initial_balances(
             domain=domain,
             fields=["account_id", "debit", "credit", "balance", "amount_currency:sum"],
             groupby=["account_id"],
@@ -198,7 +203,7 @@ class GeneralLedgerReport(models.AbstractModel):
         return getattr(self, method)(data, domain, grouped_by)
 
     def _prepare_gen_ld_data_group_partners(self, data, domain, grouped_by):
-        gl_initial_acc_prt = self.env["account.move.line"].read_group(
+        gl_initial_acc_prt = self._read_group_initial_balances(
             domain=domain,
             fields=[
                 "account_id",
@@ -416,7 +421,19 @@ class GeneralLedgerReport(models.AbstractModel):
         rec_after_date_to_ids = [i[0] for i in rec_after_date_to_ids]
         return rec_after_date_to_ids
 
-    def _prepare_ml_items(self, move_line, grouped_by):
+    def _get_tax_names(self, taxes_ids):
+        """Names of the taxes used to group the move lines by taxes, read once
+        for the whole report."""
+        taxes = (
+            self.env["account.tax"]
+            .with_context(active_test=False)
+            .search_fetch([("id", "in", list(taxes_ids))], ["name"])
+        )
+        return {tax.id: tax.name for tax in taxes}
+
+    def _prepare_ml_items(self, move_line, grouped_by, tax_names=None):
+        """``tax_names`` is the result of ``_get_tax_names`` for the taxes of
+        the move lines. Without it, the taxes are read line by line."""
         res = []
         if grouped_by == "partners":
             item_id = move_line["partner_id"][0] if move_line["partner_id"] else 0
@@ -432,11 +449,10 @@ class GeneralLedgerReport(models.AbstractModel):
                 item_name = move_line["tax_line_id"][1]
                 res.append({"id": item_id, "name": item_name})
             elif move_line["tax_ids"]:
+                if tax_names is None:
+                    tax_names = self._get_tax_names(move_line["tax_ids"])
                 for tax_id in move_line["tax_ids"]:
-                    tax_item = self.env["account.tax"].search_fetch(
-                        [("id", "=", tax_id)], ["name"]
-                    )
-                    res.append({"id": tax_item.id, "name": tax_item.name})
+                    res.append({"id": tax_id, "name": tax_names.get(tax_id, "")})
             else:
                 res.append({"id": 0, "name": "Missing Tax"})
         else:
@@ -470,7 +486,7 @@ class GeneralLedgerReport(models.AbstractModel):
             domain += extra_domain
         ml_fields = self._get_ml_fields()
         move_lines = self.env["account.move.line"].search_read(
-            domain=domain, fields=ml_fields, order="date,move_name"
+            domain=domain, fields=ml_fields, order="date,move_name,id"
         )
         journal_ids = set()
         full_reconcile_ids = set()
@@ -478,10 +494,13 @@ class GeneralLedgerReport(models.AbstractModel):
         analytic_ids = set()
         full_reconcile_data = {}
         acc_prt_account_ids = self._get_acc_prt_accounts_ids(company_id, grouped_by)
+        for move_line in move_lines:
+            taxes_ids.update(move_line["tax_ids"])
+        tax_names = {}
+        if grouped_by == "taxes":
+            tax_names = self._get_tax_names(taxes_ids)
         for move_line in move_lines:
             journal_ids.add(move_line["journal_id"][0])
-            for tax_id in move_line["tax_ids"]:
-                taxes_ids.add(tax_id)
             for analytic_account in move_line["analytic_distribution"] or {}:
                 for analytic_account_id in analytic_account.split(","):
                     analytic_ids.add(int(analytic_account_id))
@@ -504,8 +523,11 @@ class GeneralLedgerReport(models.AbstractModel):
                 gen_ld_data[acc_id]["id"] = acc_id
                 gen_ld_data[acc_id]["mame"] = move_line["account_id"][1]
                 gen_ld_data[acc_id][grouped_by] = False
+            # The move lines are read in the report order, so the final balances
+            # accumulated so far are the running balances of the line.
+            ml_data_list = []
             if acc_id in acc_prt_account_ids:
-                item_ids = self._prepare_ml_items(move_line, grouped_by)
+                item_ids = self._prepare_ml_items(move_line, grouped_by, tax_names)
                 for item in item_ids:
                     item_id = item["id"]
                     if item_id not in gen_ld_data[acc_id]:
@@ -515,9 +537,6 @@ class GeneralLedgerReport(models.AbstractModel):
                         )
                         gen_ld_data[acc_id][item_id]["id"] = item_id
                         gen_ld_data[acc_id][item_id]["name"] = item["name"]
-                    gen_ld_data[acc_id][item_id][ml_id] = self._get_move_line_data(
-                        move_line
-                    )
                     gen_ld_data[acc_id][item_id]["fin_bal"]["credit"] += move_line[
                         "credit"
                     ]
@@ -531,8 +550,15 @@ class GeneralLedgerReport(models.AbstractModel):
                         gen_ld_data[acc_id][item_id]["fin_bal"]["bal_curr"] += (
                             move_line["amount_currency"]
                         )
+                    move_line_data = self._get_move_line_data(move_line)
+                    move_line_data["balance"] = gen_ld_data[acc_id][item_id][
+                        "fin_bal"
+                    ]["balance"]
+                    gen_ld_data[acc_id][item_id][ml_id] = move_line_data
+                    ml_data_list.append(move_line_data)
             else:
                 gen_ld_data[acc_id][ml_id] = self._get_move_line_data(move_line)
+                ml_data_list.append(gen_ld_data[acc_id][ml_id])
             gen_ld_data[acc_id]["fin_bal"]["credit"] += move_line["credit"]
             gen_ld_data[acc_id]["fin_bal"]["debit"] += move_line["debit"]
             gen_ld_data[acc_id]["fin_bal"]["balance"] += move_line["balance"]
@@ -540,6 +566,334 @@ class GeneralLedgerReport(models.AbstractModel):
                 gen_ld_data[acc_id]["fin_bal"]["bal_curr"] += move_line[
                     "amount_currency"
                 ]
+            account_cumul_balance = gen_ld_data[acc_id]["fin_bal"]["balance"]
+            for move_line_data in ml_data_list:
+                move_line_data["account_cumul_balance"] = account_cumul_balance
+            if acc_id not in acc_prt_account_ids:
+                gen_ld_data[acc_id][ml_id]["balance"] = account_cumul_balance
+        journals_data = self._get_journals_data(list(journal_ids))
+        accounts_data = self._get_accounts_data(gen_ld_data.keys())
+        taxes_data = self._get_taxes_data(list(taxes_ids))
+        analytic_data = self._get_analytic_data(list(analytic_ids))
+        rec_after_date_to_ids = self._get_reconciled_after_date_to_ids(
+            full_reconcile_data.keys(), date_to
+        )
+        return (
+            gen_ld_data,
+            accounts_data,
+            journals_data,
+            full_reconcile_data,
+            taxes_data,
+            analytic_data,
+            rec_after_date_to_ids,
+        )
+
+    def _get_period_ml_query(
+        self, domain, grouped_by, acc_prt_account_ids, ordered_account_ids=None
+    ):
+        """Query returning one row per move line and grouping item (partner or
+        tax) with the account and item totals already computed by window
+        functions. Move lines are ordered as in ``_get_period_ml_data``, or
+        account by account when ``ordered_account_ids`` is given."""
+        ml_query = self.env["account.move.line"]._search(domain)
+        if ordered_account_ids is not None:
+            order_join = SQL(
+                """
+                JOIN unnest(%(ordered_account_ids)s::int[])
+                    WITH ORDINALITY AS account_order(account_id, sequence)
+                    ON account_order.account_id = ml_item.account_id
+                """,
+                ordered_account_ids=ordered_account_ids,
+            )
+            order_by = SQL("account_order.sequence, ")
+        else:
+            order_join = order_by = SQL()
+        if grouped_by == "taxes":
+            item_join = SQL(
+                """
+                LEFT JOIN account_move_line_account_tax_rel item_tax_rel
+                    ON item_tax_rel.account_move_line_id = ml_account.id
+                    AND ml_account.tax_line_id IS NULL
+                    AND ml_account.account_id = ANY(%(grouped_account_ids)s)
+                """,
+                grouped_account_ids=acc_prt_account_ids,
+            )
+            item_id = SQL(
+                "COALESCE(ml_account.tax_line_id, item_tax_rel.account_tax_id, 0)"
+            )
+        elif grouped_by == "partners":
+            item_join = SQL()
+            item_id = SQL("COALESCE(ml_account.partner_id, 0)")
+        else:
+            item_join = SQL()
+            item_id = SQL("0")
+        return SQL(
+            """
+            WITH ml AS (
+                SELECT
+                    aml.id,
+                    aml.date,
+                    aml.move_name,
+                    aml.move_id,
+                    aml.journal_id,
+                    aml.account_id,
+                    aml.partner_id,
+                    aml.ref,
+                    aml.name,
+                    aml.tax_line_id,
+                    aml.full_reconcile_id,
+                    aml.matching_number,
+                    aml.currency_id,
+                    aml.analytic_distribution,
+                    aml.debit::float AS debit,
+                    aml.credit::float AS credit,
+                    aml.balance::float AS balance,
+                    aml.amount_currency::float AS amount_currency,
+                    ARRAY(
+                        SELECT tax_rel.account_tax_id
+                        FROM account_move_line_account_tax_rel tax_rel
+                        JOIN account_tax tax ON tax.id = tax_rel.account_tax_id
+                        WHERE tax_rel.account_move_line_id = aml.id
+                        ORDER BY tax.sequence, tax.id
+                    ) AS tax_ids
+                FROM account_move_line aml
+                WHERE aml.id IN (%(ml_query)s)
+            ),
+            ml_account AS (
+                SELECT
+                    ml.*,
+                    SUM(ml.debit) OVER account_window AS account_debit,
+                    SUM(ml.credit) OVER account_window AS account_credit,
+                    SUM(ml.balance) OVER account_window AS account_balance,
+                    SUM(ml.amount_currency) OVER account_window
+                        AS account_amount_currency,
+                    SUM(ml.balance) OVER (
+                        account_window ORDER BY ml.date, ml.move_name, ml.id
+                    ) AS account_cumul_balance
+                FROM ml
+                WINDOW account_window AS (PARTITION BY ml.account_id)
+            ),
+            ml_item AS (
+                SELECT
+                    ml_account.*,
+                    CASE
+                        WHEN ml_account.account_id = ANY(%(grouped_account_ids)s)
+                        THEN %(item_id)s
+                    END AS item_id
+                FROM ml_account
+                %(item_join)s
+            )
+            SELECT
+                ml_item.*,
+                SUM(ml_item.debit) OVER item_window AS item_debit,
+                SUM(ml_item.credit) OVER item_window AS item_credit,
+                SUM(ml_item.balance) OVER item_window AS item_balance,
+                SUM(ml_item.amount_currency) OVER item_window
+                    AS item_amount_currency,
+                SUM(ml_item.balance) OVER (
+                    item_window ORDER BY ml_item.date, ml_item.move_name, ml_item.id
+                ) AS item_cumul_balance
+            FROM ml_item
+            %(order_join)s
+            WINDOW item_window AS (
+                PARTITION BY ml_item.account_id, ml_item.item_id
+            )
+            ORDER BY %(order_by)s ml_item.date, ml_item.move_name, ml_item.id
+            """,
+            ml_query=ml_query.subselect(),
+            grouped_account_ids=acc_prt_account_ids,
+            item_id=item_id,
+            item_join=item_join,
+            order_join=order_join,
+            order_by=order_by,
+        )
+
+    def _get_period_ml_names(self, rows, grouped_by):
+        """Display names of the many2one values that `search_read` would have
+        returned with the move lines, read once for the whole report."""
+        partner_ids = set()
+        tax_ids = set()
+        currency_ids = set()
+        for row in rows:
+            partner_ids.add(row["partner_id"])
+            tax_ids.add(row["tax_line_id"])
+            currency_ids.add(row["currency_id"])
+            if grouped_by == "taxes":
+                tax_ids.add(row["item_id"])
+        partners = self.env["res.partner"].browse([p for p in partner_ids if p])
+        taxes = self.env["account.tax"].browse([t for t in tax_ids if t])
+        currencies = self.env["res.currency"].browse([c for c in currency_ids if c])
+        return {
+            "res.partner": {partner.id: partner.display_name for partner in partners},
+            "account.tax": {tax.id: tax.display_name for tax in taxes},
+            "tax_name": {tax.id: tax.name for tax in taxes},
+            "res.currency": {currency.id: currency.name for currency in currencies},
+        }
+
+    def _get_period_ml_item_name(self, row, grouped_by, names):
+        """Same names as ``_prepare_ml_items``."""
+        item_id = row["item_id"]
+        if grouped_by == "partners":
+            return names["res.partner"][item_id] if item_id else _("Missing Partner")
+        elif grouped_by == "taxes":
+            if not item_id:
+                return "Missing Tax"
+            elif item_id == row["tax_line_id"]:
+                return names["account.tax"][item_id]
+            return names["tax_name"][item_id]
+        return ""
+
+    @api.model
+    def _get_period_ml_vals(self, row, names):
+        """Convert a row of ``_get_period_ml_query`` into the `search_read`
+        values expected by ``_get_move_line_data``."""
+
+        def m2o(model, res_id):
+            return (res_id, names[model][res_id]) if res_id else False
+
+        return {
+            "id": row["id"],
+            "date": row["date"],
+            "move_name": row["move_name"],
+            "move_id": (row["move_id"], row["move_name"]),
+            "journal_id": (row["journal_id"], ""),
+            "account_id": (row["account_id"], ""),
+            "partner_id": m2o("res.partner", row["partner_id"]),
+            "ref": row["ref"],
+            "name": row["name"],
+            "tax_ids": row["tax_ids"],
+            "tax_line_id": m2o("account.tax", row["tax_line_id"]),
+            "debit": row["debit"],
+            "credit": row["credit"],
+            "balance": row["balance"],
+            "amount_currency": row["amount_currency"],
+            "full_reconcile_id": (
+                (row["full_reconcile_id"], row["matching_number"])
+                if row["full_reconcile_id"]
+                else False
+            ),
+            "matching_number": row["matching_number"],
+            "currency_id": m2o("res.currency", row["currency_id"]),
+            "analytic_distribution": row["analytic_distribution"],
+        }
+
+    def _shape_period_ml_rows(self, rows, gen_ld_data, grouped_by, foreign_currency):
+        """Add the rows of ``_get_period_ml_query`` to ``gen_ld_data``. All the
+        rows of an account must be given in the same call. Return the ids of
+        the journals, taxes and analytic accounts used and the full
+        reconciliations data."""
+        names = self._get_period_ml_names(rows, grouped_by)
+        collected = {
+            "journal_ids": set(),
+            "taxes_ids": set(),
+            "analytic_ids": set(),
+            "full_reconcile_data": {},
+        }
+        full_reconcile_data = collected["full_reconcile_data"]
+        totals_done = set()
+        balance_fields = [
+            ("debit", "debit"),
+            ("credit", "credit"),
+            ("balance", "balance"),
+        ]
+        if foreign_currency:
+            balance_fields.append(("bal_curr", "amount_currency"))
+        for row in rows:
+            acc_id = row["account_id"]
+            item_id = row["item_id"]
+            if acc_id not in gen_ld_data:
+                gen_ld_data[acc_id] = self._initialize_data(foreign_currency)
+                gen_ld_data[acc_id]["id"] = acc_id
+                gen_ld_data[acc_id]["mame"] = ""
+                gen_ld_data[acc_id][grouped_by] = False
+            acc_data = gen_ld_data[acc_id]
+            # The window totals are repeated on every row, add them only once
+            if acc_id not in totals_done:
+                totals_done.add(acc_id)
+                for key, column in balance_fields:
+                    acc_data["fin_bal"][key] += row[f"account_{column}"]
+            collected["journal_ids"].add(row["journal_id"])
+            collected["taxes_ids"].update(row["tax_ids"])
+            for analytic_account in row["analytic_distribution"] or {}:
+                for analytic_account_id in analytic_account.split(","):
+                    collected["analytic_ids"].add(int(analytic_account_id))
+            rec_id = row["full_reconcile_id"]
+            if rec_id and rec_id not in full_reconcile_data:
+                full_reconcile_data[rec_id] = {
+                    "id": rec_id,
+                    "name": row["matching_number"],
+                }
+            move_line_data = self._get_move_line_data(
+                self._get_period_ml_vals(row, names)
+            )
+            # The running balances come from the query, ordered as the lines
+            move_line_data["account_cumul_balance"] = (
+                acc_data["init_bal"]["balance"] + row["account_cumul_balance"]
+            )
+            if item_id is None:
+                move_line_data["balance"] = move_line_data["account_cumul_balance"]
+                acc_data[row["id"]] = move_line_data
+                continue
+            if item_id not in acc_data:
+                acc_data[grouped_by] = True
+                acc_data[item_id] = self._initialize_data(foreign_currency)
+                acc_data[item_id]["id"] = item_id
+                acc_data[item_id]["name"] = self._get_period_ml_item_name(
+                    row, grouped_by, names
+                )
+            item_data = acc_data[item_id]
+            if (acc_id, item_id) not in totals_done:
+                totals_done.add((acc_id, item_id))
+                for key, column in balance_fields:
+                    item_data["fin_bal"][key] += row[f"item_{column}"]
+            move_line_data["balance"] = (
+                item_data["init_bal"]["balance"] + row["item_cumul_balance"]
+            )
+            item_data[row["id"]] = move_line_data
+        return collected
+
+    def _get_period_ml_data_sql(
+        self,
+        account_ids,
+        partner_ids,
+        company_id,
+        foreign_currency,
+        only_posted_moves,
+        date_from,
+        date_to,
+        gen_ld_data,
+        cost_center_ids,
+        extra_domain,
+        grouped_by,
+    ):
+        """Same result as ``_get_period_ml_data`` but the account and grouping
+        item totals are computed by the database in a single query, Python only
+        shapes the rows."""
+        domain = self._get_period_domain(
+            account_ids,
+            partner_ids,
+            company_id,
+            only_posted_moves,
+            date_to,
+            date_from,
+            cost_center_ids,
+        )
+        if extra_domain:
+            domain += extra_domain
+        acc_prt_account_ids = self._get_acc_prt_accounts_ids(company_id, grouped_by)
+        self.env["account.move.line"].flush_model()
+        self.env["account.move"].flush_model(["state"])
+        self.env.cr.execute(
+            self._get_period_ml_query(domain, grouped_by, acc_prt_account_ids)
+        )
+        rows = self.env.cr.dictfetchall()
+        collected = self._shape_period_ml_rows(
+            rows, gen_ld_data, grouped_by, foreign_currency
+        )
+        journal_ids = collected["journal_ids"]
+        taxes_ids = collected["taxes_ids"]
+        analytic_ids = collected["analytic_ids"]
+        full_reconcile_data = collected["full_reconcile_data"]
         journals_data = self._get_journals_data(list(journal_ids))
         accounts_data = self._get_accounts_data(gen_ld_data.keys())
         taxes_data = self._get_taxes_data(list(taxes_ids))
@@ -557,6 +911,145 @@ class GeneralLedgerReport(models.AbstractModel):
             rec_after_date_to_ids,
         )
 
+    def _iter_period_ml_rows(self, query, batch_size=2000):
+        """Fetch the rows of ``query`` by batches through a server-side cursor,
+        so that only one batch is held in memory at a time."""
+        cr = self.env.cr
+        # Several streams can be open in the same transaction
+        cursor_name = SQL.identifier(f"general_ledger_stream_{uuid.uuid4().hex}")
+        cr.execute(SQL("DECLARE %s NO SCROLL CURSOR FOR %s", cursor_name, query))
+        try:
+            while True:
+                cr.execute(SQL("FETCH %s FROM %s", batch_size, cursor_name))
+                rows = cr.dictfetchall()
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            # Nothing to close once the request cursor is closed, and an
+            # aborted transaction already dropped the cursor
+            if not cr.closed:
+                try:
+                    with cr.savepoint(flush=False):
+                        cr.execute(SQL("CLOSE %s", cursor_name))
+                except psycopg2.Error:
+                    pass
+
+    def _get_general_ledger_stream(self, data, company, gen_ld_data, chunk_size=2000):
+        """Same data as ``_get_report_values`` but ``general_ledger`` is a
+        generator yielding the accounts one by one, ordered by code. The move
+        lines are streamed from the database by chunks of whole accounts of
+        about ``chunk_size`` lines, and the journals, taxes, analytic accounts
+        and reconciliations dicts are filled once per chunk while the accounts
+        are generated."""
+        grouped_by = data["grouped_by"]
+        domain = self._get_period_domain(
+            data["account_ids"],
+            data["partner_ids"],
+            data["company_id"],
+            data["only_posted_moves"],
+            data["date_to"],
+            data["date_from"],
+            data["cost_center_ids"],
+        )
+        if data["domain"]:
+            domain += data["domain"]
+        period_account_ids = [
+            account.id
+            for account, in self.env["account.move.line"]._read_group(
+                domain, ["account_id"]
+            )
+        ]
+        accounts_data = self._get_accounts_data(
+            list(set(gen_ld_data) | set(period_account_ids))
+        )
+        ordered_account_ids = sorted(
+            accounts_data, key=lambda acc_id: accounts_data[acc_id]["code"]
+        )
+        journals_data = {}
+        full_reconcile_data = {}
+        taxes_data = {}
+        analytic_data = {}
+        acc_prt_account_ids = self._get_acc_prt_accounts_ids(
+            data["company_id"], grouped_by
+        )
+        self.env["account.move.line"].flush_model()
+        self.env["account.move"].flush_model(["state"])
+        query = self._get_period_ml_query(
+            domain, grouped_by, acc_prt_account_ids, ordered_account_ids
+        )
+
+        def generate_chunk(account_ids, rows):
+            chunk_gen_ld_data = {
+                acc_id: gen_ld_data.pop(acc_id)
+                for acc_id in account_ids
+                if acc_id in gen_ld_data
+            }
+            collected = self._shape_period_ml_rows(
+                rows, chunk_gen_ld_data, grouped_by, data["foreign_currency"]
+            )
+            if not chunk_gen_ld_data:
+                return
+            journals_data.update(
+                self._get_journals_data(
+                    list(collected["journal_ids"] - set(journals_data))
+                )
+            )
+            taxes_data.update(
+                self._get_taxes_data(list(collected["taxes_ids"] - set(taxes_data)))
+            )
+            analytic_data.update(
+                self._get_analytic_data(
+                    list(collected["analytic_ids"] - set(analytic_data))
+                )
+            )
+            full_reconcile_data.update(collected["full_reconcile_data"])
+            rec_after_date_to_ids = self._get_reconciled_after_date_to_ids(
+                collected["full_reconcile_data"].keys(), data["date_to"]
+            )
+            for acc_id in account_ids:
+                if acc_id not in chunk_gen_ld_data:
+                    continue
+                for account in self._create_general_ledger(
+                    {acc_id: chunk_gen_ld_data.pop(acc_id)},
+                    accounts_data,
+                    grouped_by,
+                    rec_after_date_to_ids,
+                    data["hide_account_at_0"],
+                ):
+                    yield self._finalize_general_ledger_account(
+                        account, data, company, rec_after_date_to_ids
+                    )
+
+        def generate():
+            account_rows = itertools.groupby(
+                self._iter_period_ml_rows(query),
+                key=operator.itemgetter("account_id"),
+            )
+            next_rows = next(account_rows, None)
+            chunk_account_ids = []
+            chunk_rows = []
+            for acc_id in ordered_account_ids:
+                if next_rows and next_rows[0] == acc_id:
+                    chunk_rows += next_rows[1]
+                    next_rows = next(account_rows, None)
+                chunk_account_ids.append(acc_id)
+                if len(chunk_rows) >= chunk_size:
+                    yield from generate_chunk(chunk_account_ids, chunk_rows)
+                    chunk_account_ids = []
+                    chunk_rows = []
+            if chunk_account_ids:
+                yield from generate_chunk(chunk_account_ids, chunk_rows)
+
+        return (
+            generate(),
+            accounts_data,
+            journals_data,
+            full_reconcile_data,
+            taxes_data,
+            analytic_data,
+        )
+
     @api.model
     def _recalculate_cumul_balance(
         self, move_lines, last_cumul_balance, rec_after_date_to_ids
@@ -568,39 +1061,51 @@ class GeneralLedgerReport(models.AbstractModel):
                 move_line["rec_name"] = "(" + _("future") + ") " + move_line["rec_name"]
         return move_lines
 
+    def _set_future_rec_names(self, move_lines, rec_after_date_to_ids):
+        rec_after_date_to_ids = set(rec_after_date_to_ids)
+        for move_line in move_lines:
+            if move_line["rec_id"] in rec_after_date_to_ids:
+                move_line["rec_name"] = "(" + _("future") + ") " + move_line["rec_name"]
+        return move_lines
+
     def _create_account(self, account, acc_id, gen_led_data, rec_after_date_to_ids):
+        """The move lines are already ordered and their ``balance`` is the
+        running balance of the account."""
         move_lines = []
         for ml_id in gen_led_data[acc_id].keys():
             if not isinstance(ml_id, int):
                 account.update({ml_id: gen_led_data[acc_id][ml_id]})
             else:
                 move_lines += [gen_led_data[acc_id][ml_id]]
-        move_lines = sorted(move_lines, key=lambda k: (k["date"]))
-        move_lines = self._recalculate_cumul_balance(
-            move_lines,
-            gen_led_data[acc_id]["init_bal"]["balance"],
-            rec_after_date_to_ids,
-        )
+        move_lines = self._set_future_rec_names(move_lines, rec_after_date_to_ids)
         account.update({"move_lines": move_lines})
         return account
 
     def _create_account_not_show_item(
         self, account, acc_id, gen_led_data, rec_after_date_to_ids, grouped_by
     ):
-        move_lines = []
+        """Merge the already ordered move lines of every item, showing the
+        running balance of the account instead of the one of the item."""
+        item_move_lines = []
         for prt_id in gen_led_data[acc_id].keys():
             if not isinstance(prt_id, int):
                 account.update({prt_id: gen_led_data[acc_id][prt_id]})
             elif isinstance(gen_led_data[acc_id][prt_id], dict):
-                for ml_id in gen_led_data[acc_id][prt_id].keys():
-                    if isinstance(ml_id, int):
-                        move_lines += [gen_led_data[acc_id][prt_id][ml_id]]
-        move_lines = sorted(move_lines, key=lambda k: (k["date"]))
-        move_lines = self._recalculate_cumul_balance(
-            move_lines,
-            gen_led_data[acc_id]["init_bal"]["balance"],
-            rec_after_date_to_ids,
-        )
+                item_move_lines.append(
+                    [
+                        move_line
+                        for ml_id, move_line in gen_led_data[acc_id][prt_id].items()
+                        if isinstance(ml_id, int)
+                    ]
+                )
+        move_lines = [
+            dict(move_line, balance=move_line["account_cumul_balance"])
+            for move_line in heapq.merge(
+                *item_move_lines,
+                key=lambda k: (k["date"], k["entry"] or "", k["id"]),
+            )
+        ]
+        move_lines = self._set_future_rec_names(move_lines, rec_after_date_to_ids)
         account.update({"move_lines": move_lines, grouped_by: False})
         return account
 
@@ -619,11 +1124,8 @@ class GeneralLedgerReport(models.AbstractModel):
                         group_item.update({ml_id: data[data_id][ml_id]})
                     else:
                         move_lines += [data[data_id][ml_id]]
-                move_lines = sorted(move_lines, key=lambda k: (k["date"]))
-                move_lines = self._recalculate_cumul_balance(
-                    move_lines,
-                    data[data_id]["init_bal"]["balance"],
-                    rec_after_date_to_ids,
+                move_lines = self._set_future_rec_names(
+                    move_lines, rec_after_date_to_ids
                 )
                 group_item.update({"move_lines": move_lines})
                 if (
@@ -759,6 +1261,75 @@ class GeneralLedgerReport(models.AbstractModel):
             list_centralized_ml += list(centralized_ml[jnl_id].values())
         return list_centralized_ml
 
+    def _finalize_general_ledger_account(
+        self, account, data, company, rec_after_date_to_ids
+    ):
+        """Centralize the move lines of the account if needed and set its
+        balances in currency. ``account`` is an item of ``general_ledger``."""
+        grouped_by = data["grouped_by"]
+        foreign_currency = data["foreign_currency"]
+        if data["centralize"] and account["centralized"]:
+            centralized_ml = self._get_centralized_ml(
+                account, data["date_to"], grouped_by
+            )
+            account["move_lines"] = centralized_ml
+            account["move_lines"] = self._recalculate_cumul_balance(
+                account["move_lines"],
+                account["init_bal"]["balance"],
+                rec_after_date_to_ids,
+            )
+            if account[grouped_by]:
+                account[grouped_by] = False
+                del account["list_grouped"]
+        # Set the bal_curr of the initial balance to 0 if it does not correspond
+        # (reducing the corresponding of the bal_curr of the initial balance).
+        if foreign_currency and (
+            not account["currency_id"]
+            or account["currency_id"] != company.currency_id.id
+        ):
+            account["fin_bal"]["bal_curr"] -= account["init_bal"]["bal_curr"]
+            account["init_bal"]["bal_curr"] = 0
+            if "list_grouped" in account:
+                for lg_item in account["list_grouped"]:
+                    lg_item["fin_bal"]["bal_curr"] -= lg_item["init_bal"]["bal_curr"]
+                    lg_item["init_bal"]["bal_curr"] = 0
+        # Set the fin_bal_currency_id value if the account does not have it set
+        # and there are move lines in a currency different from that of
+        # the company (USD for example).
+        fin_bal_currency_ids = []
+        fin_bal_currency_id = account["currency_id"]
+        if account["currency_id"] or not foreign_currency:
+            account["fin_bal_currency_id"] = fin_bal_currency_id
+            return account
+        account["fin_bal"]["bal_curr"] = account["init_bal"]["bal_curr"]
+        if "move_lines" in account:
+            for ml in account["move_lines"]:
+                ml_currency_id = ml["currency_id"][0] if ml["currency_id"] else False
+                if ml_currency_id and ml_currency_id != company.currency_id.id:
+                    account["fin_bal"]["bal_curr"] += ml["bal_curr"]
+                    if ml_currency_id not in fin_bal_currency_ids:
+                        fin_bal_currency_ids.append(ml_currency_id)
+        elif "list_grouped" in account:
+            for lg_item in account["list_grouped"]:
+                lg_item["fin_bal"]["bal_curr"] = lg_item["init_bal"]["bal_curr"]
+                for ml in lg_item["move_lines"]:
+                    ml_currency_id = (
+                        ml["currency_id"][0] if ml["currency_id"] else False
+                    )
+                    if ml_currency_id and ml_currency_id != company.currency_id.id:
+                        lg_item["fin_bal"]["bal_curr"] += ml["bal_curr"]
+                        account["fin_bal"]["bal_curr"] += ml["bal_curr"]
+                        if ml_currency_id not in fin_bal_currency_ids:
+                            fin_bal_currency_ids.append(ml_currency_id)
+        # If there is only 1 currency, we set that one as fin_bal_currency_id
+        # The use of different move lines with different currencies (EUR + GBP)
+        # will be excluded. We use a different field to avoid showing the initial
+        # balance and/or distorting data.
+        if len(fin_bal_currency_ids) == 1:
+            fin_bal_currency_id = fin_bal_currency_ids[0]
+        account["fin_bal_currency_id"] = fin_bal_currency_id
+        return account
+
     # flake8: noqa: C901
     def _get_report_values(self, docids, data):
         wizard_id = data["wizard_id"]
@@ -790,106 +1361,53 @@ class GeneralLedgerReport(models.AbstractModel):
             grouped_by,
         )
         centralize = data["centralize"]
-        (
-            gen_ld_data,
-            accounts_data,
-            journals_data,
-            full_reconcile_data,
-            taxes_data,
-            analytic_data,
-            rec_after_date_to_ids,
-        ) = self._get_period_ml_data(
-            account_ids,
-            partner_ids,
-            company_id,
-            foreign_currency,
-            only_posted_moves,
-            date_from,
-            date_to,
-            gen_ld_data,
-            cost_center_ids,
-            extra_domain,
-            grouped_by,
-        )
-        general_ledger = self._create_general_ledger(
-            gen_ld_data,
-            accounts_data,
-            grouped_by,
-            rec_after_date_to_ids,
-            hide_account_at_0,
-        )
-        if centralize:
+        if self.env.context.get("general_ledger_stream"):
+            (
+                general_ledger,
+                accounts_data,
+                journals_data,
+                full_reconcile_data,
+                taxes_data,
+                analytic_data,
+            ) = self._get_general_ledger_stream(data, company, gen_ld_data)
+        else:
+            if self._get_report_option(data, "gl_sql_engine"):
+                get_period_ml_data = self._get_period_ml_data_sql
+            else:
+                get_period_ml_data = self._get_period_ml_data
+            (
+                gen_ld_data,
+                accounts_data,
+                journals_data,
+                full_reconcile_data,
+                taxes_data,
+                analytic_data,
+                rec_after_date_to_ids,
+            ) = get_period_ml_data(
+                account_ids,
+                partner_ids,
+                company_id,
+                foreign_currency,
+                only_posted_moves,
+                date_from,
+                date_to,
+                gen_ld_data,
+                cost_center_ids,
+                extra_domain,
+                grouped_by,
+            )
+            general_ledger = self._create_general_ledger(
+                gen_ld_data,
+                accounts_data,
+                grouped_by,
+                rec_after_date_to_ids,
+                hide_account_at_0,
+            )
+            general_ledger = sorted(general_ledger, key=lambda k: k["code"])
             for account in general_ledger:
-                if account["centralized"]:
-                    centralized_ml = self._get_centralized_ml(
-                        account, date_to, grouped_by
-                    )
-                    account["move_lines"] = centralized_ml
-                    account["move_lines"] = self._recalculate_cumul_balance(
-                        account["move_lines"],
-                        gen_ld_data[account["id"]]["init_bal"]["balance"],
-                        rec_after_date_to_ids,
-                    )
-                    if account[grouped_by]:
-                        account[grouped_by] = False
-                        del account["list_grouped"]
-        general_ledger = sorted(general_ledger, key=lambda k: k["code"])
-        # Set the bal_curr of the initial balance to 0 if it does not correspond
-        # (reducing the corresponding of the bal_curr of the initial balance).
-        for gl_item in general_ledger:
-            if not foreign_currency:
-                continue
-            if (
-                not gl_item["currency_id"]
-                or gl_item["currency_id"] != company.currency_id.id
-            ):
-                gl_item["fin_bal"]["bal_curr"] -= gl_item["init_bal"]["bal_curr"]
-                gl_item["init_bal"]["bal_curr"] = 0
-                if "list_grouped" in gl_item:
-                    for lg_item in gl_item["list_grouped"]:
-                        lg_item["fin_bal"]["bal_curr"] -= lg_item["init_bal"][
-                            "bal_curr"
-                        ]
-                        lg_item["init_bal"]["bal_curr"] = 0
-        # Set the fin_bal_currency_id value if the account does not have it set
-        # and there are move lines in a currency different from that of
-        # the company (USD for example).
-        for gl_item in general_ledger:
-            fin_bal_currency_ids = []
-            fin_bal_currency_id = gl_item["currency_id"]
-            if gl_item["currency_id"] or not foreign_currency:
-                gl_item["fin_bal_currency_id"] = fin_bal_currency_id
-                continue
-            gl_item["fin_bal"]["bal_curr"] = gl_item["init_bal"]["bal_curr"]
-            if "move_lines" in gl_item:
-                for ml in gl_item["move_lines"]:
-                    ml_currency_id = (
-                        ml["currency_id"][0] if ml["currency_id"] else False
-                    )
-                    if ml_currency_id and ml_currency_id != company.currency_id.id:
-                        gl_item["fin_bal"]["bal_curr"] += ml["bal_curr"]
-                        if ml_currency_id not in fin_bal_currency_ids:
-                            fin_bal_currency_ids.append(ml_currency_id)
-            elif "list_grouped" in gl_item:
-                fin_bal_currency_ids = []
-                for lg_item in gl_item["list_grouped"]:
-                    lg_item["fin_bal"]["bal_curr"] = lg_item["init_bal"]["bal_curr"]
-                    for ml in lg_item["move_lines"]:
-                        ml_currency_id = (
-                            ml["currency_id"][0] if ml["currency_id"] else False
-                        )
-                        if ml_currency_id and ml_currency_id != company.currency_id.id:
-                            lg_item["fin_bal"]["bal_curr"] += ml["bal_curr"]
-                            gl_item["fin_bal"]["bal_curr"] += ml["bal_curr"]
-                            if ml_currency_id not in fin_bal_currency_ids:
-                                fin_bal_currency_ids.append(ml_currency_id)
-            # If there is only 1 currency, we set that one as fin_bal_currency_id
-            # The use of different move lines with different currencies (EUR + GBP)
-            # will be excluded. We use a different field to avoid showing the initial
-            # balance and/or distorting data.
-            if not gl_item["currency_id"] and len(fin_bal_currency_ids) == 1:
-                fin_bal_currency_id = fin_bal_currency_ids[0]
-            gl_item["fin_bal_currency_id"] = fin_bal_currency_id
+                self._finalize_general_ledger_account(
+                    account, data, company, rec_after_date_to_ids
+                )
         return {
             "doc_ids": [wizard_id],
             "doc_model": "general.ledger.report.wizard",
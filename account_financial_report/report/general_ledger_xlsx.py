@@ -132,9 +132,10 @@ class GeneralLedgerXslx(models.AbstractModel):
 
     # flake8: noqa: C901
     def _generate_report_content(self, workbook, report, data, report_data):
-        res_data = self.env[
-            "report.account_financial_report.general_ledger"
-        ]._get_report_values(report, data)
+        report_model = self.env["report.account_financial_report.general_ledger"]
+        if report_model._get_report_option(data, "gl_streaming"):
+            report_model = report_model.with_context(general_ledger_stream=True)
+        res_data = report_model._get_report_values(report, data)
         general_ledger = res_data["general_ledger"]
         accounts_data = res_data["accounts_data"]
         journals_data = res_data["journals_data"]
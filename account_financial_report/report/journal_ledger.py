@@ -6,6 +6,7 @@ import operator
 from collections import defaultdict
 
 from odoo import models
+from odoo.tools import SQL
 
 
 class JournalLedgerReport(models.AbstractModel):
@@ -69,15 +70,37 @@ class JournalLedgerReport(models.AbstractModel):
             "entry": move.name,
         }
 
-    def _get_moves(self, wizard, journal_ids):
-        moves = self.env["account.move"].search(
+    def _get_moves_auto_sequences(self, wizard, journal_ids):
+        """``[(move id, auto sequence)]`` of the moves of the report in the
+        order of ``_get_moves_order``, numbered from 1 in each journal."""
+        query = self.env["account.move"]._search(
             self._get_moves_domain(wizard, journal_ids),
             order=self._get_moves_order(wizard, journal_ids),
         )
+        self.env.cr.execute(
+            query.select(
+                SQL(
+                    "%s, ROW_NUMBER() OVER (PARTITION BY %s ORDER BY %s)",
+                    SQL.identifier(query.table, "id"),
+                    SQL.identifier(query.table, "journal_id"),
+                    query.order or SQL.identifier(query.table, "id"),
+                )
+            )
+        )
+        return self.env.cr.fetchall()
+
+    def _get_moves(self, wizard, journal_ids):
+        auto_sequences = self._get_moves_auto_sequences(wizard, journal_ids)
+        moves = self.env["account.move"].browse(
+            [move_id for move_id, _auto_sequence in auto_sequences]
+        )
         Moves = []
         move_data = {}
-        for move in moves:
+        for move, (_move_id, auto_sequence) in zip(
+            moves, auto_sequences, strict=True
+        ):
             move_data[move.id] = self._get_moves_data(move)
+            move_data[move.id]["auto_sequence"] = auto_sequence
             Moves.append(move_data[move.id])
         return moves.ids, Moves, move_data
 
@@ -181,7 +204,7 @@ class JournalLedgerReport(models.AbstractModel):
     def _get_query_taxes_params(self, move_lines):
         return {"move_line_ids": tuple(move_lines.ids)}
 
-    def _get_move_lines(self, move_ids, wizard, journal_ids):
+    def _get_move_lines(self, move_ids, wizard, journal_ids, auto_sequences=None):
         move_lines = (
             self.env["account.move.line"]
             .with_context(prefetch_fields=False)
@@ -219,13 +242,12 @@ class JournalLedgerReport(models.AbstractModel):
                     "name": tax_name,
                     "description": tax_description,
                 }
-        Move_Lines = {}
-        auto_sequence = len(move_ids)
+        if auto_sequences is None:
+            auto_sequences = dict(self._get_moves_auto_sequences(wizard, journal_ids))
         Move_Lines = defaultdict(list)
         for ml in move_lines:
             move_id = ml.move_id.id
-            if move_id not in Move_Lines:
-                auto_sequence -= 1
+            auto_sequence = auto_sequences.get(move_id, 0)
             taxes = move_line_ids_taxes_data.get(ml.id, {})
             # Check the exigibility of the move line by id
             # this way we avoid the recreation of the recordset which affects to the
@@ -248,48 +270,173 @@ class JournalLedgerReport(models.AbstractModel):
             move_line_ids_taxes_data,
         )
 
+    def _get_move_lines_row_data(self, row, wizard, ml_taxes, auto_sequence):
+        """Same as ``_get_move_lines_data`` from a row of
+        ``_fetch_move_lines``."""
+        exigible = row["exigible"]
+        tax_line_id = row["tax_line_id"]
+        return {
+            "move_line_id": row["id"],
+            "move_id": row["move_id"],
+            "date": row["date"],
+            "journal_id": row["journal_id"],
+            "account_id": row["account_id"],
+            "partner_id": row["partner_id"] or False,
+            "label": False if row["name"] is None else row["name"],
+            "debit": row["debit"],
+            "credit": row["credit"],
+            "company_currency_id": row["company_currency_id"] or False,
+            "amount_currency": row["amount_currency"],
+            "currency_id": row["currency_id"] or False,
+            "tax_line_id": tax_line_id or False,
+            "tax_ids": list(ml_taxes.keys()),
+            "base_debit": exigible and ml_taxes and row["debit"] or 0.0,
+            "base_credit": exigible and ml_taxes and row["credit"] or 0.0,
+            "base_balance": exigible and ml_taxes and row["balance"] or 0.0,
+            "tax_debit": exigible and tax_line_id and row["debit"] or 0.0,
+            "tax_credit": exigible and tax_line_id and row["credit"] or 0.0,
+            "tax_balance": exigible and tax_line_id and row["balance"] or 0.0,
+            "auto_sequence": str(auto_sequence).zfill(6),
+        }
+
+    def _fetch_move_lines(self, move_ids, wizard, journal_ids):
+        """Journal items of the moves as rows, in the order of
+        ``_get_move_lines_order``, with their exigibility and their taxes."""
+        line_model = self.env["account.move.line"]
+        domain = self._get_move_lines_domain(move_ids, wizard, journal_ids)
+        query = line_model._search(
+            domain, order=self._get_move_lines_order(move_ids, wizard, journal_ids)
+        )
+        exigible_query = line_model._search(
+            domain + line_model._get_tax_exigible_domain()
+        )
+        self.env.cr.execute(
+            query.select(
+                SQL(
+                    """
+                    account_move_line.id,
+                    account_move_line.move_id,
+                    account_move_line.date,
+                    account_move_line.journal_id,
+                    account_move_line.account_id,
+                    account_move_line.partner_id,
+                    account_move_line.name,
+                    account_move_line.debit,
+                    account_move_line.credit,
+                    account_move_line.balance,
+                    account_move_line.company_currency_id,
+                    account_move_line.amount_currency,
+                    account_move_line.currency_id,
+                    account_move_line.tax_line_id,
+                    account_move_line.id IN (%(exigible_ids)s) AS exigible,
+                    (
+                        SELECT array_agg(rel.account_tax_id)
+                        FROM account_move_line_account_tax_rel rel
+                        WHERE rel.account_move_line_id = account_move_line.id
+                    ) AS tax_ids
+                    """,
+                    exigible_ids=exigible_query.subselect(),
+                )
+            )
+        )
+        return self.env.cr.dictfetchall()
+
+    def _get_move_lines_from_rows(
+        self, move_ids, wizard, journal_ids, auto_sequences=None
+    ):
+        """Same result as ``_get_move_lines``, built from the rows of
+        ``_fetch_move_lines`` instead of the journal items records."""
+        self.env.flush_all()
+        rows = self._fetch_move_lines(move_ids, wizard, journal_ids)
+        tax_ids = {tax_id for row in rows for tax_id in row["tax_ids"] or []}
+        taxes_data = {
+            tax["id"]: {"name": tax["name"], "description": tax["description"]}
+            for tax in self.env["account.tax"]
+            .with_context(active_test=False)
+            .search_read([("id", "in", list(tax_ids))], ["name", "description"])
+        }
+        if auto_sequences is None:
+            auto_sequences = dict(self._get_moves_auto_sequences(wizard, journal_ids))
+        move_line_ids_taxes_data = {}
+        Move_Lines = defaultdict(list)
+        for row in rows:
+            move_id = row["move_id"]
+            auto_sequence = auto_sequences.get(move_id, 0)
+            taxes = {}
+            if row["tax_ids"]:
+                taxes = move_line_ids_taxes_data[row["id"]] = {
+                    tax_id: taxes_data[tax_id] for tax_id in row["tax_ids"]
+                }
+            Move_Lines[move_id].append(
+                self._get_move_lines_row_data(row, wizard, taxes, auto_sequence)
+            )
+
+        def browse_ids(model, field_name):
+            return self.env[model].browse(
+                {row[field_name] for row in rows if row[field_name]}
+            )
+
+        return (
+            [row["id"] for row in rows],
+            Move_Lines,
+            self._get_account_data(browse_ids("account.account", "account_id")),
+            self._get_partner_data(browse_ids("res.partner", "partner_id")),
+            self._get_currency_data(browse_ids("res.currency", "currency_id")),
+            self._get_tax_line_data(browse_ids("account.tax", "tax_line_id")),
+            move_line_ids_taxes_data,
+        )
+
     def _get_journal_tax_lines(self, wizard, moves_data):
         journals_taxes_data = {}
-        for move_data in moves_data:
-            report_move_lines = move_data["report_move_lines"]
-            for report_move_line in report_move_lines:
-                ml_data = report_move_line
-                tax_ids = []
-                if ml_data["tax_line_id"]:
-                    tax_ids.append(ml_data["tax_line_id"])
-                if ml_data["tax_ids"]:
-                    tax_ids += ml_data["tax_ids"]
-                tax_ids = list(set(tax_ids))
-                journal_id = ml_data["journal_id"]
-                if journal_id not in journals_taxes_data.keys():
-                    journals_taxes_data[journal_id] = {}
-                taxes = self.env["account.tax"].search_fetch(
-                    [("id", "in", tax_ids)], ["name", "description"]
-                )
-                for tax in taxes:
-                    if tax.id not in journals_taxes_data[journal_id]:
-                        journals_taxes_data[journal_id][tax.id] = {
-                            "base_debit": 0.0,
-                            "base_credit": 0.0,
-                            "base_balance": 0.0,
-                            "tax_debit": 0.0,
-                            "tax_credit": 0.0,
-                            "tax_balance": 0.0,
-                            "tax_name": tax.name,
-                            "tax_code": tax.description,
-                        }
-                    field_keys = [
-                        "base_debit",
-                        "base_credit",
-                        "base_balance",
-                        "tax_debit",
-                        "tax_credit",
-                        "tax_balance",
+        field_keys = [
+            "base_debit",
+            "base_credit",
+            "base_balance",
+            "tax_debit",
+            "tax_credit",
+            "tax_balance",
+        ]
+        # Fetch all the taxes of the report at once, the lines only keep the
+        # taxes found, in the order of the taxes
+        report_move_lines = [
+            ml_data
+            for move_data in moves_data
+            for ml_data in move_data["report_move_lines"]
+        ]
+        all_tax_ids = set()
+        for ml_data in report_move_lines:
+            if ml_data["tax_line_id"]:
+                all_tax_ids.add(ml_data["tax_line_id"])
+            all_tax_ids.update(ml_data["tax_ids"] or [])
+        taxes = self.env["account.tax"].search_fetch(
+            [("id", "in", list(all_tax_ids))], ["name", "description"]
+        )
+        taxes_by_id = {tax.id: tax for tax in taxes}
+        tax_sequence = {tax.id: sequence for sequence, tax in enumerate(taxes)}
+        for ml_data in report_move_lines:
+            tax_ids = set(ml_data["tax_ids"] or [])
+            if ml_data["tax_line_id"]:
+                tax_ids.add(ml_data["tax_line_id"])
+            journal_id = ml_data["journal_id"]
+            if journal_id not in journals_taxes_data.keys():
+                journals_taxes_data[journal_id] = {}
+            for tax_id in sorted(tax_ids & taxes_by_id.keys(), key=tax_sequence.get):
+                tax = taxes_by_id[tax_id]
+                if tax.id not in journals_taxes_data[journal_id]:
+                    journals_taxes_data[journal_id][tax.id] = {
+                        "base_debit": 0.0,
+                        "base_credit": 0.0,
+                        "base_balance": 0.0,
+                        "tax_debit": 0.0,
+                        "tax_credit": 0.0,
+                        "tax_balance": 0.0,
+                        "tax_name": tax.name,
+                        "tax_code": tax.description,
+                    }
+                for field_key in field_keys:
+                    journals_taxes_data[journal_id][tax.id][field_key] += ml_data[
+                        field_key
                     ]
-                    for field_key in field_keys:
-                        journals_taxes_data[journal_id][tax.id][field_key] += ml_data[
-                            field_key
-                        ]
         journals_taxes_data_2 = {}
         for journal_id in journals_taxes_data.keys():
             journals_taxes_data_2[journal_id] = []
@@ -299,12 +446,9 @@ class JournalLedgerReport(models.AbstractModel):
                 ]
         return journals_taxes_data_2
 
-    def _get_report_values(self, docids, data):
-        wizard_id = data["wizard_id"]
-        wizard = self.env["journal.ledger.report.wizard"].browse(wizard_id)
-        company = self.env["res.company"].browse(data["company_id"])
-        journal_ids = data["journal_ids"]
-        journal_ledgers_data = self._get_journal_ledgers(wizard, journal_ids, company)
+    def _fill_journal_ledgers(self, wizard, data, journal_ids, journal_ledgers_data):
+        """Read the moves and journal items of ``journal_ids`` and set the
+        moves, tax lines and totals of ``journal_ledgers_data``."""
         move_ids, moves_data, move_ids_data = self._get_moves(wizard, journal_ids)
         journal_moves_data = {}
         for key, items in itertools.groupby(
@@ -317,7 +461,19 @@ class JournalLedgerReport(models.AbstractModel):
             tax_line_ids_data
         ) = move_line_ids_taxes_data = {}
         if move_ids:
-            move_lines = self._get_move_lines(move_ids, wizard, journal_ids)
+            auto_sequences = {
+                move_id: move_data["auto_sequence"]
+                for move_id, move_data in move_ids_data.items()
+            }
+            if self.env[
+                "report.account_financial_report.abstract_report"
+            ]._get_report_option(data, "jl_sql_fetch"):
+                get_move_lines = self._get_move_lines_from_rows
+            else:
+                get_move_lines = self._get_move_lines
+            move_lines = get_move_lines(
+                move_ids, wizard, journal_ids, auto_sequences=auto_sequences
+            )
             move_lines_data = move_lines[1]
             account_ids_data = move_lines[2]
             partner_ids_data = move_lines[3]
@@ -351,7 +507,73 @@ class JournalLedgerReport(models.AbstractModel):
             if journal_id in journal_totals.keys():
                 for item in ["debit", "credit"]:
                     journal_ledger_data[item] += journal_totals[journal_id][item]
-        return {
+        return (
+            moves_data,
+            move_ids_data,
+            account_ids_data,
+            partner_ids_data,
+            currency_ids_data,
+            tax_line_ids_data,
+            move_line_ids_taxes_data,
+        )
+
+    def _iter_journal_ledgers(self, wizard, data, journal_ledgers_data, values):
+        """Yield ``journal_ledgers_data`` one journal at a time: the moves and
+        journal items of a journal are only read when it is reached and are
+        released once the next one is. The dicts of ``values`` shared by the
+        journals are updated in place, the moves of the previous journal are
+        dropped from ``move_ids_data``."""
+        for journal_ledger_data in journal_ledgers_data:
+            journal_values = self._fill_journal_ledgers(
+                wizard, data, [journal_ledger_data["id"]], [journal_ledger_data]
+            )
+            values["move_ids_data"].clear()
+            for key, value in zip(
+                (
+                    "move_ids_data",
+                    "account_ids_data",
+                    "partner_ids_data",
+                    "currency_ids_data",
+                    "tax_line_data",
+                    "move_line_ids_taxes_data",
+                ),
+                journal_values[1:],
+                strict=True,
+            ):
+                values[key].update(value)
+            yield journal_ledger_data
+            journal_ledger_data["report_moves"] = []
+
+    def _get_report_values(self, docids, data):
+        wizard_id = data["wizard_id"]
+        wizard = self.env["journal.ledger.report.wizard"].browse(wizard_id)
+        company = self.env["res.company"].browse(data["company_id"])
+        journal_ids = data["journal_ids"]
+        journal_ledgers_data = self._get_journal_ledgers(wizard, journal_ids, company)
+        chunked = data["group_option"] == "journal" and self.env[
+            "report.account_financial_report.abstract_report"
+        ]._get_report_option(data, "jl_chunked")
+        if chunked:
+            moves_data = []
+            move_ids_data = {}
+            account_ids_data = {}
+            partner_ids_data = {}
+            currency_ids_data = {}
+            tax_line_ids_data = {}
+            move_line_ids_taxes_data = {}
+        else:
+            (
+                moves_data,
+                move_ids_data,
+                account_ids_data,
+                partner_ids_data,
+                currency_ids_data,
+                tax_line_ids_data,
+                move_line_ids_taxes_data,
+            ) = self._fill_journal_ledgers(
+                wizard, data, journal_ids, journal_ledgers_data
+            )
+        values = {
             "doc_ids": [wizard_id],
             "doc_model": "journal.ledger.report.wizard",
             "docs": self.env["journal.ledger.report.wizard"].browse(wizard_id),
@@ -373,3 +595,8 @@ class JournalLedgerReport(models.AbstractModel):
             "Journal_Ledgers": journal_ledgers_data,
             "Moves": moves_data,
         }
+        if chunked:
+            values["Journal_Ledgers"] = self._iter_journal_ledgers(
+                wizard, data, journal_ledgers_data, values
+            )
+        return values
@@ -3,11 +3,11 @@
 # Copyright 2024 Tecnativa - Carolina Fernandez
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
-import operator
-from datetime import date, datetime
+import json
+from datetime import datetime
 
-from odoo import _, api, models
-from odoo.tools import float_is_zero
+from odoo import _, api, fields, models
+from odoo.tools import SQL, float_is_zero
 
 
 class OpenItemsReport(models.AbstractModel):
@@ -15,49 +15,112 @@ class OpenItemsReport(models.AbstractModel):
     _description = "Open Items Report"
     _inherit = "report.account_financial_report.abstract_report"
 
-    def _get_account_partial_reconciled(self, company_id, date_at_object):
-        domain = [("max_date", ">", date_at_object), ("company_id", "=", company_id)]
-        fields = [
-            "debit_move_id",
-            "credit_move_id",
-            "amount",
-            "debit_amount_currency",
-            "credit_amount_currency",
-        ]
-        accounts_partial_reconcile = self.env["account.partial.reconcile"].search_read(
-            domain=domain, fields=fields
+    @api.model
+    def _get_partners_info(self, partner_ids):
+        """Name and salesperson of the partners, fetched at once:
+        ``{partner_id: {"name", "user_id", "user_name"}}``."""
+        partners = (
+            self.env["res.partner"]
+            .with_context(active_test=False)
+            .search_fetch([("id", "in", list(partner_ids))], ["name", "user_id"])
         )
-        debit_amount = {}
-        debit_amount_currency = {}
-        credit_amount = {}
-        credit_amount_currency = {}
-        for account_partial_reconcile_data in accounts_partial_reconcile:
-            debit_move_id = account_partial_reconcile_data["debit_move_id"][0]
-            credit_move_id = account_partial_reconcile_data["credit_move_id"][0]
-            if debit_move_id not in debit_amount.keys():
-                debit_amount[debit_move_id] = 0.0
-                debit_amount_currency[debit_move_id] = 0.0
-            debit_amount[debit_move_id] += account_partial_reconcile_data["amount"]
-            debit_amount_currency[debit_move_id] += account_partial_reconcile_data[
-                "debit_amount_currency"
-            ]
-            if credit_move_id not in credit_amount.keys():
-                credit_amount[credit_move_id] = 0.0
-                credit_amount_currency[credit_move_id] = 0.0
-            credit_amount[credit_move_id] += account_partial_reconcile_data["amount"]
-            credit_amount_currency[credit_move_id] += account_partial_reconcile_data[
-                "credit_amount_currency"
-            ]
-            account_partial_reconcile_data.update(
-                {"debit_move_id": debit_move_id, "credit_move_id": credit_move_id}
+        partners.user_id.fetch(["name"])
+        return {
+            partner.id: {
+                "name": partner.name,
+                "user_id": partner.user_id.id,
+                "user_name": partner.user_id.name,
+            }
+            for partner in partners
+        }
+
+    @api.model
+    def _get_page_residuals(
+        self,
+        company_id,
+        account_ids,
+        partner_ids,
+        date_at_object,
+        date_from,
+        only_posted_moves,
+        page_after,
+        page_size,
+        show_partner_details=True,
+    ):
+        """Residuals at date of the next ``page_size`` open items after the
+        ``page_after`` key, in the order of the report: account code, partner
+        name, partner, date and id, or account code, date and id without the
+        partner details. Return the residuals in that order with the keys of
+        the last item of the page and of the first item of the next page (or
+        ``None``), ``(account code, partner name, partner, date, id,
+        account)``."""
+        self.env.flush_all()
+        company = self.env["res.company"].browse(company_id)
+        if show_partner_details:
+            key_columns = {
+                "account_code": 0,
+                "partner_name": 1,
+                "partner_id": 2,
+                "date": 3,
+                "id": 4,
+            }
+        else:
+            key_columns = {"account_code": 0, "date": 3, "id": 4}
+        order_by = SQL(", ").join(SQL.identifier(column) for column in key_columns)
+        page_where = SQL("TRUE")
+        if page_after:
+            key_values = [page_after[index] for index in key_columns.values()]
+            key_values[list(key_columns).index("date")] = fields.Date.to_date(
+                page_after[3]
+            )
+            page_where = SQL(
+                "(%s) > (%s)",
+                order_by,
+                SQL(", ").join(SQL("%s", value) for value in key_values),
+            )
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT *
+                FROM (
+                    SELECT
+                        account.code_store->>%(root_id)s AS account_code,
+                        COALESCE(partner.name, '') AS partner_name,
+                        COALESCE(open_items.partner_id, 0) AS partner_id,
+                        open_items.date,
+                        open_items.id,
+                        open_items.account_id,
+                        open_items.amount_residual,
+                        open_items.amount_residual_currency
+                    FROM (%(open_items)s) open_items
+                    JOIN account_account account
+                        ON account.id = open_items.account_id
+                    LEFT JOIN res_partner partner
+                        ON partner.id = open_items.partner_id
+                ) page_items
+                WHERE %(page_where)s
+                ORDER BY %(order_by)s
+                LIMIT %(limit)s
+                """,
+                root_id=str(company.root_id.id),
+                open_items=self._get_residual_at_date_query(
+                    company_id,
+                    account_ids,
+                    partner_ids,
+                    date_at_object,
+                    date_from,
+                    only_posted_moves,
+                ),
+                page_where=page_where,
+                order_by=order_by,
+                limit=page_size + 1,
             )
-        return (
-            accounts_partial_reconcile,
-            debit_amount,
-            credit_amount,
-            debit_amount_currency,
-            credit_amount_currency,
         )
+        rows = self.env.cr.fetchall()
+        next_key = rows.pop()[:6] if len(rows) > page_size else None
+        last_key = rows[-1][:6] if rows else None
+        residuals = {row[4]: row[6:] for row in rows}
+        return residuals, last_key, next_key
 
     def _get_data(
         self,
@@ -68,69 +131,47 @@ class OpenItemsReport(models.AbstractModel):
         company_id,
         date_from,
         grouped_by,
+        residuals=None,
     ):
-        domain = self._get_move_lines_domain_not_reconciled(
-            company_id, account_ids, partner_ids, only_posted_moves, date_from
-        )
-        ml_fields = self._get_ml_fields()
-        move_lines = self.env["account.move.line"].search_read(
-            domain=domain, fields=ml_fields
-        )
+        if residuals is None:
+            move_lines = self._get_move_lines_at_date(
+                company_id,
+                account_ids,
+                partner_ids,
+                date_at_object,
+                date_from,
+                only_posted_moves,
+            )
+        else:
+            move_lines = self._read_move_lines_at_date(residuals)
+            # In the order of the page
+            position = {ml_id: index for index, ml_id in enumerate(residuals)}
+            move_lines.sort(key=lambda move_line: position[move_line["id"]])
         journals_ids = set()
         group_ids = set()
         partners_data = {}
-        if date_at_object < date.today():
-            (
-                acc_partial_rec,
-                debit_amount,
-                credit_amount,
-                debit_amount_currency,
-                credit_amount_currency,
-            ) = self._get_account_partial_reconciled(company_id, date_at_object)
-            if acc_partial_rec:
-                ml_ids = list(map(operator.itemgetter("id"), move_lines))
-                debit_ids = list(
-                    map(operator.itemgetter("debit_move_id"), acc_partial_rec)
-                )
-                credit_ids = list(
-                    map(operator.itemgetter("credit_move_id"), acc_partial_rec)
-                )
-                move_lines = self._recalculate_move_lines(
-                    move_lines,
-                    debit_ids,
-                    credit_ids,
-                    debit_amount,
-                    credit_amount,
-                    ml_ids,
-                    account_ids,
-                    company_id,
-                    partner_ids,
-                    only_posted_moves,
-                    debit_amount_currency,
-                    credit_amount_currency,
-                )
-        move_lines = [
-            move_line
-            for move_line in move_lines
-            if move_line["date"] <= date_at_object
-            and not float_is_zero(move_line["amount_residual"], precision_digits=2)
-        ]
+        partners_info = self._get_partners_info(
+            {
+                move_line["partner_id"][0]
+                for move_line in move_lines
+                if move_line["partner_id"]
+            }
+        )
+        no_partner_info = {"name": False, "user_id": False, "user_name": False}
 
         open_items_move_lines_data = {}
         for move_line in move_lines:
             journals_ids.add(move_line["journal_id"][0])
             acc_id = move_line["account_id"][0]
             # Partners data
-            partner = self.env["res.partner"]
-            if move_line.get("partner_id"):
-                partner = self.env["res.partner"].browse(move_line["partner_id"][0])
+            prt_id = move_line["partner_id"] and move_line["partner_id"][0]
+            partner_info = partners_info.get(prt_id, no_partner_info)
             if grouped_by == "salesperson":
-                user = partner.user_id
-                group_id = user.id or 0
-                group_name = user.name or _("Missing Salesperson")
+                group_id = partner_info["user_id"] or 0
+                group_name = partner_info["user_name"] or _("Missing Salesperson")
             else:
-                group_id = partner.id or 0
-                group_name = partner.name or _("Missing Partner")
+                group_id = prt_id or 0
+                group_name = partner_info["name"] or _("Missing Partner")
             if group_id not in group_ids:
                 partners_data.update({group_id: {"id": group_id, "name": group_name}})
                 group_ids.add(group_id)
@@ -155,8 +196,8 @@ class OpenItemsReport(models.AbstractModel):
                     "date_maturity": move_line["date_maturity"]
                     and move_line["date_maturity"].strftime("%d/%m/%Y"),
                     "original": original,
-                    "partner_id": partner.id or 0,
-                    "partner_name": partner.name or "",
+                    "partner_id": prt_id or 0,
+                    "partner_name": partner_info["name"] or "",
                     "ref_label": ref_label,
                     "journal_id": move_line["journal_id"][0],
                     "move_name": move_line["move_id"][1],
@@ -204,6 +245,48 @@ class OpenItemsReport(models.AbstractModel):
                     total_amount[account_id]["residual"] += move_line["amount_residual"]
         return total_amount
 
+    @api.model
+    def _get_residual_totals(
+        self,
+        company_id,
+        account_ids,
+        partner_ids,
+        date_at_object,
+        date_from,
+        only_posted_moves,
+    ):
+        """Same result as ``_calculate_amounts`` for all the open items of
+        ``account_ids``, summed in the database."""
+        total_amount = {}
+        if not account_ids:
+            return total_amount
+        self.env.flush_all()
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT
+                    account_id,
+                    COALESCE(partner_id, 0),
+                    SUM(amount_residual)
+                FROM (%s) open_items
+                GROUP BY 1, 2
+                """,
+                self._get_residual_at_date_query(
+                    company_id,
+                    account_ids,
+                    partner_ids,
+                    date_at_object,
+                    date_from,
+                    only_posted_moves,
+                ),
+            )
+        )
+        for account_id, partner_id, residual in self.env.cr.fetchall():
+            total_amount.setdefault(account_id, {"residual": 0.0})
+            total_amount[account_id][partner_id] = {"residual": residual}
+            total_amount[account_id]["residual"] += residual
+        return total_amount
+
     @api.model
     def _order_open_items_by_date(
         self,
@@ -242,6 +325,20 @@ class OpenItemsReport(models.AbstractModel):
                     new_open_items[acc_id][prt_id] = move_lines
         return new_open_items
 
+    @api.model
+    def _order_open_items_as_read(
+        self, move_lines_data, open_items_move_lines_data, show_partner_details
+    ):
+        """Same structure as ``_order_open_items_by_date``, keeping the order of
+        the journal items read: the pages are cut in the database order, which
+        must not be sorted again with another collation."""
+        if show_partner_details:
+            return open_items_move_lines_data
+        new_open_items = {acc_id: [] for acc_id in open_items_move_lines_data}
+        for move_line in move_lines_data:
+            new_open_items[move_line["account_id"][0]].append(move_line)
+        return new_open_items
+
     def _get_report_values(self, docids, data):
         wizard_id = data["wizard_id"]
         company = self.env["res.company"].browse(data["company_id"])
@@ -254,6 +351,44 @@ class OpenItemsReport(models.AbstractModel):
         only_posted_moves = data["only_posted_moves"]
         show_partner_details = data["show_partner_details"]
         grouped_by = data["grouped_by"]
+        # The HTML preview reads the open items by pages, keyed on the last
+        # item of the previous page, and only the full report groups them by
+        # salesperson
+        page_size = grouped_by != "salesperson" and data.get("page_size")
+        residuals = None
+        page_values = {
+            "page_after": False,
+            "next_page": False,
+            "continued_account_id": False,
+            "continued_partner_id": False,
+        }
+        if page_size:
+            residuals, last_key, next_key = self._get_page_residuals(
+                company_id,
+                account_ids,
+                partner_ids,
+                date_at_object,
+                date_from,
+                only_posted_moves,
+                data.get("page_after"),
+                page_size,
+                show_partner_details=show_partner_details,
+            )
+            page_values["page_after"] = bool(data.get("page_after"))
+            if next_key:
+                page_values.update(
+                    {
+                        "next_page": json.dumps(
+                            [
+                                *last_key[:3],
+                                fields.Date.to_string(last_key[3]),
+                                *last_key[4:],
+                            ]
+                        ),
+                        "continued_account_id": next_key[5],
+                        "continued_partner_id": next_key[2],
+                    }
+                )
         (
             move_lines_data,
             partners_data,
@@ -268,15 +403,32 @@ class OpenItemsReport(models.AbstractModel):
             company_id,
             date_from,
             grouped_by,
+            residuals=residuals,
         )
 
-        total_amount = self._calculate_amounts(open_items_move_lines_data)
-        open_items_move_lines_data = self._order_open_items_by_date(
-            open_items_move_lines_data,
-            show_partner_details,
-            partners_data,
-            accounts_data,
-        )
+        if page_size:
+            # Totals of the whole accounts and partners, not of the page
+            total_amount = self._get_residual_totals(
+                company_id,
+                list(open_items_move_lines_data),
+                partner_ids,
+                date_at_object,
+                date_from,
+                only_posted_moves,
+            )
+        else:
+            total_amount = self._calculate_amounts(open_items_move_lines_data)
+        if page_size:
+            open_items_move_lines_data = self._order_open_items_as_read(
+                move_lines_data, open_items_move_lines_data, show_partner_details
+            )
+        else:
+            open_items_move_lines_data = self._order_open_items_by_date(
+                open_items_move_lines_data,
+                show_partner_details,
+                partners_data,
+                accounts_data,
+            )
         return {
             "doc_ids": [wizard_id],
             "doc_model": "open.items.report.wizard",
@@ -294,6 +446,7 @@ class OpenItemsReport(models.AbstractModel):
             "total_amount": total_amount,
             "Open_Items": open_items_move_lines_data,
             "grouped_by": grouped_by,
+            **page_values,
         }
 
     def _get_ml_fields(self):
@@ -3,9 +3,11 @@
 # Copyright 2020 ForgeFlow S.L. (https://www.forgeflow.com)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+from collections import defaultdict
 
 from odoo import _, api, models
 from odoo.exceptions import UserError
+from odoo.tools import SQL
 from odoo.tools.float_utils import float_is_zero
 
 
@@ -208,8 +210,15 @@ class TrialBalanceReport(models.AbstractModel):
 
     @api.model
     def _compute_account_amount(
-        self, total_amount, tb_initial_acc, tb_period_acc, foreign_currency
+        self,
+        total_amount,
+        tb_initial_acc,
+        tb_period_acc,
+        foreign_currency,
+        period_group_by_data=None,
     ):
+        """``period_group_by_data`` is the result of ``_get_group_by_data`` for
+        the period when grouping by analytic account."""
         for tb in tb_period_acc:
             acc_id = tb["account_id"][0]
             total_amount[acc_id] = self._prepare_total_amount(tb, foreign_currency)
@@ -219,22 +228,9 @@ class TrialBalanceReport(models.AbstractModel):
             total_amount[acc_id]["initial_balance"] = 0.0
             if foreign_currency:
                 total_amount[acc_id]["initial_currency_balance"] = 0.0
-            if "__context" in tb and "group_by" in tb["__context"]:
-                group_by = tb["__context"]["group_by"][0]
+            if period_group_by_data is not None:
                 gb_data = {}
-                tb_grouped = self.env["account.move.line"].read_group(
-                    domain=tb["__domain"],
-                    fields=[
-                        group_by,
-                        "debit",
-                        "credit",
-                        "balance",
-                        "amount_currency:sum",
-                    ],
-                    groupby=[group_by],
-                )
-                for tb2 in tb_grouped:
-                    gb_id = tb2[group_by][0] if tb2[group_by] else 0
+                for gb_id, tb2 in period_group_by_data.get(acc_id, {}).items():
                     gb_data[gb_id] = self._prepare_total_amount(tb2, foreign_currency)
                     gb_data[gb_id]["credit"] = tb2["credit"]
                     gb_data[gb_id]["debit"] = tb2["debit"]
@@ -242,16 +238,16 @@ class TrialBalanceReport(models.AbstractModel):
                     gb_data[gb_id]["initial_balance"] = 0.0
                     if foreign_currency:
                         gb_data[gb_id]["initial_currency_balance"] = 0.0
-                total_amount[acc_id]["group_by"] = group_by
+                total_amount[acc_id]["group_by"] = "analytic_account_ids"
                 total_amount[acc_id]["group_by_data"] = gb_data
         for tb in tb_initial_acc:
             acc_id = tb["account_id"]
             if acc_id not in total_amount.keys():
                 total_amount[acc_id] = self._prepare_total_amount(tb, foreign_currency)
-                total_amount[acc_id]["group_by_data"] = {}
-                total_amount[acc_id]["group_by_data"][0] = self._prepare_total_amount(
-                    tb, foreign_currency
-                )
+                total_amount[acc_id]["group_by_data"] = {
+                    gb_key: self._prepare_total_amount(tb2, foreign_currency)
+                    for gb_key, tb2 in tb.get("group_by_data", {}).items()
+                } or {0: self._prepare_total_amount(tb, foreign_currency)}
             else:
                 total_amount[acc_id]["initial_balance"] = tb["balance"]
                 total_amount[acc_id]["ending_balance"] += tb["balance"]
@@ -312,11 +308,11 @@ class TrialBalanceReport(models.AbstractModel):
                 tb, foreign_currency
             )
         else:
-            # Increase balance field values
-            total_amount[acc_id][prt_id]["initial_balance"] = tb["balance"]
+            # Increase balance field values, a partner has a row by currency
+            total_amount[acc_id][prt_id]["initial_balance"] += tb["balance"]
             total_amount[acc_id][prt_id]["ending_balance"] += tb["balance"]
             if foreign_currency:
-                total_amount[acc_id][prt_id]["initial_currency_balance"] = round(
+                total_amount[acc_id][prt_id]["initial_currency_balance"] += round(
                     tb["amount_currency"], 2
                 )
                 total_amount[acc_id][prt_id]["ending_currency_balance"] += round(
@@ -341,14 +337,25 @@ class TrialBalanceReport(models.AbstractModel):
                     tb["partner_id"][1] if tb["partner_id"] else _("Missing Partner")
                 )
                 partners_data.update({prt_id: {"id": prt_id, "name": partner_name}})
-            total_amount[acc_id][prt_id] = self._prepare_total_amount(
-                tb, foreign_currency
-            )
-            total_amount[acc_id][prt_id]["credit"] = tb["credit"]
-            total_amount[acc_id][prt_id]["debit"] = tb["debit"]
-            total_amount[acc_id][prt_id]["balance"] = tb["balance"]
-            total_amount[acc_id][prt_id]["initial_balance"] = 0.0
-            total_amount[acc_id][prt_id]["partner_name"] = partners_data[prt_id]["name"]
+            prt_amount = total_amount[acc_id].get(prt_id)
+            if prt_amount is None:
+                prt_amount = total_amount[acc_id][prt_id] = (
+                    self._prepare_total_amount(tb, foreign_currency)
+                )
+                prt_amount["initial_balance"] = 0.0
+                if foreign_currency:
+                    prt_amount["initial_currency_balance"] = 0.0
+            else:
+                # The period amounts of a partner have a row by currency
+                prt_amount["ending_balance"] += tb["balance"]
+                if foreign_currency:
+                    prt_amount["ending_currency_balance"] += round(
+                        tb["amount_currency"], 2
+                    )
+            prt_amount["credit"] += tb["credit"]
+            prt_amount["debit"] += tb["debit"]
+            prt_amount["balance"] += tb["balance"]
+            prt_amount["partner_name"] = partners_data[prt_id]["name"]
             partners_ids.add(prt_id)
         for tb in tb_initial_prt:
             acc_id = tb["account_id"][0]
@@ -402,6 +409,209 @@ class TrialBalanceReport(models.AbstractModel):
         for account_id in accounts_to_remove:
             del total_amount[account_id]
 
+    @api.model
+    def _get_group_by_data(self, domains, balance_fields, read_group):
+        """Balances by account and analytic account of the journal items of
+        ``domains``, read with one grouped query by domain. Return a dict by
+        account id of dicts by analytic account id (0 without analytic
+        account)."""
+        group_by_data = {}
+        groupby = ["account_id", "analytic_account_ids"]
+        fields = groupby + [f"{field_name}:sum" for field_name in balance_fields]
+        for domain in domains:
+            groups = read_group(
+                domain=domain, fields=fields, groupby=groupby, lazy=False
+            )
+            for group in groups:
+                acc_data = group_by_data.setdefault(group["account_id"][0], {})
+                gb_id = (
+                    group["analytic_account_ids"][0]
+                    if group["analytic_account_ids"]
+                    else 0
+                )
+                gb_data = acc_data.setdefault(gb_id, dict.fromkeys(balance_fields, 0.0))
+                for field_name in balance_fields:
+                    gb_data[field_name] += group[field_name]
+        return group_by_data
+
+    @api.model
+    def _merge_initial_balances(
+        self, tb_initial_acc, tb_initial_acc_rg, group_by_data=None
+    ):
+        """Add the ``read_group`` results of the initial balances to
+        ``tb_initial_acc``, a dict by account id, and return its values.
+        ``group_by_data`` is the result of ``_get_group_by_data`` when grouping
+        by analytic account."""
+        for account_rg in tb_initial_acc_rg:
+            element = tb_initial_acc.get(account_rg["account_id"][0])
+            if not element:
+                continue
+            element["balance"] += account_rg["balance"]
+            element["amount_currency"] += account_rg["amount_currency"]
+        if group_by_data is not None:
+            for acc_id, element in tb_initial_acc.items():
+                element["group_by"] = "analytic_account_ids"
+                element["group_by_data"] = group_by_data.get(acc_id, {})
+        return list(tb_initial_acc.values())
+
+    @api.model
+    def _get_single_scan_data(
+        self,
+        account_ids,
+        journal_ids,
+        partner_ids,
+        company_id,
+        date_to,
+        date_from,
+        only_posted_moves,
+        show_partner_details,
+        fy_start_date,
+        foreign_currency,
+    ):
+        """Initial balances, period amounts and initial balance of the profit
+        and loss accounts computed with a single scan of the journal items up
+        to ``date_to``, each one aggregated on the lines of its dates range.
+        The amounts are returned in the shape of the ``read_group`` results of
+        the other queries of ``_get_data``."""
+        domain = [
+            leaf
+            for leaf in self._get_period_ml_domain(
+                account_ids,
+                journal_ids,
+                partner_ids,
+                company_id,
+                date_to,
+                date_from,
+                only_posted_moves,
+                show_partner_details,
+            )
+            if leaf[0] != "date"
+        ] + [("date", "<=", date_to)]
+        ml_model = self.env["account.move.line"]
+        ml_model.flush_model()
+        self.env["account.move"].flush_model(["state"])
+        self.env["account.account"].flush_model(["include_initial_balance"])
+        query = ml_model._search(domain)
+        balance_fields = ["debit", "credit", "balance", "amount_currency"]
+        conditions = {
+            "initial": SQL(
+                """aml.date < %(date_from)s AND (
+                    account.include_initial_balance
+                    OR aml.date >= %(fy_start_date)s
+                )""",
+                date_from=date_from,
+                fy_start_date=fy_start_date,
+            ),
+            "period": SQL("aml.date >= %s", date_from),
+            "fy_pl": SQL(
+                "aml.date < %s AND NOT account.include_initial_balance",
+                fy_start_date,
+            ),
+        }
+        aggregates = []
+        for bucket, condition in conditions.items():
+            aggregates.append(
+                SQL(
+                    "COUNT(*) FILTER (WHERE %s) AS %s",
+                    condition,
+                    SQL.identifier(f"{bucket}_count"),
+                )
+            )
+            aggregates += [
+                SQL(
+                    "COALESCE(SUM(aml.%s) FILTER (WHERE %s), 0)::float AS %s",
+                    SQL.identifier(field_name),
+                    condition,
+                    SQL.identifier(f"{bucket}_{field_name}"),
+                )
+                for field_name in balance_fields
+            ]
+        groupby = [SQL("aml.account_id")]
+        if show_partner_details:
+            groupby.append(SQL("aml.partner_id"))
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT %(groupby)s, %(aggregates)s
+                FROM account_move_line aml
+                JOIN account_account account ON account.id = aml.account_id
+                WHERE aml.id IN (%(ml_ids)s)
+                GROUP BY %(groupby)s
+                """,
+                groupby=SQL(", ").join(groupby),
+                aggregates=SQL(", ").join(aggregates),
+                ml_ids=query.subselect(),
+            )
+        )
+        rows = self.env.cr.dictfetchall()
+        account_names = {
+            account.id: account.display_name
+            for account in self.env["account.account"].browse(
+                {row["account_id"] for row in rows}
+            )
+        }
+        partner_names = {
+            partner.id: partner.display_name
+            for partner in self.env["res.partner"].browse(
+                {row["partner_id"] for row in rows if row.get("partner_id")}
+            )
+        }
+        tb_initial_acc = {}
+        tb_period_acc = {}
+        tb_fy_pl_acc = {}
+        tb_initial_prt = []
+        tb_period_prt = []
+        for row in rows:
+            account = (row["account_id"], account_names[row["account_id"]])
+            for bucket, acc_data in (
+                ("initial", tb_initial_acc),
+                ("period", tb_period_acc),
+                ("fy_pl", tb_fy_pl_acc),
+            ):
+                if not row[f"{bucket}_count"]:
+                    continue
+                acc_amounts = acc_data.setdefault(
+                    account[0],
+                    {"account_id": account, **dict.fromkeys(balance_fields, 0.0)},
+                )
+                for field_name in balance_fields:
+                    acc_amounts[field_name] += row[f"{bucket}_{field_name}"]
+            if not show_partner_details:
+                continue
+            partner = row["partner_id"] and (
+                row["partner_id"],
+                partner_names[row["partner_id"]],
+            )
+            for bucket, prt_data in (
+                ("initial", tb_initial_prt),
+                ("period", tb_period_prt),
+            ):
+                if row[f"{bucket}_count"]:
+                    prt_data.append(
+                        {
+                            "account_id": account,
+                            "partner_id": partner,
+                            **{
+                                field_name: row[f"{bucket}_{field_name}"]
+                                for field_name in balance_fields
+                            },
+                        }
+                    )
+        pl_initial_balance = 0.0
+        pl_initial_currency_balance = 0.0
+        for acc_amounts in tb_fy_pl_acc.values():
+            pl_initial_balance += acc_amounts["balance"]
+            if foreign_currency:
+                pl_initial_currency_balance += round(acc_amounts["amount_currency"], 2)
+        return {
+            "tb_initial_acc": list(tb_initial_acc.values()),
+            "tb_period_acc": list(tb_period_acc.values()),
+            "tb_initial_prt": tb_initial_prt,
+            "tb_period_prt": tb_period_prt,
+            "pl_initial_balance": pl_initial_balance,
+            "pl_initial_currency_balance": pl_initial_currency_balance,
+        }
+
     # flake8: noqa: C901
     @api.model
     def _get_data(
@@ -427,14 +637,14 @@ class TrialBalanceReport(models.AbstractModel):
             # don't include unaffected earnings account
             unaffected_earnings_account = False
         accounts = self.env["account.account"].search(accounts_domain)
-        tb_initial_acc = []
-        for account in accounts:
-            tb_initial_acc.append(
-                {"account_id": account.id, "balance": 0.0, "amount_currency": 0.0}
-            )
-        groupby_fields = ["account_id", "currency_id"]
-        if grouped_by:
-            groupby_fields.append("analytic_account_ids")
+        tb_initial_acc = {
+            account.id: {
+                "account_id": account.id,
+                "balance": 0.0,
+                "amount_currency": 0.0,
+            }
+            for account in accounts
+        }
         initial_domain_bs = self._get_initial_balances_bs_ml_domain(
             account_ids,
             journal_ids,
@@ -444,11 +654,6 @@ class TrialBalanceReport(models.AbstractModel):
             only_posted_moves,
             show_partner_details,
         )
-        tb_initial_acc_bs = self.env["account.move.line"].read_group(
-            domain=initial_domain_bs,
-            fields=["account_id", "balance", "amount_currency:sum"],
-            groupby=groupby_fields,
-        )
         initial_domain_pl = self._get_initial_balances_pl_ml_domain(
             account_ids,
             journal_ids,
@@ -459,39 +664,43 @@ class TrialBalanceReport(models.AbstractModel):
             show_partner_details,
             fy_start_date,
         )
-        tb_initial_acc_pl = self.env["account.move.line"].read_group(
-            domain=initial_domain_pl,
-            fields=["account_id", "balance", "amount_currency:sum"],
-            groupby=groupby_fields,
-        )
-        tb_initial_acc_rg = tb_initial_acc_bs + tb_initial_acc_pl
-        for account_rg in tb_initial_acc_rg:
-            element = list(
-                filter(
-                    lambda acc_dict: acc_dict["account_id"]
-                    == account_rg["account_id"][0],
-                    tb_initial_acc,
-                )
+        single_scan_data = None
+        if self.env.context.get("trial_balance_single_scan"):
+            single_scan_data = self._get_single_scan_data(
+                account_ids,
+                journal_ids,
+                partner_ids,
+                company_id,
+                date_to,
+                date_from,
+                only_posted_moves,
+                show_partner_details,
+                fy_start_date,
+                foreign_currency,
             )
-            if element:
-                element[0]["balance"] += account_rg["balance"]
-                element[0]["amount_currency"] += account_rg["amount_currency"]
-                if "__context" in account_rg and "group_by" in account_rg["__context"]:
-                    group_by = account_rg["__context"]["group_by"][0]
-                    gb_data = {}
-                    account_rg_grouped = self.env["account.move.line"].read_group(
-                        domain=account_rg["__domain"],
-                        fields=[group_by, "balance", "amount_currency:sum"],
-                        groupby=[group_by],
-                    )
-                    for a_rg2 in account_rg_grouped:
-                        gb_id = a_rg2[group_by][0] if a_rg2[group_by] else 0
-                        gb_data[gb_id] = {
-                            "balance": a_rg2["balance"],
-                            "amount_currency": a_rg2["amount_currency"],
-                        }
-                    element[0]["group_by"] = group_by
-                    element[0]["group_by_data"] = gb_data
+            tb_initial_acc_rg = single_scan_data["tb_initial_acc"]
+        else:
+            tb_initial_acc_bs = self._read_group_initial_balances(
+                domain=initial_domain_bs,
+                fields=["account_id", "balance", "amount_currency:sum"],
+                groupby=["account_id"],
+            )
+            tb_initial_acc_pl = self._read_group_initial_balances(
+                domain=initial_domain_pl,
+                fields=["account_id", "balance", "amount_currency:sum"],
+                groupby=["account_id"],
+            )
+            tb_initial_acc_rg = tb_initial_acc_bs + tb_initial_acc_pl
+        initial_group_by_data = None
+        if grouped_by:
+            initial_group_by_data = self._get_group_by_data(
+                [initial_domain_bs, initial_domain_pl],
+                ["balance", "amount_currency"],
+                self._read_group_initial_balances,
+            )
+        tb_initial_acc = self._merge_initial_balances(
+            tb_initial_acc, tb_initial_acc_rg, initial_group_by_data
+        )
         if hide_account_at_0:
             tb_initial_acc = [p for p in tb_initial_acc if p["balance"] != 0]
 
@@ -505,14 +714,35 @@ class TrialBalanceReport(models.AbstractModel):
             only_posted_moves,
             show_partner_details,
         )
-        tb_period_acc = self.env["account.move.line"].read_group(
-            domain=period_domain,
-            fields=["account_id", "debit", "credit", "balance", "amount_currency:sum"],
-            groupby=groupby_fields,
-        )
+        if single_scan_data:
+            tb_period_acc = single_scan_data["tb_period_acc"]
+        else:
+            tb_period_acc = self.env["account.move.line"].read_group(
+                domain=period_domain,
+                fields=[
+                    "account_id",
+                    "debit",
+                    "credit",
+                    "balance",
+                    "amount_currency:sum",
+                ],
+                groupby=["account_id"],
+            )
+        period_group_by_data = None
+        if grouped_by:
+            period_group_by_data = self._get_group_by_data(
+                [period_domain],
+                ["debit", "credit", "balance", "amount_currency"],
+                self.env["account.move.line"].read_group,
+            )
 
-        if show_partner_details:
-            tb_initial_prt_bs = self.env["account.move.line"].read_group(
+        if show_partner_details and single_scan_data:
+            tb_initial_prt = single_scan_data["tb_initial_prt"]
+            if hide_account_at_0:
+                tb_initial_prt = [p for p in tb_initial_prt if p["balance"] != 0]
+            tb_period_prt = single_scan_data["tb_period_prt"]
+        elif show_partner_details:
+            tb_initial_prt_bs = self._read_group_initial_balances(
                 domain=initial_domain_bs,
                 fields=["account_id", "partner_id", "balance", "amount_currency:sum"],
                 groupby=["account_id", "partner_id", "currency_id"],
@@ -542,7 +772,11 @@ class TrialBalanceReport(models.AbstractModel):
         total_amount = {}
         partners_data = []
         total_amount = self._compute_account_amount(
-            total_amount, tb_initial_acc, tb_period_acc, foreign_currency
+            total_amount,
+            tb_initial_acc,
+            tb_period_acc,
+            foreign_currency,
+            period_group_by_data,
         )
         if show_partner_details:
             total_amount, partners_data = self._compute_partner_amount(
@@ -582,19 +816,25 @@ class TrialBalanceReport(models.AbstractModel):
                 )
                 total_amount[unaffected_id]["group_by_data"][0] = group_by_data_item
         accounts_data = self._get_accounts_data(accounts_ids)
-        (
-            pl_initial_balance,
-            pl_initial_currency_balance,
-        ) = self._get_pl_initial_balance(
-            account_ids,
-            journal_ids,
-            partner_ids,
-            company_id,
-            fy_start_date,
-            only_posted_moves,
-            show_partner_details,
-            foreign_currency,
-        )
+        if single_scan_data:
+            pl_initial_balance = single_scan_data["pl_initial_balance"]
+            pl_initial_currency_balance = single_scan_data[
+                "pl_initial_currency_balance"
+            ]
+        else:
+            (
+                pl_initial_balance,
+                pl_initial_currency_balance,
+            ) = self._get_pl_initial_balance(
+                account_ids,
+                journal_ids,
+                partner_ids,
+                company_id,
+                fy_start_date,
+                only_posted_moves,
+                show_partner_details,
+                foreign_currency,
+            )
         if unaffected_id:
             total_amount[unaffected_id]["ending_balance"] += pl_initial_balance
             total_amount[unaffected_id]["initial_balance"] += pl_initial_balance
@@ -687,16 +927,38 @@ class TrialBalanceReport(models.AbstractModel):
         trial_balance = sorted(trial_balance, key=lambda k: k["name"])
         return trial_balance, total_amount_grouped
 
-    def _get_hierarchy_groups(self, group_ids, groups_data, foreign_currency):
-        processed_groups = []
+    @api.model
+    def _prepare_group_data(self, group_index_data, foreign_currency):
+        """Empty amounts of an account group of the hierarchy index."""
+        res = {
+            "id": group_index_data["id"],
+            "code": group_index_data["code"],
+            "name": group_index_data["name"],
+            "parent_id": group_index_data["parent_id"],
+            "type": "group_type",
+            "complete_code": group_index_data["complete_code"],
+            "account_ids": list(group_index_data["account_ids"]),
+            "initial_balance": 0.0,
+            "credit": 0.0,
+            "debit": 0.0,
+            "balance": 0.0,
+            "ending_balance": 0.0,
+        }
+        if foreign_currency:
+            res["initial_currency_balance"] = 0.0
+            res["ending_currency_balance"] = 0.0
+        return res
+
+    def _get_hierarchy_groups(
+        self, group_ids, groups_data, foreign_currency, company_id=None
+    ):
+        groups_index = self.env["account.group"]._get_hierarchy_index(
+            company_id or self.env.company.id
+        )["groups"]
+        processed_groups = set()
         # Sort groups so that parent groups are processed before child groups
-        groups = (
-            self.env["account.group"]
-            .browse(group_ids)
-            .sorted(key=lambda x: x.complete_code)
-        )
-        for group in groups:
-            group_id = group.id
+        group_ids = sorted(group_ids, key=lambda x: groups_data[x]["complete_code"])
+        for group_id in group_ids:
             parent_id = groups_data[group_id]["parent_id"]
             if group_id in processed_groups:
                 raise UserError(
@@ -707,29 +969,12 @@ class TrialBalanceReport(models.AbstractModel):
                     % groups_data[group_id]["name"]
                 )
             else:
-                processed_groups.append(parent_id)
+                processed_groups.add(parent_id)
             while parent_id:
                 if parent_id not in groups_data.keys():
-                    group = self.env["account.group"].browse(parent_id)
-                    groups_data[group.id] = {
-                        "id": group.id,
-                        "code": group.code_prefix_start,
-                        "name": group.name,
-                        "parent_id": group.parent_id.id,
-                        "complete_code": group.complete_code,
-                        "account_ids": group.compute_account_ids.ids,
-                        "type": "group_type",
-                        "initial_balance": 0,
-                        "debit": 0,
-                        "credit": 0,
-                        "balance": 0,
-                        "ending_balance": 0,
-                    }
-                    if foreign_currency:
-                        groups_data[group.id].update(
-                            initial_currency_balance=0,
-                            ending_currency_balance=0,
-                        )
+                    groups_data[parent_id] = self._prepare_group_data(
+                        groups_index[parent_id], foreign_currency
+                    )
                 acc_keys = ["debit", "credit", "balance"]
                 acc_keys += ["initial_balance", "ending_balance"]
                 for acc_key in acc_keys:
@@ -744,45 +989,28 @@ class TrialBalanceReport(models.AbstractModel):
                 parent_id = groups_data[parent_id]["parent_id"]
         return groups_data
 
-    def _get_groups_data(self, accounts_data, total_amount, foreign_currency):
-        accounts_ids = list(accounts_data.keys())
-        accounts = self.env["account.account"].browse(accounts_ids)
-        account_group_relation = {}
-        for account in accounts:
-            accounts_data[account.id]["complete_code"] = (
-                account.group_id.complete_code + " / " + account.code
-                if account.group_id.id
+    def _get_groups_data(
+        self, accounts_data, total_amount, foreign_currency, company_id=None
+    ):
+        company_id = company_id or self.env.company.id
+        hierarchy_index = self.env["account.group"]._get_hierarchy_index(company_id)
+        groups_index = hierarchy_index["groups"]
+        account_group_relation = defaultdict(list)
+        for account_id, account_data in accounts_data.items():
+            group_id = hierarchy_index["account_group"].get(account_id)
+            account_data["complete_code"] = (
+                groups_index[group_id]["complete_code"] + " / " + account_data["code"]
+                if group_id
                 else ""
             )
-            if account.group_id.id:
-                if account.group_id.id not in account_group_relation.keys():
-                    account_group_relation.update({account.group_id.id: [account.id]})
-                else:
-                    account_group_relation[account.group_id.id].append(account.id)
-        groups = self.env["account.group"].browse(account_group_relation.keys())
-        groups_data = {}
-        for group in groups:
-            groups_data.update(
-                {
-                    group.id: {
-                        "id": group.id,
-                        "code": group.code_prefix_start,
-                        "name": group.name,
-                        "parent_id": group.parent_id.id,
-                        "type": "group_type",
-                        "complete_code": group.complete_code,
-                        "account_ids": group.compute_account_ids.ids,
-                        "initial_balance": 0.0,
-                        "credit": 0.0,
-                        "debit": 0.0,
-                        "balance": 0.0,
-                        "ending_balance": 0.0,
-                    }
-                }
+            if group_id:
+                account_group_relation[group_id].append(account_id)
+        groups_data = {
+            group_id: self._prepare_group_data(
+                groups_index[group_id], foreign_currency
             )
-            if foreign_currency:
-                groups_data[group.id]["initial_currency_balance"] = 0.0
-                groups_data[group.id]["ending_currency_balance"] = 0.0
+            for group_id in account_group_relation
+        }
         for group_id in account_group_relation.keys():
             for account_id in account_group_relation[group_id]:
                 groups_data[group_id]["initial_balance"] += total_amount[account_id][
@@ -806,55 +1034,42 @@ class TrialBalanceReport(models.AbstractModel):
             group_ids,
             groups_data,
             foreign_currency,
+            company_id,
         )
         return groups_data
 
     def _get_computed_groups_data(self, accounts_data, total_amount, foreign_currency):
-        groups = self.env["account.group"].search([("id", "!=", False)])
+        group_model = self.env["account.group"]
+        groups = group_model.search([("id", "!=", False)])
+        amount_fields = [
+            "initial_balance",
+            "debit",
+            "credit",
+            "balance",
+            "ending_balance",
+        ]
+        if foreign_currency:
+            amount_fields += ["initial_currency_balance", "ending_currency_balance"]
         groups_data = {}
+        groups_by_prefix = defaultdict(list)
         for group in groups:
-            len_group_code = len(group.code_prefix_start)
-            groups_data.update(
-                {
-                    group.id: {
-                        "id": group.id,
-                        "code": group.code_prefix_start,
-                        "name": group.name,
-                        "parent_id": group.parent_id.id,
-                        "type": "group_type",
-                        "complete_code": group.complete_code,
-                        "account_ids": group.compute_account_ids.ids,
-                        "initial_balance": 0.0,
-                        "credit": 0.0,
-                        "debit": 0.0,
-                        "balance": 0.0,
-                        "ending_balance": 0.0,
-                    }
-                }
+            hierarchy_index = group_model._get_hierarchy_index(group.company_id.id)
+            groups_data[group.id] = self._prepare_group_data(
+                hierarchy_index["groups"][group.id], foreign_currency
             )
-            if foreign_currency:
-                groups_data[group.id]["initial_currency_balance"] = 0.0
-                groups_data[group.id]["ending_currency_balance"] = 0.0
-            for account in accounts_data.values():
-                if group.code_prefix_start == account["code"][:len_group_code]:
-                    acc_id = account["id"]
-                    group_id = group.id
-                    groups_data[group_id]["initial_balance"] += total_amount[acc_id][
-                        "initial_balance"
-                    ]
-                    groups_data[group_id]["debit"] += total_amount[acc_id]["debit"]
-                    groups_data[group_id]["credit"] += total_amount[acc_id]["credit"]
-                    groups_data[group_id]["balance"] += total_amount[acc_id]["balance"]
-                    groups_data[group_id]["ending_balance"] += total_amount[acc_id][
-                        "ending_balance"
-                    ]
-                    if foreign_currency:
-                        groups_data[group_id]["initial_currency_balance"] += (
-                            total_amount[acc_id]["initial_currency_balance"]
-                        )
-                        groups_data[group_id]["ending_currency_balance"] += (
-                            total_amount[acc_id]["ending_currency_balance"]
-                        )
+            groups_by_prefix[group.code_prefix_start].append(groups_data[group.id])
+        # An account belongs to every group whose prefix starts its code, so
+        # only the prefixes of the code of the lengths in use are looked up.
+        prefix_lengths = sorted({len(prefix) for prefix in groups_by_prefix})
+        for account in accounts_data.values():
+            code = account["code"]
+            acc_amount = total_amount[account["id"]]
+            for prefix_length in prefix_lengths:
+                if prefix_length > len(code):
+                    break
+                for group_data in groups_by_prefix.get(code[:prefix_length], []):
+                    for field_name in amount_fields:
+                        group_data[field_name] += acc_amount[field_name]
         return groups_data
 
     def _get_report_values(self, docids, data):
@@ -875,7 +1090,10 @@ class TrialBalanceReport(models.AbstractModel):
         unaffected_earnings_account = data["unaffected_earnings_account"]
         fy_start_date = data["fy_start_date"]
         grouped_by = data["grouped_by"]
-        total_amount, accounts_data, partners_data = self._get_data(
+        report = self
+        if self._get_report_option(data, "tb_single_scan"):
+            report = self.with_context(trial_balance_single_scan=True)
+        total_amount, accounts_data, partners_data = report._get_data(
             account_ids,
             journal_ids,
             partner_ids,
@@ -932,7 +1150,7 @@ class TrialBalanceReport(models.AbstractModel):
                     )
             if show_hierarchy:
                 groups_data = self._get_groups_data(
-                    accounts_data, total_amount, foreign_currency
+                    accounts_data, total_amount, foreign_currency, company_id
                 )
                 trial_balance = list(groups_data.values())
                 trial_balance += list(accounts_data.values())
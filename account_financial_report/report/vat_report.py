@@ -2,9 +2,8 @@
 # Copyright 2020 ForgeFlow S.L. (https://www.forgeflow.com)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
-import operator
-
 from odoo import api, models
+from odoo.tools import SQL
 
 
 class VATReport(models.AbstractModel):
@@ -56,45 +55,95 @@ class VATReport(models.AbstractModel):
             domain += [("move_id.state", "in", ["posted", "draft"])]
         return domain
 
-    def _get_vat_report_data(self, company_id, date_from, date_to, only_posted_moves):
-        tax_domain = self._get_tax_report_domain(
-            company_id, date_from, date_to, only_posted_moves
-        )
-        ml_fields = self._get_ml_fields_vat_report()
-        tax_move_lines = self.env["account.move.line"].search_read(
-            domain=tax_domain,
-            fields=ml_fields,
+    def _get_vat_report_data(
+        self, company_id, date_from, date_to, only_posted_moves, periods=()
+    ):
+        """Net and tax amounts by tax, summed in the database: the tax lines
+        by ``tax_line_id`` and the taxed base lines by each of their
+        ``tax_ids``. The amounts of each of the (date from, date to)
+        ``periods`` are bucketed in the same query, in ``periods``."""
+        buckets = [(date_from, date_to)] + list(periods)
+        scan_date_from = min(bucket[0] for bucket in buckets)
+        scan_date_to = max(bucket[1] for bucket in buckets)
+        tax_query = self.env["account.move.line"]._search(
+            self._get_tax_report_domain(
+                company_id, scan_date_from, scan_date_to, only_posted_moves
+            )
         )
-        net_domain = self._get_net_report_domain(
-            company_id, date_from, date_to, only_posted_moves
+        net_query = self.env["account.move.line"]._search(
+            self._get_net_report_domain(
+                company_id, scan_date_from, scan_date_to, only_posted_moves
+            )
         )
-        taxed_move_lines = self.env["account.move.line"].search_read(
-            domain=net_domain,
-            fields=ml_fields,
+        self.env.flush_all()
+        self.env.cr.execute(
+            SQL(
+                """
+                SELECT
+                    vat.tax_id,
+                    bucket.seq,
+                    SUM(vat.net)::float,
+                    SUM(vat.tax)::float
+                FROM (
+                    SELECT
+                        aml.tax_line_id AS tax_id,
+                        aml.date,
+                        0.0 AS net,
+                        aml.balance AS tax
+                    FROM account_move_line aml
+                    WHERE aml.id IN %(tax_query)s
+                    UNION ALL
+                    SELECT rel.account_tax_id, aml.date, aml.balance, 0.0
+                    FROM account_move_line aml
+                    JOIN account_move_line_account_tax_rel rel
+                        ON rel.account_move_line_id = aml.id
+                    WHERE aml.id IN %(net_query)s
+                ) vat
+                JOIN unnest(%(date_froms)s::date[], %(date_tos)s::date[])
+                    WITH ORDINALITY AS bucket(date_from, date_to, seq)
+                    ON vat.date BETWEEN bucket.date_from AND bucket.date_to
+                GROUP BY 1, 2
+                """,
+                tax_query=tax_query.subselect(),
+                net_query=net_query.subselect(),
+                date_froms=[bucket[0] for bucket in buckets],
+                date_tos=[bucket[1] for bucket in buckets],
+            )
         )
-        taxed_move_lines = list(filter(lambda d: d["tax_ids"], taxed_move_lines))
-        vat_data = []
-        for tax_move_line in tax_move_lines:
-            vat_data.append(
+        vat_data = {}
+        for tax_id, seq, net, tax in self.env.cr.fetchall():
+            vat = vat_data.setdefault(
+                tax_id,
                 {
                     "net": 0.0,
-                    "tax": tax_move_line["balance"],
-                    "tax_line_id": tax_move_line["tax_line_id"][0],
-                }
+                    "tax": 0.0,
+                    "tax_line_id": tax_id,
+                    "periods": [{"net": 0.0, "tax": 0.0} for _period in periods],
+                },
             )
-        for taxed_move_line in taxed_move_lines:
-            for tax_id in taxed_move_line["tax_ids"]:
-                vat_data.append(
-                    {
-                        "net": taxed_move_line["balance"],
-                        "tax": 0.0,
-                        "tax_line_id": tax_id,
-                    }
-                )
-        tax_ids = list(map(operator.itemgetter("tax_line_id"), vat_data))
-        tax_ids = list(set(tax_ids))
-        tax_data = self._get_tax_data(tax_ids)
-        return vat_data, tax_data
+            # The buckets are numbered from 1, the first one being the report
+            amounts = vat if seq == 1 else vat["periods"][seq - 2]
+            amounts.update({"net": net, "tax": tax})
+        tax_data = self._get_tax_data(list(vat_data))
+        return list(vat_data.values()), tax_data
+
+    def _get_vat_amounts_data(self, vat_report_line):
+        return {
+            "net": 0.0,
+            "tax": 0.0,
+            "periods": [
+                {"net": 0.0, "tax": 0.0} for _period in vat_report_line["periods"]
+            ],
+        }
+
+    def _add_vat_amounts(self, vat_amounts, vat_report_line):
+        for amounts, line_amounts in zip(
+            [vat_amounts] + vat_amounts["periods"],
+            [vat_report_line] + vat_report_line["periods"],
+            strict=True,
+        ):
+            amounts["net"] += line_amounts["net"]
+            amounts["tax"] += line_amounts["tax"]
 
     def _get_tax_group_data(self, tax_group_ids):
         tax_groups = self.env["account.tax.group"].search_fetch(
@@ -122,21 +171,21 @@ class VATReport(models.AbstractModel):
             else:
                 tax_group_id = tax_data[tax_id]["tax_group_id"]
                 if tax_group_id not in vat_report.keys():
-                    vat_report[tax_group_id] = {}
-                    vat_report[tax_group_id]["net"] = 0.0
-                    vat_report[tax_group_id]["tax"] = 0.0
+                    vat_report[tax_group_id] = self._get_vat_amounts_data(
+                        tax_move_line
+                    )
                     vat_report[tax_group_id][tax_id] = dict(tax_data[tax_id])
-                    vat_report[tax_group_id][tax_id].update({"net": 0.0, "tax": 0.0})
+                    vat_report[tax_group_id][tax_id].update(
+                        self._get_vat_amounts_data(tax_move_line)
+                    )
                 else:
                     if tax_id not in vat_report[tax_group_id].keys():
                         vat_report[tax_group_id][tax_id] = dict(tax_data[tax_id])
                         vat_report[tax_group_id][tax_id].update(
-                            {"net": 0.0, "tax": 0.0}
+                            self._get_vat_amounts_data(tax_move_line)
                         )
-                vat_report[tax_group_id]["net"] += tax_move_line["net"]
-                vat_report[tax_group_id]["tax"] += tax_move_line["tax"]
-                vat_report[tax_group_id][tax_id]["net"] += tax_move_line["net"]
-                vat_report[tax_group_id][tax_id]["tax"] += tax_move_line["tax"]
+                self._add_vat_amounts(vat_report[tax_group_id], tax_move_line)
+                self._add_vat_amounts(vat_report[tax_group_id][tax_id], tax_move_line)
         tax_group_data = self._get_tax_group_data(list(vat_report.keys()))
         vat_report_list = []
         for tax_group_id in vat_report.keys():
@@ -172,21 +221,21 @@ class VATReport(models.AbstractModel):
                 if tags_ids:
                     for tag_id in tags_ids:
                         if tag_id not in vat_report.keys():
-                            vat_report[tag_id] = {}
-                            vat_report[tag_id]["net"] = 0.0
-                            vat_report[tag_id]["tax"] = 0.0
+                            vat_report[tag_id] = self._get_vat_amounts_data(
+                                tax_move_line
+                            )
                             vat_report[tag_id][tax_id] = dict(tax_data[tax_id])
-                            vat_report[tag_id][tax_id].update({"net": 0.0, "tax": 0.0})
+                            vat_report[tag_id][tax_id].update(
+                                self._get_vat_amounts_data(tax_move_line)
+                            )
                         else:
                             if tax_id not in vat_report[tag_id].keys():
                                 vat_report[tag_id][tax_id] = dict(tax_data[tax_id])
                                 vat_report[tag_id][tax_id].update(
-                                    {"net": 0.0, "tax": 0.0}
+                                    self._get_vat_amounts_data(tax_move_line)
                                 )
-                        vat_report[tag_id][tax_id]["net"] += tax_move_line["net"]
-                        vat_report[tag_id][tax_id]["tax"] += tax_move_line["tax"]
-                        vat_report[tag_id]["net"] += tax_move_line["net"]
-                        vat_report[tag_id]["tax"] += tax_move_line["tax"]
+                        self._add_vat_amounts(vat_report[tag_id][tax_id], tax_move_line)
+                        self._add_vat_amounts(vat_report[tag_id], tax_move_line)
         tags_data = self._get_tags_data(list(vat_report.keys()))
         vat_report_list = []
         for tag_id in vat_report.keys():
@@ -209,8 +258,13 @@ class VATReport(models.AbstractModel):
         based_on = data["based_on"]
         tax_detail = data["tax_detail"]
         only_posted_moves = data["only_posted_moves"]
+        periods = data.get("periods", [])
         vat_report_data, tax_data = self._get_vat_report_data(
-            company_id, date_from, date_to, only_posted_moves
+            company_id,
+            date_from,
+            date_to,
+            only_posted_moves,
+            periods=[(period["date_from"], period["date_to"]) for period in periods],
         )
         if based_on == "taxgroups":
             vat_report = self._get_vat_report_group_data(
@@ -230,14 +284,6 @@ class VATReport(models.AbstractModel):
             "date_from": data["date_from"],
             "based_on": data["based_on"],
             "tax_detail": data["tax_detail"],
+            "periods": periods,
             "vat_report": vat_report,
         }
-
-    def _get_ml_fields_vat_report(self):
-        return [
-            "id",
-            "tax_base_amount",
-            "balance",
-            "tax_line_id",
-            "tax_ids",
-        ]
@@ -20,12 +20,30 @@ class VATReportXslx(models.AbstractModel):
         return report_name
 
     def _get_report_columns(self, report):
-        return {
-            0: {"header": _("Code"), "field": "code", "width": 5},
-            1: {"header": _("Name"), "field": "name", "width": 100},
-            2: {"header": _("Net"), "field": "net", "type": "amount", "width": 14},
-            3: {"header": _("Tax"), "field": "tax", "type": "amount", "width": 14},
-        }
+        columns = [
+            {"header": _("Code"), "field": "code", "width": 5},
+            {"header": _("Name"), "field": "name", "width": 100},
+        ]
+        for index, period in enumerate(report._get_periods()):
+            columns += [
+                {
+                    "header": _("%(period)s - Net") % ({"period": period.name}),
+                    "field": f"net_{index}",
+                    "type": "amount",
+                    "width": 14,
+                },
+                {
+                    "header": _("%(period)s - Tax") % ({"period": period.name}),
+                    "field": f"tax_{index}",
+                    "type": "amount",
+                    "width": 14,
+                },
+            ]
+        columns += [
+            {"header": _("Net"), "field": "net", "type": "amount", "width": 14},
+            {"header": _("Tax"), "field": "tax", "type": "amount", "width": 14},
+        ]
+        return dict(enumerate(columns))
 
     def _get_report_filters(self, report):
         return [
@@ -53,9 +71,22 @@ class VATReportXslx(models.AbstractModel):
         self.write_array_header(report_data)
         for tag_or_group in vat_report:
             # Write taxtag line
-            self.write_line_from_dict(tag_or_group, report_data)
+            self.write_line_from_dict(
+                self._get_vat_line_with_periods(tag_or_group), report_data
+            )
 
             # For each tax if detail taxes
             if tax_detail:
                 for tax in tag_or_group["taxes"]:
-                    self.write_line_from_dict(tax, report_data)
+                    self.write_line_from_dict(
+                        self._get_vat_line_with_periods(tax), report_data
+                    )
+
+    def _get_vat_line_with_periods(self, vat_line):
+        """Flatten the amounts of each period into the ``net_<index>`` and
+        ``tax_<index>`` fields of the period columns."""
+        vat_line = dict(vat_line)
+        for index, period_amounts in enumerate(vat_line["periods"]):
+            vat_line[f"net_{index}"] = period_amounts["net"]
+            vat_line[f"tax_{index}"] = period_amounts["tax"]
+        return vat_line
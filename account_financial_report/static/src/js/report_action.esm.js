@@ -1,8 +1,11 @@
+import {enrich, useEnrichWithActionLinks} from "./report.esm";
 import {ReportAction} from "@web/webclient/actions/reports/report_action";
 import {patch} from "@web/core/utils/patch";
-import {useEnrichWithActionLinks} from "./report.esm";
+import {useEffect} from "@odoo/owl";
 
 const MODULE_NAME = "account_financial_report";
+// Open items lines of each page of the HTML preview
+const OPEN_ITEMS_PAGE_SIZE = 500;
 
 patch(ReportAction.prototype, {
     setup() {
@@ -11,6 +14,22 @@ patch(ReportAction.prototype, {
             `${MODULE_NAME}.`
         );
         useEnrichWithActionLinks(this.iframe);
+        // The PDF and XLSX exports keep the data without pages
+        this.isPaginated =
+            this.props.report_name === `${MODULE_NAME}.open_items` &&
+            Boolean(this.props.data) &&
+            this.props.data.grouped_by !== "salesperson";
+        if (this.isPaginated) {
+            this.reportUrl = this._getPageUrl(false);
+            useEffect(
+                (iframe) => {
+                    const onLoad = () => this._loadNextPages(iframe);
+                    iframe.addEventListener("load", onLoad);
+                    return () => iframe.removeEventListener("load", onLoad);
+                },
+                () => [this.iframe.el]
+            );
+        }
     },
 
     export() {
@@ -36,4 +55,66 @@ patch(ReportAction.prototype, {
         const parts = str.split(".");
         return `a_f_r.report_${parts[parts.length - 1]}_xlsx`;
     },
+
+    /**
+     * @param {Array|Boolean} pageAfter key of the last line of the previous page
+     * @returns {String}
+     */
+    _getPageUrl(pageAfter) {
+        const data = {
+            ...this.props.data,
+            page_size: OPEN_ITEMS_PAGE_SIZE,
+            page_after: pageAfter,
+        };
+        const options = encodeURIComponent(JSON.stringify(data));
+        const context = encodeURIComponent(JSON.stringify(this.props.context || {}));
+        const url = `/report/html/${this.props.report_name}`;
+        return `${url}?options=${options}&context=${context}`;
+    },
+
+    /**
+     * Append the next pages of the report when the end of the iframe is
+     * reached.
+     *
+     * @param {HTMLIFrameElement} iframe
+     */
+    _loadNextPages(iframe) {
+        const win = iframe.contentWindow;
+        let loading = false;
+        const loadNextPage = async () => {
+            const doc = iframe.contentDocument;
+            const marker = doc.querySelector(".o_account_financial_report_next_page");
+            if (
+                loading ||
+                !marker ||
+                win.innerHeight + win.scrollY < doc.body.scrollHeight - win.innerHeight
+            ) {
+                return;
+            }
+            loading = true;
+            try {
+                const response = await fetch(
+                    this._getPageUrl(JSON.parse(marker.dataset.pageAfter))
+                );
+                const nextDoc = new DOMParser().parseFromString(
+                    await response.text(),
+                    "text/html"
+                );
+                const nextPage = nextDoc.querySelector(".page");
+                marker.remove();
+                if (nextPage) {
+                    const pages = doc.querySelectorAll(".page");
+                    const page = doc.importNode(nextPage, true);
+                    pages[pages.length - 1].after(page);
+                    enrich(this, page);
+                }
+            } finally {
+                loading = false;
+            }
+            // The new page may not fill the iframe yet
+            loadNextPage();
+        };
+        win.addEventListener("scroll", loadNextPage);
+        loadNextPage();
+    },
 });
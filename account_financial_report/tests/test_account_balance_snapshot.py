@@ -0,0 +1,270 @@
+# License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
+
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.fields import Command
+from odoo.tests import tagged
+
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+
+@tagged("post_install", "-at_install")
+class TestAccountBalanceSnapshot(AccountTestInvoicingCommon):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env["ir.config_parameter"].sudo().set_param(
+            "account_financial_report.balance_snapshot", "True"
+        )
+        cls.snapshot_model = cls.env["account.balance.snapshot"]
+        cls.receivable_account = cls.company_data["default_account_receivable"]
+        cls.income_account = cls.company_data["default_account_revenue"]
+        cls.moves = cls.env["account.move"]
+        for date, amount in (
+            ("2016-01-10", 100.0),
+            ("2016-01-25", 200.0),
+            ("2016-02-15", 400.0),
+            ("2016-03-05", 800.0),
+        ):
+            cls.moves |= cls._create_move(date, amount)
+        cls.moves.action_post()
+        cls.snapshot_model._cron_refresh_dirty()
+
+    @classmethod
+    def _create_move(cls, date, amount):
+        return cls.env["account.move"].create(
+            {
+                "move_type": "entry",
+                "date": date,
+                "journal_id": cls.company_data["default_journal_misc"].id,
+                "line_ids": [
+                    Command.create(
+                        {
+                            "account_id": cls.receivable_account.id,
+                            "partner_id": cls.partner_a.id,
+                            "debit": amount,
+                        }
+                    ),
+                    Command.create(
+                        {"account_id": cls.income_account.id, "credit": amount}
+                    ),
+                ],
+            }
+        )
+
+    def _get_domain(self, date_from, date_to, accounts=None):
+        accounts = accounts or self.receivable_account
+        return [
+            ("company_id", "in", [self.env.company.id]),
+            ("move_id.state", "=", "posted"),
+            ("date", ">=", fields.Date.to_date(date_from)),
+            ("date", "<", fields.Date.to_date(date_to)),
+            ("account_id", "in", accounts.ids),
+        ]
+
+    def _get_balances(self, groups):
+        return {
+            (group["account_id"][0], group["partner_id"][0]): group["balance"]
+            for group in groups
+        }
+
+    def _assert_same_balances(self, date_from, date_to, accounts=None):
+        domain = self._get_domain(date_from, date_to, accounts=accounts)
+        groupby = ["account_id", "partner_id"]
+        balance_fields = ["balance", "amount_currency:sum"]
+        self.assertEqual(
+            self._get_balances(
+                self.snapshot_model._read_group_move_lines(
+                    domain, groupby + balance_fields, groupby, lazy=False
+                )
+            ),
+            self._get_balances(
+                self.env["account.move.line"].read_group(
+                    domain, groupby + balance_fields, groupby, lazy=False
+                )
+            ),
+        )
+
+    def test_01_refresh_dirty(self):
+        snapshots = self.snapshot_model.search(
+            [("account_id", "=", self.receivable_account.id)]
+        )
+        self.assertEqual(
+            {(snapshot.date, snapshot.balance) for snapshot in snapshots},
+            {
+                (fields.Date.to_date("2016-01-31"), 300.0),
+                (fields.Date.to_date("2016-02-29"), 400.0),
+                (fields.Date.to_date("2016-03-31"), 800.0),
+            },
+        )
+        self.moves[2].button_draft()
+        dirty = self.env["account.balance.snapshot.dirty"].search(
+            [("account_id", "=", self.receivable_account.id)]
+        )
+        self.assertEqual(dirty.date, fields.Date.to_date("2016-02-29"))
+        # Dirty months are read from the journal items until computed again
+        self._assert_same_balances("2016-01-01", "2016-04-01")
+        self.snapshot_model._cron_refresh_dirty()
+        self.assertFalse(dirty.exists())
+        snapshots = self.snapshot_model.search(
+            [("account_id", "=", self.receivable_account.id)]
+        )
+        self.assertEqual(
+            {snapshot.date for snapshot in snapshots},
+            {fields.Date.to_date("2016-01-31"), fields.Date.to_date("2016-03-31")},
+        )
+
+    def test_02_rebuild(self):
+        self.snapshot_model._rebuild(self.env.company)
+        snapshots = self.snapshot_model.search(
+            [("account_id", "=", self.receivable_account.id)]
+        )
+        self.assertEqual(sum(snapshots.mapped("balance")), 1500.0)
+
+    def test_03_read_group_move_lines(self):
+        # Complete months only, days around complete months, no complete month
+        self._assert_same_balances("2016-01-01", "2016-03-01")
+        self._assert_same_balances("2016-01-20", "2016-03-10")
+        self._assert_same_balances("2016-01-05", "2016-01-20")
+        self._assert_same_balances("2015-01-01", "2017-01-01")
+
+    def test_04_general_ledger_initial_balance(self):
+        wizard = self.env["general.ledger.report.wizard"].create(
+            {
+                "date_from": "2016-03-01",
+                "date_to": "2016-12-31",
+                "target_move": "posted",
+                "company_id": self.env.company.id,
+                "fy_start_date": "2016-01-01",
+            }
+        )
+        data = wizard._prepare_report_general_ledger()
+        report_model = self.env["report.account_financial_report.general_ledger"]
+        res_data = report_model._get_report_values(wizard, data)
+        self.env["ir.config_parameter"].sudo().set_param(
+            "account_financial_report.balance_snapshot", "False"
+        )
+        res_data_ml = report_model._get_report_values(wizard, data)
+        self.assertEqual(
+            [
+                (account["id"], account["init_bal"])
+                for account in res_data["general_ledger"]
+            ],
+            [
+                (account["id"], account["init_bal"])
+                for account in res_data_ml["general_ledger"]
+            ],
+        )
+
+    def _create_invoice_with_section(self, date):
+        return self.env["account.move"].create(
+            {
+                "move_type": "out_invoice",
+                "partner_id": self.partner_a.id,
+                "invoice_date": date,
+                "date": date,
+                "invoice_line_ids": [
+                    Command.create({"display_type": "line_section", "name": "Section"}),
+                    Command.create(
+                        {
+                            "name": "Line",
+                            "account_id": self.income_account.id,
+                            "quantity": 1,
+                            "price_unit": 1000.0,
+                            "tax_ids": [Command.clear()],
+                        }
+                    ),
+                    Command.create({"display_type": "line_note", "name": "Note"}),
+                ],
+            }
+        )
+
+    def test_05_rebuild_section_lines(self):
+        self.env["ir.config_parameter"].sudo().set_param(
+            "account_financial_report.balance_snapshot", "False"
+        )
+        self._create_invoice_with_section("2016-04-10").action_post()
+        self.env["ir.config_parameter"].sudo().set_param(
+            "account_financial_report.balance_snapshot", "True"
+        )
+        self.snapshot_model._rebuild(self.env.company)
+        snapshots = self.snapshot_model.search([("date", "=", "2016-04-30")])
+        self.assertEqual(
+            {(snapshot.account_id, snapshot.balance) for snapshot in snapshots},
+            {(self.receivable_account, 1000.0), (self.income_account, -1000.0)},
+        )
+
+    def test_06_mark_section_lines(self):
+        invoice = self._create_invoice_with_section("2016-04-10")
+        invoice.action_post()
+        dirty_model = self.env["account.balance.snapshot.dirty"]
+        self.assertEqual(
+            dirty_model.search([("date", "=", "2016-04-30")]).account_id,
+            self.receivable_account | self.income_account,
+        )
+        self.snapshot_model._cron_refresh_dirty()
+        invoice.button_draft()
+        self.assertEqual(len(dirty_model.search([("date", "=", "2016-04-30")])), 2)
+
+    def test_07_mark_during_refresh(self):
+        self.moves[2].button_draft()
+        dirty = self.env["account.balance.snapshot.dirty"].search(
+            [("account_id", "=", self.receivable_account.id)]
+        )
+        self.assertEqual(dirty.version, 1)
+        refresh = type(self.snapshot_model)._refresh
+
+        def refresh_and_mark(snapshot_model, buckets):
+            refresh(snapshot_model, buckets)
+            # Marked again by another transaction before the dirty rows are
+            # deleted
+            self.moves[2].action_post()
+
+        with patch.object(type(self.snapshot_model), "_refresh", refresh_and_mark):
+            self.snapshot_model._cron_refresh_dirty()
+        self.assertTrue(dirty.exists())
+        self.assertEqual(dirty.version, 2)
+        self.snapshot_model._cron_refresh_dirty()
+        self.assertFalse(dirty.exists())
+        self._assert_same_balances("2016-01-01", "2016-04-01")
+
+    def test_08_enable_schedules_rebuild(self):
+        self.env["ir.config_parameter"].sudo().set_param(
+            "account_financial_report.balance_snapshot", "False"
+        )
+        # Not marked dirty while disabled, the snapshots are outdated
+        self.moves[2].button_draft()
+        self.env["res.config.settings"].create(
+            {"afr_balance_snapshot": True}
+        ).set_values()
+        self.assertTrue(self.snapshot_model._is_rebuild_pending())
+        snapshots = self.snapshot_model.search(
+            [("account_id", "=", self.receivable_account.id)]
+        )
+        self.assertEqual(sum(snapshots.mapped("balance")), 1500.0)
+        # The reports read the journal items until the rebuild is done
+        self._assert_same_balances("2016-01-01", "2016-04-01")
+        self.snapshot_model._cron_refresh_dirty()
+        self.assertFalse(self.snapshot_model._is_rebuild_pending())
+        snapshots = self.snapshot_model.search(
+            [("account_id", "=", self.receivable_account.id)]
+        )
+        self.assertEqual(sum(snapshots.mapped("balance")), 1100.0)
+        self._assert_same_balances("2016-01-01", "2016-04-01")
+
+    def test_09_reclassify_posted_line(self):
+        other_account = self.receivable_account.copy()
+        accounts = self.receivable_account | other_account
+        receivable_line = self.moves[2].line_ids.filtered(
+            lambda line: line.account_id == self.receivable_account
+        )
+        receivable_line.account_id = other_account
+        dirty_model = self.env["account.balance.snapshot.dirty"]
+        self.assertEqual(
+            dirty_model.search([("date", "=", "2016-02-29")]).account_id, accounts
+        )
+        self._assert_same_balances("2016-01-01", "2016-04-01", accounts=accounts)
+        self.snapshot_model._cron_refresh_dirty()
+        self._assert_same_balances("2016-01-01", "2016-04-01", accounts=accounts)
+        self._assert_same_balances("2016-01-01", "2016-04-01")
@@ -1,9 +1,27 @@
 #  Copyright 2021 Simone Rubino - Agile Business Group
 #  License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+import logging
+import tracemalloc
+from datetime import date
+
 from odoo.tests import TransactionCase, tagged
 from odoo.tools import DEFAULT_SERVER_DATE_FORMAT, test_reports
 
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+
+_logger = logging.getLogger(__name__)
+
+AGED_AMOUNTS = [
+    "residual",
+    "current",
+    "30_days",
+    "60_days",
+    "90_days",
+    "120_days",
+    "older",
+]
+
 
 @tagged("post_install", "-at_install")
 class TestAgedPartnerBalance(TransactionCase):
@@ -122,3 +140,207 @@ class TestAgedPartnerBalance(TransactionCase):
             data=data,
         )
         self.assertTrue(result)
+
+    def test_aging_bucket(self):
+        config = self.env["account.age.report.configuration"].create(
+            {
+                "name": "Two intervals",
+                "line_ids": [
+                    (0, 0, {"name": "1-30", "inferior_limit": 30}),
+                    (0, 0, {"name": "31-60", "inferior_limit": 60}),
+                ],
+            }
+        )
+        line_30, line_60 = config.line_ids
+        report = self.env[
+            "report.account_financial_report.aged_partner_balance"
+        ].with_context(age_partner_config=config)
+        date_at = date(2016, 12, 31)
+        for due_date, bucket, interval_line in (
+            (False, "current", False),
+            (date(2017, 1, 15), "current", False),
+            (date(2016, 12, 30), "30_days", line_30),
+            (date(2016, 12, 1), "30_days", line_30),
+            (date(2016, 11, 30), "60_days", line_60),
+            (date(2016, 11, 1), "60_days", line_60),
+            (date(2016, 10, 31), "90_days", False),
+            (date(2015, 12, 31), "older", False),
+        ):
+            self.assertEqual(
+                report._get_aging_bucket(due_date, date_at), (bucket, interval_line)
+            )
+
+
+@tagged("post_install", "-at_install")
+class TestAgedPartnerBalanceModes(AccountTestInvoicingCommon):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for partner, invoice_date, amount in (
+            (cls.partner_a, "2016-01-10", 100.0),
+            (cls.partner_a, "2016-03-10", 200.0),
+            (cls.partner_b, "2016-02-10", 400.0),
+        ):
+            invoice = cls.init_invoice(
+                "out_invoice",
+                partner=partner,
+                invoice_date=invoice_date,
+                amounts=[amount],
+                post=True,
+            )
+        # Paid after the report date, still open at the report date
+        cls.env["account.payment.register"].with_context(
+            active_model="account.move", active_ids=invoice.ids
+        ).create({"payment_date": "2017-01-15"})._create_payments()
+        cls.env["ir.config_parameter"].sudo().set_param(
+            "account_financial_report.apb_parallel_workers", "2"
+        )
+
+    def _get_report_data(self, show_move_line_details):
+        self.wizard = self.env["aged.partner.balance.report.wizard"].create(
+            {
+                "date_at": "2016-12-31",
+                "show_move_line_details": show_move_line_details,
+                "receivable_accounts_only": True,
+            }
+        )
+        self.wizard.onchange_type_accounts_only()
+        data = self.wizard._prepare_report_aged_partner_balance()
+        data.update({"date_at": data["date_at"].strftime(DEFAULT_SERVER_DATE_FORMAT)})
+        return data
+
+    def _get_aged_partner_balance(self, data):
+        res_data = self.env[
+            "report.account_financial_report.aged_partner_balance"
+        ]._get_report_values(self.wizard, data)
+        return {
+            (account["id"], partner["name"]): (
+                [round(partner[bucket], 2) for bucket in AGED_AMOUNTS],
+                [ml["id"] for ml in partner.get("move_lines", [])],
+            )
+            for account in res_data["aged_partner_balance"]
+            for partner in account["partners"]
+        }
+
+    def test_parallel(self):
+        data = self._get_report_data(True)
+        aged_partner_balance = self._get_aged_partner_balance(data)
+        self.assertTrue(aged_partner_balance)
+        data["apb_parallel"] = True
+        self.assertEqual(self._get_aged_partner_balance(data), aged_partner_balance)
+
+    def test_parallel_shards(self):
+        data = self._get_report_data(True)
+        age_partner_config = self.env["account.age.report.configuration"].create(
+            {"name": "Intervals", "line_ids": [(0, 0, {"name": "1-30"})]}
+        )
+        report = self.env[
+            "report.account_financial_report.aged_partner_balance"
+        ].with_context(
+            age_partner_config=age_partner_config,
+            age_partner_intervals=self.env[
+                "report.account_financial_report.aged_partner_balance"
+            ]._compile_age_intervals(age_partner_config.line_ids),
+        )
+        args = (
+            data["company_id"],
+            data["account_ids"],
+            data["partner_ids"],
+            date(2016, 12, 31),
+            data["date_from"],
+            data["only_posted_moves"],
+            True,
+        )
+        shards = report._get_shards(
+            data["company_id"],
+            data["account_ids"],
+            data["partner_ids"],
+            data["only_posted_moves"],
+            data["date_from"],
+        )
+        # The partners of the receivable account are split in several shards
+        self.assertTrue(any(shard[2] for shard in shards))
+        ag_pb_data = report._merge_move_lines_data(
+            [report._get_move_lines_data_shard(None, shard, args) for shard in shards]
+        )[0]
+        self.assertEqual(ag_pb_data, report._get_move_lines_data(*args)[0])
+
+    def test_reconciled_lines_domain(self):
+        data = self._get_report_data(True)
+        aged_partner_balance = self._get_aged_partner_balance(data)
+        self.assertTrue(
+            any(ml_ids for _amounts, ml_ids in aged_partner_balance.values())
+        )
+        html = (
+            self.env["ir.actions.report"]
+            ._render_qweb_html(
+                "account_financial_report.aged_partner_balance",
+                self.wizard.ids,
+                data=data,
+            )[0]
+            .decode()
+        )
+        # The domains of the residuals are evaluated, not output as is
+        self.assertNotIn("line[", html)
+        self.assertIn("&#39;id&#39;, &#39;in&#39;, [", html)
+        self.assertIn('res-model="account.move.line"', html)
+
+    def test_sql_summary(self):
+        data = self._get_report_data(False)
+        aged_partner_balance = self._get_aged_partner_balance(data)
+        self.assertEqual(len(aged_partner_balance), 2)
+        data["apb_sql_summary"] = True
+        self.assertEqual(self._get_aged_partner_balance(data), aged_partner_balance)
+
+
+@tagged("post_install", "-at_install", "-standard", "afr_benchmark")
+class TestAgedPartnerBalanceBenchmark(TransactionCase):
+    def _get_peak_memory(self, build_details):
+        self.env.invalidate_all()
+        tracemalloc.start()
+        try:
+            build_details()
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_move_line_details_memory(self):
+        """Memory of the move line details of up to 100k journal items."""
+        report = self.env["report.account_financial_report.aged_partner_balance"]
+        line_model = self.env["account.move.line"]
+        ml_ids = line_model.search([], limit=100000).ids
+
+        def build_records_details():
+            # Former details, with the fields read by the template
+            details = [{"line_rec": line_model.browse(ml_id)} for ml_id in ml_ids]
+            for line in details:
+                line_rec = line["line_rec"]
+                line["reconciled_line_ids"] = (
+                    line_rec
+                    | line_rec.matched_debit_ids.mapped("debit_move_id")
+                    | line_rec.matched_credit_ids.mapped("credit_move_id")
+                ).ids
+                line["res_ids"] = (
+                    line_rec.move_id.journal_id.id,
+                    line_rec.account_id.id,
+                    line_rec.partner_id.id,
+                )
+            return details
+
+        def build_data_details():
+            reconciled_line_ids = report._get_reconciled_line_ids(ml_ids)
+            return [
+                {"id": ml_id, "reconciled_line_ids": reconciled_line_ids[ml_id]}
+                for ml_id in ml_ids
+            ]
+
+        records_peak = self._get_peak_memory(build_records_details)
+        data_peak = self._get_peak_memory(build_data_details)
+        _logger.info(
+            "Aged partner balance details of %s lines: %.1f MiB with records, "
+            "%.1f MiB with data",
+            len(ml_ids),
+            records_peak / 2**20,
+            data_peak / 2**20,
+        )
+        self.assertLessEqual(data_peak, records_peak)
@@ -3,14 +3,19 @@
 # Copyright 2020 ForgeFlow S.L. (https://www.forgeflow.com)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+import logging
 import time
 from datetime import date
+from unittest.mock import patch
 
 from odoo import api, fields
 from odoo.tests import tagged
+from odoo.tools import SQL
 
 from odoo.addons.account.tests.common import AccountTestInvoicingCommon
 
+_logger = logging.getLogger(__name__)
+
 
 @tagged("post_install", "-at_install")
 class TestGeneralLedgerReport(AccountTestInvoicingCommon):
@@ -101,7 +106,13 @@ class TestGeneralLedgerReport(AccountTestInvoicingCommon):
         move = self.env["account.move"].create(move_vals)
         move.action_post()
 
-    def _get_report_lines(self, with_partners=False, account_ids=False):
+    def _get_report_lines(
+        self,
+        with_partners=False,
+        account_ids=False,
+        report_options=None,
+        report_context=None,
+    ):
         centralize = True
         if with_partners:
             centralize = False
@@ -119,11 +130,35 @@ class TestGeneralLedgerReport(AccountTestInvoicingCommon):
             }
         )
         data = general_ledger._prepare_report_general_ledger()
-        res_data = self.env[
-            "report.account_financial_report.general_ledger"
-        ]._get_report_values(general_ledger, data)
+        data.update(report_options or {})
+        res_data = (
+            self.env["report.account_financial_report.general_ledger"]
+            .with_context(**(report_context or {}))
+            ._get_report_values(general_ledger, data)
+        )
         return res_data
 
+    @api.model
+    def _get_ledger_summary(self, general_ledger):
+        summary = []
+        for account in general_ledger:
+            items = account.get("list_grouped", [account])
+            summary.append(
+                (
+                    account["id"],
+                    account["init_bal"],
+                    account["fin_bal"],
+                    [
+                        (
+                            item.get("id"),
+                            [(ml["id"], ml["balance"]) for ml in item["move_lines"]],
+                        )
+                        for item in items
+                    ],
+                )
+            )
+        return summary
+
     @api.model
     def check_account_in_report(self, account_id, general_ledger):
         account_in_report = False
@@ -687,6 +722,150 @@ class TestGeneralLedgerReport(AccountTestInvoicingCommon):
         self.assertEqual(unaffected_fin_balance["credit"], 1000)
         self.assertEqual(unaffected_fin_balance["balance"], 500)
 
+    def test_05_sql_engine(self):
+        self._add_move(
+            date=self.previous_fy_date_end,
+            receivable_debit=1000,
+            receivable_credit=0,
+            income_debit=0,
+            income_credit=1000,
+        )
+        self._add_move(
+            date=self.fy_date_start,
+            receivable_debit=0,
+            receivable_credit=1000,
+            income_debit=1000,
+            income_credit=0,
+        )
+        self._add_move(
+            date=self.fy_date_end,
+            receivable_debit=3000,
+            receivable_credit=0,
+            income_debit=0,
+            income_credit=0,
+            unaffected_debit=0,
+            unaffected_credit=3000,
+        )
+        for with_partners in (False, True):
+            res_data = self._get_report_lines(with_partners=with_partners)
+            res_data_sql = self._get_report_lines(
+                with_partners=with_partners,
+                report_options={"gl_sql_engine": True},
+            )
+            self.assertEqual(
+                self._get_ledger_summary(res_data_sql["general_ledger"]),
+                self._get_ledger_summary(res_data["general_ledger"]),
+            )
+        # Grouped by taxes, a line with two taxes is an item of each tax
+        taxes = self.tax_sale_a | self.tax_sale_b
+        invoice = self.init_invoice(
+            "out_invoice",
+            partner=self.partner,
+            invoice_date=self.fy_date_end,
+            amounts=[1000.0],
+            taxes=taxes,
+            post=True,
+        )
+        base_line = invoice.invoice_line_ids
+        self.assertEqual(base_line.tax_ids, taxes)
+        report_options = {"grouped_by": "taxes"}
+        res_data = self._get_report_lines(
+            with_partners=True, report_options=report_options
+        )
+        res_data_sql = self._get_report_lines(
+            with_partners=True,
+            report_options=dict(report_options, gl_sql_engine=True),
+        )
+        summary = self._get_ledger_summary(res_data["general_ledger"])
+        self.assertEqual(
+            self._get_ledger_summary(res_data_sql["general_ledger"]), summary
+        )
+        base_line_items = {
+            item_id
+            for account_id, _init_bal, _fin_bal, items in summary
+            if account_id == base_line.account_id.id
+            for item_id, move_lines in items
+            if base_line.id in [ml_id for ml_id, _balance in move_lines]
+        }
+        self.assertEqual(base_line_items, set(taxes.ids))
+
+    def test_06_streaming(self):
+        self._add_move(
+            date=self.previous_fy_date_end,
+            receivable_debit=1000,
+            receivable_credit=0,
+            income_debit=0,
+            income_credit=1000,
+        )
+        self._add_move(
+            date=self.fy_date_end,
+            receivable_debit=3000,
+            receivable_credit=0,
+            income_debit=0,
+            income_credit=0,
+            unaffected_debit=0,
+            unaffected_credit=3000,
+        )
+        report_class = type(self.env["report.account_financial_report.general_ledger"])
+        for with_partners in (False, True):
+            res_data = self._get_report_lines(with_partners=with_partners)
+            with patch.object(
+                report_class,
+                "_get_journals_data",
+                autospec=True,
+                side_effect=report_class._get_journals_data,
+            ) as get_journals_data:
+                res_data_stream = self._get_report_lines(
+                    with_partners=with_partners,
+                    report_context={"general_ledger_stream": True},
+                )
+                self.assertNotIsInstance(res_data_stream["general_ledger"], list)
+                self.assertEqual(
+                    self._get_ledger_summary(res_data_stream["general_ledger"]),
+                    self._get_ledger_summary(res_data["general_ledger"]),
+                )
+            # The few accounts fit in one chunk: the journals are read once
+            self.assertEqual(get_journals_data.call_count, 1)
+
+    def test_07_streaming_cursors(self):
+        report_model = self.env["report.account_financial_report.general_ledger"]
+        query = SQL("SELECT id FROM account_move_line ORDER BY id")
+        stream_1 = report_model._iter_period_ml_rows(query, batch_size=1)
+        stream_2 = report_model._iter_period_ml_rows(query, batch_size=1)
+        # Both server-side cursors are open at the same time
+        rows = list(zip(stream_1, stream_2, strict=True))
+        self.assertTrue(rows)
+        for row_1, row_2 in rows:
+            self.assertEqual(row_1, row_2)
+
+    def test_08_cumul_balance(self):
+        self._add_move(
+            date=self.previous_fy_date_end,
+            receivable_debit=1000,
+            receivable_credit=0,
+            income_debit=0,
+            income_credit=1000,
+        )
+        for move_date in (self.fy_date_start, self.fy_date_start, self.fy_date_end):
+            self._add_move(
+                date=move_date,
+                receivable_debit=250,
+                receivable_credit=0,
+                income_debit=0,
+                income_credit=250,
+            )
+        for report_options in ({}, {"gl_sql_engine": True}):
+            res_data = self._get_report_lines(report_options=report_options)
+            for account in res_data["general_ledger"]:
+                if account["centralized"]:
+                    continue
+                for item in account.get("list_grouped", [account]):
+                    balance = item["init_bal"]["balance"]
+                    for move_line in item["move_lines"]:
+                        balance += move_line["debit"] - move_line["credit"]
+                        self.assertAlmostEqual(move_line["balance"], balance)
+                    self.assertAlmostEqual(balance, item["fin_bal"]["balance"])
+
     def test_partner_filter(self):
         partner_1 = self.env.ref("base.res_partner_1")
         partner_2 = self.env.ref("base.res_partner_2")
@@ -731,3 +910,39 @@ class TestGeneralLedgerReport(AccountTestInvoicingCommon):
         wizard.onchange_date_range_id()
         self.assertEqual(wizard.date_from, date(2018, 1, 1))
         self.assertEqual(wizard.date_to, date(2018, 12, 31))
+
+
+@tagged("post_install", "-at_install", "-standard", "afr_benchmark")
+class TestGeneralLedgerReportBenchmark(AccountTestInvoicingCommon):
+    def _benchmark(self, name, function, *args):
+        queries_before = self.env.cr.sql_log_count
+        time_before = time.perf_counter()
+        res = function(*args)
+        _logger.info(
+            "%s: %.3fs, %s queries",
+            name,
+            time.perf_counter() - time_before,
+            self.env.cr.sql_log_count - queries_before,
+        )
+        return res
+
+    def test_prepare_ml_items_taxes(self):
+        report = self.env["report.account_financial_report.general_ledger"]
+        taxes = self.tax_sale_a | self.tax_sale_b
+        move_lines = [
+            {"tax_line_id": False, "tax_ids": taxes.ids} for _i in range(20000)
+        ]
+
+        def prepare_ml_items(tax_names=None):
+            return [
+                report._prepare_ml_items(move_line, "taxes", tax_names)
+                for move_line in move_lines
+            ]
+
+        items = self._benchmark("Taxes read by move line", prepare_ml_items)
+        tax_names = report._get_tax_names(taxes.ids)
+        self.env.invalidate_all()
+        queries_before = self.env.cr.sql_log_count
+        batch_items = self._benchmark("Taxes read once", prepare_ml_items, tax_names)
+        self.assertEqual(self.env.cr.sql_log_count, queries_before)
+        self.assertEqual(batch_items, items)
@@ -2,6 +2,7 @@
 # Copyright 2019-20 ForgeFlow S.L. (https://www.forgeflow.com)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl).
 
+import copy
 from datetime import datetime
 
 from dateutil.relativedelta import relativedelta
@@ -280,3 +281,162 @@ class TestJournalReport(AccountTestInvoicingCommon):
 
         self.check_report_journal_debit_credit(res_data, 250, 250)
         self.check_report_journal_debit_credit_taxes(res_data, 300, 0, 50, 0)
+
+    def test_04_sql_fetch(self):
+        move_form = Form(
+            self.env["account.move"].with_context(default_move_type="out_invoice")
+        )
+        move_form.partner_id = self.partner_2
+        move_form.journal_id = self.journal_sale
+        with move_form.invoice_line_ids.new() as line_form:
+            line_form.name = "test"
+            line_form.quantity = 1.0
+            line_form.price_unit = 100
+            line_form.account_id = self.income_account
+            line_form.tax_ids.add(self.tax_15_s)
+            line_form.tax_ids.add(self.tax_20_s)
+        move_form.save().action_post()
+        self._add_move(Date.today(), self.journal_sale, 0, 100, 100, 0)
+
+        wiz = self.JournalLedgerReportWizard.create(
+            {
+                "date_from": self.fy_date_start,
+                "date_to": self.fy_date_end,
+                "company_id": self.company.id,
+                "journal_ids": [(6, 0, self.journal_sale.ids)],
+                "move_target": "all",
+            }
+        )
+        data = wiz._prepare_report_journal_ledger()
+
+        def get_report_values(jl_sql_fetch):
+            res_data = self.JournalLedgerReport._get_report_values(
+                wiz, dict(data, jl_sql_fetch=jl_sql_fetch)
+            )
+            for move_data in res_data["Moves"]:
+                for move_line_data in move_data["report_move_lines"]:
+                    move_line_data["tax_ids"].sort()
+            return res_data
+
+        res_data = get_report_values(False)
+        res_data_sql = get_report_values(True)
+        self.assertTrue(res_data["Moves"])
+        for key in (
+            "Moves",
+            "Journal_Ledgers",
+            "account_ids_data",
+            "partner_ids_data",
+            "currency_ids_data",
+            "tax_line_data",
+        ):
+            self.assertEqual(res_data_sql[key], res_data[key])
+
+    def test_05_journal_tax_lines_queries(self):
+        taxes = self.tax_15_s | self.tax_20_s
+        amounts = dict.fromkeys(
+            [
+                "base_debit",
+                "base_credit",
+                "base_balance",
+                "tax_debit",
+                "tax_credit",
+                "tax_balance",
+            ],
+            1.0,
+        )
+        moves_data = [
+            {
+                "report_move_lines": [
+                    dict(
+                        amounts,
+                        journal_id=self.journal_sale.id,
+                        tax_line_id=False,
+                        tax_ids=taxes.ids,
+                    )
+                    for _i in range(50)
+                ]
+            }
+        ]
+        self.env.invalidate_all()
+        with self.assertQueryCount(1):
+            journals_taxes_data = self.JournalLedgerReport._get_journal_tax_lines(
+                None, moves_data
+            )
+        tax_lines = journals_taxes_data[self.journal_sale.id]
+        self.assertEqual(
+            [tax_line["tax_name"] for tax_line in tax_lines],
+            taxes.sorted().mapped("name"),
+        )
+        for tax_line in tax_lines:
+            self.assertEqual(tax_line["base_debit"], 50.0)
+
+    def test_06_chunked(self):
+        self._add_move(Date.today(), self.journal_sale, 0, 100, 100, 0)
+        self._add_move(Date.today(), self.journal_purchase, 0, 200, 200, 0)
+        wiz = self.JournalLedgerReportWizard.create(
+            {
+                "date_from": self.fy_date_start,
+                "date_to": self.fy_date_end,
+                "company_id": self.company.id,
+                "journal_ids": [
+                    (6, 0, (self.journal_sale | self.journal_purchase).ids)
+                ],
+                "move_target": "all",
+                "group_option": "journal",
+            }
+        )
+        data = wiz._prepare_report_journal_ledger()
+
+        def get_journal_ledgers(jl_chunked):
+            res_data = self.JournalLedgerReport._get_report_values(
+                wiz, dict(data, jl_chunked=jl_chunked)
+            )
+            # Copy each journal while it is the current one
+            return [
+                copy.deepcopy(journal) for journal in res_data["Journal_Ledgers"]
+            ]
+
+        journal_ledgers = get_journal_ledgers(False)
+        self.assertEqual(len(journal_ledgers), 2)
+        self.assertEqual(get_journal_ledgers(True), journal_ledgers)
+
+    def test_07_auto_sequence(self):
+        self._add_move(self.fy_date_end, self.journal_sale, 0, 100, 100, 0)
+        self._add_move(self.fy_date_start, self.journal_sale, 0, 200, 200, 0)
+        self._add_move(self.fy_date_start, self.journal_purchase, 300, 0, 0, 300)
+        wiz = self.JournalLedgerReportWizard.create(
+            {
+                "date_from": self.fy_date_start,
+                "date_to": self.fy_date_end,
+                "company_id": self.company.id,
+                "journal_ids": [
+                    (6, 0, (self.journal_sale | self.journal_purchase).ids)
+                ],
+                "move_target": "all",
+                "sort_option": "date",
+                "group_option": "none",
+            }
+        )
+        data = wiz._prepare_report_journal_ledger()
+        res_data = self.JournalLedgerReport._get_report_values(wiz, data)
+        sequences = {}
+        for move_data in res_data["Moves"]:
+            move = self.env["account.move"].browse(move_data["move_id"])
+            sequences.setdefault(move.journal_id, []).append(
+                (move.date, move_data["auto_sequence"])
+            )
+            for move_line_data in move_data["report_move_lines"]:
+                self.assertEqual(
+                    move_line_data["auto_sequence"],
+                    str(move_data["auto_sequence"]).zfill(6),
+                )
+        self.assertEqual(
+            sequences[self.journal_sale],
+            [
+                (Date.to_date(self.fy_date_start), 1),
+                (Date.to_date(self.fy_date_end), 2),
+            ],
+        )
+        self.assertEqual(
+            sequences[self.journal_purchase], [(Date.to_date(self.fy_date_start), 1)]
+        )
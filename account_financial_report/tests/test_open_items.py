@@ -3,11 +3,17 @@
 # Copyright 2024 Tecnativa - Carolina Fernandez
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+import json
+import logging
+import time
+
 from odoo.fields import Date
-from odoo.tests import tagged
+from odoo.tests import TransactionCase, tagged
 
 from odoo.addons.account.tests.common import AccountTestInvoicingCommon
 
+_logger = logging.getLogger(__name__)
+
 
 @tagged("post_install", "-at_install")
 class TestOpenItems(AccountTestInvoicingCommon):
@@ -69,3 +75,257 @@ class TestOpenItems(AccountTestInvoicingCommon):
         wizard.on_change_account_range()
         res = wizard._prepare_report_open_items()
         self.assertEqual(res["grouped_by"], wizard.grouped_by)
+
+    def test_residual_at_date(self):
+        invoice = self.init_invoice(
+            "out_invoice",
+            partner=self.partner_a,
+            invoice_date="2016-03-10",
+            amounts=[1000.0],
+            post=True,
+        )
+        self.env["account.payment.register"].with_context(
+            active_model="account.move", active_ids=invoice.ids
+        ).create({"payment_date": "2017-01-15", "amount": 400.0})._create_payments()
+        receivable_line = invoice.line_ids.filtered(
+            lambda line: line.account_id.account_type == "asset_receivable"
+        )
+        report_model = self.env["report.account_financial_report.open_items"]
+        for date_at, partner_ids, residual in (
+            (Date.to_date("2016-12-31"), [], 1000.0),
+            (Date.to_date("2016-12-31"), self.partner_a.ids, 1000.0),
+            (Date.to_date("2016-12-31"), self.partner_b.ids, False),
+            (Date.today(), [], 600.0),
+        ):
+            move_lines = report_model._get_move_lines_at_date(
+                self.env.company.id,
+                receivable_line.account_id.ids,
+                partner_ids,
+                date_at,
+                False,
+                True,
+            )
+            residuals = {
+                move_line["id"]: move_line["amount_residual"]
+                for move_line in move_lines
+            }
+            self.assertEqual(residuals.get(receivable_line.id, False), residual)
+
+    def test_residual_cache(self):
+        self.env["ir.config_parameter"].sudo().set_param(
+            "account_financial_report.residual_cache", "True"
+        )
+        invoice = self.init_invoice(
+            "out_invoice",
+            partner=self.partner_a,
+            invoice_date="2016-03-10",
+            amounts=[1000.0],
+            post=True,
+        )
+        receivable_line = invoice.line_ids.filtered(
+            lambda line: line.account_id.account_type == "asset_receivable"
+        )
+        report_model = self.env["report.account_financial_report.open_items"]
+        stamp_model = self.env["account.residual.cache.stamp"]
+        date_at = Date.to_date("2016-12-31")
+
+        def get_residuals():
+            stamp = stamp_model._get_stamp(self.env.company.id, date_at)
+            return report_model._get_cached_residuals_at_date(
+                self.env.company.id,
+                tuple(receivable_line.account_id.ids),
+                (),
+                date_at,
+                False,
+                stamp,
+            )
+
+        residuals = get_residuals()
+        self.assertEqual(residuals[receivable_line.id][0], 1000.0)
+        self.assertIs(get_residuals(), residuals)
+        # Reconciled after the date, the residuals at the date are the same
+        self.env["account.payment.register"].with_context(
+            active_model="account.move", active_ids=invoice.ids
+        ).create({"payment_date": "2017-01-15", "amount": 400.0})._create_payments()
+        self.assertIs(get_residuals(), residuals)
+        # Reconciled before the date
+        self.env["account.payment.register"].with_context(
+            active_model="account.move", active_ids=invoice.ids
+        ).create({"payment_date": "2016-12-15", "amount": 100.0})._create_payments()
+        self.assertEqual(get_residuals()[receivable_line.id][0], 900.0)
+        move_lines = report_model._get_move_lines_at_date(
+            self.env.company.id,
+            receivable_line.account_id.ids,
+            [],
+            date_at,
+            False,
+            True,
+        )
+        residuals = {
+            move_line["id"]: move_line["amount_residual"] for move_line in move_lines
+        }
+        self.assertEqual(residuals[receivable_line.id], 900.0)
+
+    def test_residual_cache_stamps(self):
+        self.env["ir.config_parameter"].sudo().set_param(
+            "account_financial_report.residual_cache", "True"
+        )
+        stamp_model = self.env["account.residual.cache.stamp"]
+        company_id = self.env.company.id
+        date_1 = Date.to_date("2016-06-30")
+        date_2 = Date.to_date("2016-03-31")
+        self.assertFalse(stamp_model._get_stamp(company_id, date_2))
+        stamp_model._stamp({(company_id, date_2)})
+        stamp_model._stamp({(company_id, date_1)})
+        stamps = stamp_model.search([("company_id", "=", company_id)])
+        stamp_1 = stamp_model._get_stamp(company_id, date_1)
+        self.assertTrue(stamp_1)
+        self.assertNotEqual(stamp_model._get_stamp(company_id, date_2), stamp_1)
+        # The stamp with the lower id is committed after the other one
+        self.env.cr.execute(
+            "DELETE FROM account_residual_cache_stamp WHERE id = %s",
+            (stamps[0].id,),
+        )
+        stamp_before_commit = stamp_model._get_stamp(company_id, date_1)
+        self.env.cr.execute(
+            """
+            INSERT INTO account_residual_cache_stamp (id, company_id, date)
+            VALUES (%s, %s, %s)
+            """,
+            (stamps[0].id, company_id, date_2),
+        )
+        self.assertNotEqual(
+            stamp_model._get_stamp(company_id, date_1), stamp_before_commit
+        )
+        # The old stamps of a date are replaced by a new one
+        stamp_model._stamp({(company_id, date_1)})
+        stamp_2 = stamp_model._get_stamp(company_id, date_1)
+        self.env.cr.execute(
+            """
+            UPDATE account_residual_cache_stamp
+            SET create_date = NOW() AT TIME ZONE 'UTC' - interval '2 days'
+            WHERE company_id = %s
+            """,
+            (company_id,),
+        )
+        stamp_model._gc_stamps()
+        stamps = stamp_model.search([("company_id", "=", company_id)])
+        self.assertEqual(sorted(stamps.mapped("date")), [date_2, date_1])
+        self.assertNotIn(
+            stamp_model._get_stamp(company_id, date_1),
+            (stamp_1, stamp_before_commit, stamp_2),
+        )
+
+    def test_pages(self):
+        for partner, invoice_date, amount in (
+            (self.partner_a, "2016-01-10", 100.0),
+            (self.partner_a, "2016-03-10", 200.0),
+            (self.partner_b, "2016-02-10", 400.0),
+        ):
+            self.init_invoice(
+                "out_invoice",
+                partner=partner,
+                invoice_date=invoice_date,
+                amounts=[amount],
+                post=True,
+            )
+        for show_partner_details in (True, False):
+            with self.subTest(show_partner_details=show_partner_details):
+                self._check_pages(show_partner_details)
+
+    def _check_pages(self, show_partner_details):
+        wizard = self.env["open.items.report.wizard"].create(
+            {
+                "date_at": "2016-12-31",
+                "receivable_accounts_only": True,
+                "show_partner_details": show_partner_details,
+            }
+        )
+        wizard.onchange_type_accounts_only()
+        data = wizard._prepare_report_open_items()
+        report_model = self.env["report.account_financial_report.open_items"]
+
+        def get_lines(res_data):
+            if not show_partner_details:
+                return [
+                    (account_id, line["id"], line["amount_residual"])
+                    for account_id, lines in res_data["Open_Items"].items()
+                    for line in lines
+                ]
+            return [
+                (account_id, partner_id, line["id"], line["amount_residual"])
+                for account_id, partners in res_data["Open_Items"].items()
+                for partner_id, lines in partners.items()
+                for line in lines
+            ]
+
+        res_data = report_model._get_report_values(wizard, data)
+        lines = get_lines(res_data)
+        self.assertEqual(len(lines), 3)
+        page_lines = []
+        page_data = dict(data, page_size=2)
+        while True:
+            res_page = report_model._get_report_values(wizard, page_data)
+            page_lines += get_lines(res_page)
+            # Totals of the whole accounts and partners on every page
+            for account_id, partners in res_page["Open_Items"].items():
+                self.assertEqual(
+                    res_page["total_amount"][account_id]["residual"],
+                    res_data["total_amount"][account_id]["residual"],
+                )
+                if not show_partner_details:
+                    continue
+                for partner_id in partners:
+                    self.assertEqual(
+                        res_page["total_amount"][account_id][partner_id],
+                        res_data["total_amount"][account_id][partner_id],
+                    )
+            if not res_page["next_page"]:
+                break
+            page_data["page_after"] = json.loads(res_page["next_page"])
+        # The pages follow each other in the order of the full report
+        self.assertEqual(page_lines, lines)
+
+
+@tagged("post_install", "-at_install", "-standard", "afr_benchmark")
+class TestOpenItemsBenchmark(TransactionCase):
+    def test_partners_info(self):
+        """Partner names and salespersons of up to 100k journal items."""
+        report = self.env["report.account_financial_report.open_items"]
+        move_lines = self.env["account.move.line"].search_read(
+            [("partner_id", "!=", False)], ["partner_id"], limit=100000
+        )
+        partner_ids = [move_line["partner_id"][0] for move_line in move_lines]
+
+        def get_browsed_info():
+            # Former partners data, one browse for each journal item
+            partners_info = {}
+            for partner_id in partner_ids:
+                partner = self.env["res.partner"].browse(partner_id)
+                partners_info[partner_id] = {
+                    "name": partner.name,
+                    "user_id": partner.user_id.id,
+                    "user_name": partner.user_id.name,
+                }
+            return partners_info
+
+        def get_batched_info():
+            return report._get_partners_info(set(partner_ids))
+
+        timings = {}
+        results = {}
+        for name, get_info in (
+            ("browsed", get_browsed_info),
+            ("batched", get_batched_info),
+        ):
+            self.env.invalidate_all()
+            start = time.perf_counter()
+            results[name] = get_info()
+            timings[name] = time.perf_counter() - start
+        _logger.info(
+            "Open items partners of %s lines: %.3fs browsed, %.3fs batched",
+            len(partner_ids),
+            timings["browsed"],
+            timings["batched"],
+        )
+        self.assertEqual(results["batched"], results["browsed"])
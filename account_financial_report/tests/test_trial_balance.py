@@ -3,12 +3,16 @@
 # Copyright 2020 ForgeFlow S.L. (https://www.forgeflow.com)
 # License AGPL-3.0 or later (http://www.gnu.org/licenses/agpl.html).
 
+import logging
 import re
+import time
 
 from odoo.tests import tagged
 
 from odoo.addons.account.tests.common import AccountTestInvoicingCommon
 
+_logger = logging.getLogger(__name__)
+
 
 @tagged("post_install", "-at_install")
 class TestTrialBalanceReport(AccountTestInvoicingCommon):
@@ -715,3 +719,297 @@ class TestTrialBalanceReport(AccountTestInvoicingCommon):
         ]
         self.assertEqual(len(trial_balance_code_set), len(all_accounts_code_set))
         self.assertTrue(trial_balance_code_set == all_accounts_code_set)
+
+    def test_06_grouped_by_analytic_account(self):
+        analytic_plan = self.env["account.analytic.plan"].create({"name": "Plan"})
+        analytic_account = self.env["account.analytic.account"].create(
+            {"name": "Analytic", "plan_id": analytic_plan.id}
+        )
+        company = self.env.user.company_id
+        journal = self.env["account.journal"].search(
+            [("company_id", "=", company.id)], limit=1
+        )
+        rate = 1 if currency == company.currency_id else 2
+        move = self.env["account.move"].create(
+            {
+                "journal_id": journal.id,
+                "date": self.date_start,
+                "line_ids": [
+                    (
+                        0,
+                        0,
+                        {
+                            "debit": 100,
+                            "account_id": self.account100.id,
+                        },
+                    ),
+                    (
+                        0,
+                        0,
+                        {
+                            "credit": 100,
+                            "account_id": self.account200.id,
+                            "analytic_distribution": {analytic_account.id: 100},
+                        },
+                    ),
+                ],
+            }
+        )
+        move.action_post()
+        company = self.env.user.company_id
+        trial_balance = self.env["trial.balance.report.wizard"].create(
+            {
+                "date_from": self.date_start,
+                "date_to": self.date_end,
+                "target_move": "posted",
+                "hide_account_at_0": True,
+                "company_id": company.id,
+                "fy_start_date": self.fy_date_start,
+                "grouped_by": "analytic_account",
+            }
+        )
+        data = trial_balance._prepare_report_trial_balance()
+        res_data = self.env[
+            "report.account_financial_report.trial_balance"
+        ]._get_report_values(trial_balance, data)
+        groups = {
+            group["id"]: {
+                account["id"]: account["balance"] for account in group["account_data"]
+            }
+            for group in res_data["trial_balance_grouped"]
+        }
+        self.assertEqual(groups[analytic_account.id], {self.account200.id: -100})
+        self.assertEqual(groups[0][self.account100.id], 100)
+
+    def _add_currency_move(self, date, amount, currency):
+        company = self.env.user.company_id
+        journal = self.env["account.journal"].search(
+            [("company_id", "=", company.id)], limit=1
+        )
+        rate = 1 if currency == company.currency_id else 2
+        move = self.env["account.move"].create(
+            {
+                "journal_id": journal.id,
+                "date": date,
+                "line_ids": [
+                    (
+                        0,
+                        0,
+                        {
+                            "debit": amount,
+                            "credit": 0,
+                            "amount_currency": amount * rate,
+                            "currency_id": currency.id,
+                            "partner_id": self.partner.id,
+                            "account_id": self.account100.id,
+                        },
+                    ),
+                    (
+                        0,
+                        0,
+                        {
+                            "debit": 0,
+                            "credit": amount,
+                            "partner_id": self.partner.id,
+                            "account_id": self.account200.id,
+                        },
+                    ),
+                ],
+            }
+        )
+        move.action_post()
+        return move
+
+    def test_07_single_scan(self):
+        report_model = self.env["report.account_financial_report.trial_balance"]
+        # The receivable of the partner has amounts in two currencies, both
+        # before and during the period
+        company_currency = self.env.user.company_id.currency_id
+        currency = self.env.ref("base.EUR")
+        if currency == company_currency:
+            currency = self.env.ref("base.USD")
+        currency.active = True
+        for date, amount in ((self.previous_fy_date_end, 100), (self.date_end, 10)):
+            self._add_currency_move(date, amount, company_currency)
+            self._add_currency_move(date, amount * 2, currency)
+        for with_partners in (False, True):
+            trial_balance = self.env["trial.balance.report.wizard"].create(
+                {
+                    "date_from": self.date_start,
+                    "date_to": self.date_end,
+                    "target_move": "posted",
+                    "hide_account_at_0": True,
+                    "company_id": self.env.user.company_id.id,
+                    "fy_start_date": self.fy_date_start,
+                    "show_partner_details": with_partners,
+                }
+            )
+            data = trial_balance._prepare_report_trial_balance()
+            res_data = report_model._get_report_values(trial_balance, data)
+            data["tb_single_scan"] = True
+            res_data_scan = report_model._get_report_values(trial_balance, data)
+            self.assertEqual(
+                res_data_scan["trial_balance"], res_data["trial_balance"]
+            )
+            self.assertEqual(res_data_scan["total_amount"], res_data["total_amount"])
+            if not with_partners:
+                continue
+            partner_amount = res_data["total_amount"][self.account100.id][
+                self.partner.id
+            ]
+            self.assertEqual(partner_amount["initial_balance"], 300)
+            self.assertEqual(partner_amount["debit"], 30)
+            self.assertEqual(partner_amount["ending_balance"], 330)
+
+    def test_08_computed_groups_data(self):
+        report_model = self.env["report.account_financial_report.trial_balance"]
+        accounts_data = {
+            self.account100.id: {"id": self.account100.id, "code": "110"},
+            self.account200.id: {"id": self.account200.id, "code": "200"},
+            self.account001.id: {"id": self.account001.id, "code": "001"},
+        }
+        total_amount = {
+            account_id: {
+                "initial_balance": 1.0,
+                "debit": 2.0,
+                "credit": 0.0,
+                "balance": 2.0,
+                "ending_balance": 3.0,
+            }
+            for account_id in accounts_data
+        }
+        groups_data = report_model._get_computed_groups_data(
+            accounts_data, total_amount, False
+        )
+        self.assertEqual(groups_data[self.group1.id]["ending_balance"], 3.0)
+        self.assertEqual(groups_data[self.group11.id]["ending_balance"], 3.0)
+        self.assertEqual(groups_data[self.group2.id]["debit"], 2.0)
+
+    def test_09_hierarchy_index(self):
+        group_model = self.env["account.group"]
+        account = self._create_account_account(
+            {"code": "110001", "name": "Account 110001", "account_type": "income"}
+        )
+        hierarchy_index = group_model._get_hierarchy_index(self.env.company.id)
+        group11_data = hierarchy_index["groups"][self.group11.id]
+        self.assertEqual(group11_data["level"], 1)
+        self.assertEqual(group11_data["complete_code"], "1/11")
+        self.assertEqual(hierarchy_index["account_group"][account.id], self.group11.id)
+        self.assertIn(
+            account.id, hierarchy_index["groups"][self.group1.id]["account_ids"]
+        )
+        # The index is computed again when the code of an account changes
+        account.code = "200001"
+        hierarchy_index = group_model._get_hierarchy_index(self.env.company.id)
+        self.assertEqual(hierarchy_index["account_group"][account.id], self.group2.id)
+        self.assertNotIn(
+            account.id, hierarchy_index["groups"][self.group1.id]["account_ids"]
+        )
+        # But not when another field of an account changes
+        account.name = "Account 200001"
+        self.assertIs(
+            group_model._get_hierarchy_index(self.env.company.id), hierarchy_index
+        )
+
+        # A branch shares the groups of its root company
+        branch = self.env["res.company"].create(
+            {"name": "Branch", "parent_id": self.env.company.id}
+        )
+        branch_index = group_model._get_hierarchy_index(branch.id)
+        self.assertIn(self.group11.id, branch_index["groups"])
+        self.assertEqual(
+            branch_index, group_model._get_hierarchy_index(self.env.company.id)
+        )
+
+
+@tagged("post_install", "-at_install", "-standard", "afr_benchmark")
+class TestTrialBalanceReportBenchmark(AccountTestInvoicingCommon):
+    def test_merge_initial_balances(self):
+        """Merge of the initial balances of a synthetic 20k accounts chart."""
+        report = self.env["report.account_financial_report.trial_balance"]
+        account_ids = range(1, 20001)
+        tb_initial_acc = {
+            account_id: {
+                "account_id": account_id,
+                "balance": 0.0,
+                "amount_currency": 0.0,
+            }
+            for account_id in account_ids
+        }
+        # Balance sheet and P&L rows for every account
+        tb_initial_acc_rg = [
+            {
+                "account_id": (account_id, str(account_id)),
+                "balance": 1.0,
+                "amount_currency": 2.0,
+            }
+            for account_id in account_ids
+            for _i in range(2)
+        ]
+        tb_period_acc = [
+            {
+                "account_id": (account_id, str(account_id)),
+                "debit": 3.0,
+                "credit": 1.0,
+                "balance": 2.0,
+                "amount_currency": 0.0,
+            }
+            for account_id in account_ids
+        ]
+        time_before = time.perf_counter()
+        tb_initial_acc = report._merge_initial_balances(
+            tb_initial_acc, tb_initial_acc_rg
+        )
+        total_amount = report._compute_account_amount(
+            {}, tb_initial_acc, tb_period_acc, True
+        )
+        _logger.info(
+            "Trial balance merge of %s accounts: %.3fs",
+            len(account_ids),
+            time.perf_counter() - time_before,
+        )
+        self.assertEqual(len(total_amount), len(account_ids))
+        self.assertTrue(
+            all(
+                amounts["initial_balance"] == 2.0 and amounts["ending_balance"] == 4.0
+                for amounts in total_amount.values()
+            )
+        )
+
+    def test_computed_groups_data(self):
+        """Group totals of 20k synthetic accounts over 200 account groups."""
+        report = self.env["report.account_financial_report.trial_balance"]
+        groups = self.env["account.group"].create(
+            [
+                {"code_prefix_start": str(prefix), "name": f"Group {prefix}"}
+                for prefix in range(10, 210)
+            ]
+        )
+        accounts_data = {
+            account_id: {"id": account_id, "code": str(100000 + account_id)}
+            for account_id in range(1, 20001)
+        }
+        total_amount = {
+            account_id: {
+                "initial_balance": 1.0,
+                "debit": 1.0,
+                "credit": 0.0,
+                "balance": 1.0,
+                "ending_balance": 2.0,
+            }
+            for account_id in accounts_data
+        }
+        time_before = time.perf_counter()
+        groups_data = report._get_computed_groups_data(
+            accounts_data, total_amount, False
+        )
+        _logger.info(
+            "Trial balance groups of %s accounts: %.3fs",
+            len(accounts_data),
+            time.perf_counter() - time_before,
+        )
+        # Every account is in one group of 2 digits and one group of 3 digits
+        self.assertEqual(
+            sum(groups_data[group.id]["debit"] for group in groups),
+            2 * len(accounts_data),
+        )
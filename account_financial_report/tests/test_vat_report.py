@@ -394,3 +394,71 @@ class TestVATReport(AccountTestInvoicingCommon):
         wizard.button_export_html()
         wizard.button_export_pdf()
         wizard.button_export_xlsx()
+
+    def test_vat_report_data(self):
+        vat_report_data, tax_data = self.env[
+            "report.account_financial_report.vat_report"
+        ]._get_vat_report_data(self.company.id, self.date_from, self.date_to, True)
+        vat_report_data = {vat["tax_line_id"]: vat for vat in vat_report_data}
+        self.assertEqual(set(vat_report_data), set(tax_data))
+        self.assertEqual(vat_report_data[self.tax_10.id]["net"], -100)
+        self.assertEqual(vat_report_data[self.tax_10.id]["tax"], -10)
+        self.assertEqual(vat_report_data[self.tax_20.id]["net"], -250)
+        self.assertEqual(vat_report_data[self.tax_20.id]["tax"], -50)
+
+    def test_periods(self):
+        date_range_type = self.env["date.range.type"].create(
+            {"name": "Period", "company_id": False, "allow_overlap": False}
+        )
+        period_2, period_1 = self.env["date.range"].create(
+            [
+                {
+                    "name": "Period 2",
+                    "date_start": time.strftime("%Y-%m-04"),
+                    "date_end": time.strftime("%Y-%m-28"),
+                    "type_id": date_range_type.id,
+                },
+                {
+                    "name": "Period 1",
+                    "date_start": time.strftime("%Y-%m-01"),
+                    "date_end": time.strftime("%Y-%m-03"),
+                    "type_id": date_range_type.id,
+                },
+            ]
+        )
+        with Form(self.env["vat.report.wizard"]) as wizard_form:
+            wizard_form.based_on = "taxgroups"
+            wizard_form.tax_detail = True
+            wizard_form.period_ids.add(period_2)
+            wizard_form.period_ids.add(period_1)
+        wizard = wizard_form.record
+        self.assertEqual(wizard.date_from, period_1.date_start)
+        self.assertEqual(wizard.date_to, period_2.date_end)
+        data = wizard._prepare_vat_report()
+        self.assertEqual(
+            [period["name"] for period in data["periods"]], ["Period 1", "Period 2"]
+        )
+        vat_report = self.env[
+            "report.account_financial_report.vat_report"
+        ]._get_report_values(wizard, data)["vat_report"]
+        for tag_or_group in vat_report:
+            for tax in tag_or_group["taxes"]:
+                for key in ("net", "tax"):
+                    self.assertAlmostEqual(
+                        sum(period[key] for period in tax["periods"]), tax[key]
+                    )
+        tax_10_periods = tax_20_periods = False
+        for tag_or_group in vat_report:
+            for tax in tag_or_group["taxes"]:
+                if tax["id"] == self.tax_10.id:
+                    tax_10_periods = tax["periods"]
+                elif tax["id"] == self.tax_20.id:
+                    tax_20_periods = tax["periods"]
+        self.assertEqual(
+            tax_10_periods, [{"net": -100, "tax": -10}, {"net": 0, "tax": 0}]
+        )
+        self.assertEqual(
+            tax_20_periods, [{"net": 0, "tax": 0}, {"net": -250, "tax": -50}]
+        )
+        wizard.button_export_html()
+        wizard.button_export_xlsx()
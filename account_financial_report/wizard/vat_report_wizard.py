@@ -13,6 +13,12 @@ class VATReportWizard(models.TransientModel):
     date_range_id = fields.Many2one(comodel_name="date.range", string="Date range")
     date_from = fields.Date("Start Date", required=True)
     date_to = fields.Date("End Date", required=True)
+    period_ids = fields.Many2many(
+        comodel_name="date.range",
+        string="Periods",
+        help="Date ranges displayed side by side, next to the amounts between "
+        "the start and end dates.",
+    )
     based_on = fields.Selection(
         [("taxtags", "Tax Tags"), ("taxgroups", "Tax Groups")],
         required=True,
@@ -34,15 +40,22 @@ class VATReportWizard(models.TransientModel):
             and self.date_range_id.company_id != self.company_id
         ):
             self.date_range_id = False
-        res = {"domain": {"date_range_id": []}}
+        if self.company_id:
+            self.period_ids = self.period_ids.filtered(
+                lambda period: not period.company_id
+                or period.company_id == self.company_id
+            )
+        res = {"domain": {"date_range_id": [], "period_ids": []}}
         if not self.company_id:
             return res
         else:
-            res["domain"]["date_range_id"] += [
+            company_domain = [
                 "|",
                 ("company_id", "=", self.company_id.id),
                 ("company_id", "=", False),
             ]
+            res["domain"]["date_range_id"] += company_domain
+            res["domain"]["period_ids"] += company_domain
         return res
 
     @api.onchange("date_range_id")
@@ -51,13 +64,19 @@ class VATReportWizard(models.TransientModel):
         self.date_from = self.date_range_id.date_start
         self.date_to = self.date_range_id.date_end
 
-    @api.constrains("company_id", "date_range_id")
+    @api.onchange("period_ids")
+    def onchange_period_ids(self):
+        """Cover all the periods with the start and end dates."""
+        if self.period_ids:
+            self.date_from = min(self.period_ids.mapped("date_start"))
+            self.date_to = max(self.period_ids.mapped("date_end"))
+
+    @api.constrains("company_id", "date_range_id", "period_ids")
     def _check_company_id_date_range_id(self):
         for rec in self.sudo():
-            if (
-                rec.company_id
-                and rec.date_range_id.company_id
-                and rec.company_id != rec.date_range_id.company_id
+            if rec.company_id and any(
+                date_range.company_id and rec.company_id != date_range.company_id
+                for date_range in rec.date_range_id | rec.period_ids
             ):
                 raise ValidationError(
                     self.env._(
@@ -82,6 +101,9 @@ class VATReportWizard(models.TransientModel):
             .report_action(self, data=data)
         )
 
+    def _get_periods(self):
+        return self.period_ids.sorted(lambda period: (period.date_start, period.id))
+
     def _prepare_vat_report(self):
         self.ensure_one()
         return {
@@ -92,6 +114,14 @@ class VATReportWizard(models.TransientModel):
             "based_on": self.based_on,
             "only_posted_moves": self.target_move == "posted",
             "tax_detail": self.tax_detail,
+            "periods": [
+                {
+                    "name": period.name,
+                    "date_from": period.date_start,
+                    "date_to": period.date_end,
+                }
+                for period in self._get_periods()
+            ],
             "account_financial_report_lang": self.env.lang,
         }
 
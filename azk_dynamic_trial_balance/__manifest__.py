@@ -53,6 +53,7 @@ Technical:
         "account_reports",  # Odoo Enterprise
         "account",
         "analytic",
+        "account_financial_report",
     ],
     "data": [
         "security/ir.model.access.csv",
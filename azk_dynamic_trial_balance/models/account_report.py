@@ -261,14 +261,16 @@ class DynamicTrialBalanceCustomHandler(models.AbstractModel):
         max_level = int(options.get('hierarchy_level', 0))
         only_parents = options.get('hierarchy_only_parents', False)
 
-        AccountGroup = self.env['account.group']
+        company_id = options.get('company_id') or self.env.company.id
+        hierarchy_index = self.env['account.group']._get_hierarchy_index(company_id)
+        groups_index = hierarchy_index['groups']
         grouped_accounts = defaultdict(list)
         group_totals = defaultdict(lambda: defaultdict(float))
 
         # Group accounts by their direct parent group
         for acc_data in sorted(results, key=lambda x: x['account_code']):
-            group_id = acc_data.get('group_id')
-            if group_id:
+            group_id = acc_data.get('group_id') or hierarchy_index['account_group'].get(acc_data['account_id'])
+            if group_id in groups_index:
                 grouped_accounts[group_id].append(acc_data)
                 # Accumulate totals for the group
                 for key in ['initial_debit', 'initial_credit', 'initial_balance', 'period_debit', 'period_credit', 'period_balance', 'ending_debit', 'ending_credit', 'ending_balance']:
@@ -278,24 +280,25 @@ class DynamicTrialBalanceCustomHandler(models.AbstractModel):
                     group_totals[group_id]['period_amount_currency'] += acc_data.get('period_amount_currency', 0)
                     group_totals[group_id]['ending_amount_currency'] += acc_data.get('ending_amount_currency', 0)
             else:
-                # Accounts without a group are added directly
+                # Accounts without a group (or with a group out of the
+                # hierarchy) are added directly
                 if not self._should_skip_line(acc_data, options):
                     lines.append(self._build_account_line(acc_data, options, report))
 
         # Build hierarchy
-        account_groups = AccountGroup.search([('id', 'in', list(grouped_accounts.keys()))], order='code_prefix_start')
+        account_groups = sorted((groups_index[group_id] for group_id in grouped_accounts), key=lambda g: g['code'] or '')
         for group in account_groups:
-            group_level = group.level + 1 # Odoo group levels are 0-indexed, report levels are 1-indexed
+            group_level = group['level'] + 1 # Odoo group levels are 0-indexed, report levels are 1-indexed
 
             if only_parents and max_level > 0 and group_level > max_level:
                 continue # Skip groups and their children if level exceeds max_level
 
             # Add group header
-            group_line = self._build_group_line(group, group_totals[group.id], options, report)
+            group_line = self._build_group_line(group, group_totals[group['id']], options, report)
             lines.append(group_line)
 
             # Add accounts under this group
-            for acc_data in grouped_accounts[group.id]:
+            for acc_data in grouped_accounts[group['id']]:
                 if not self._should_skip_line(acc_data, options):
                     account_line = self._build_account_line(acc_data, options, report)
                     account_line['level'] = group_level + 1 # Account is one level deeper than its group
@@ -304,6 +307,7 @@ class DynamicTrialBalanceCustomHandler(models.AbstractModel):
         return lines
 
     def _build_group_line(self, group, totals, options, report):
+        # group is the data of the group in the account groups hierarchy index
         columns = [
             {'name': self._format_value(totals['initial_debit'], report), 'no_format': totals['initial_debit']},
             {'name': self._format_value(totals['initial_credit'], report), 'no_format': totals['initial_credit']},
@@ -319,12 +323,12 @@ class DynamicTrialBalanceCustomHandler(models.AbstractModel):
             columns.append({'name': self._format_value(totals['ending_amount_currency'], report), 'no_format': totals['ending_amount_currency']})
 
         return {
-            'id': f"group_{group.id}",
-            'name': f"{group.code_prefix_start or ''} {group.name}",
-            'level': group.level + 1,
+            'id': f"group_{group['id']}",
+            'name': f"{group['code'] or ''} {group['name']}",
+            'level': group['level'] + 1,
             'columns': columns,
             'unfoldable': True,
-            'unfolded': options.get('unfolded_lines') and f"group_{group.id}" in options['unfolded_lines'],
+            'unfolded': options.get('unfolded_lines') and f"group_{group['id']}" in options['unfolded_lines'],
             'caret_options': 'account.group',
             'class': 'o_account_report_group_line',
         }